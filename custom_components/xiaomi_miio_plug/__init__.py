@@ -2,44 +2,126 @@
 # pylint: disable=import-error
 import logging
 
+import voluptuous as vol
+
 import homeassistant.helpers.config_validation as cv
 from homeassistant.const import (
     CONF_HOST,
     CONF_SCAN_INTERVAL,
-    CONF_TOKEN
+    CONF_TOKEN,
+    EVENT_HOMEASSISTANT_STOP
 )
 from homeassistant.config_entries import ConfigEntry
-from homeassistant.core import HomeAssistant
-from homeassistant.helpers.update_coordinator import DataUpdateCoordinator
+from homeassistant.core import Event, HomeAssistant, ServiceCall, callback
+from homeassistant.helpers.event import async_track_time_interval
 from homeassistant.exceptions import PlatformNotReady
-from miio import (  # pylint: disable=import-error
-    AirConditioningCompanionV3,
-    ChuangmiPlug,
-    Device,
-    DeviceException,
-    PowerStrip,
-)
+from miio import DeviceException  # pylint: disable=import-error
 
+from .coordinator import AdaptivePollInterval, XiaomiPlugDataUpdateCoordinator
+from .scheduler import FleetPollScheduler
+from .transport import MiioSessionPool
+from .device import (
+    AsyncAirConditioningCompanionV3,
+    AsyncChuangmiPlug,
+    AsyncDevice,
+    AsyncPowerStrip,
+)
+from .switch import async_setup_services
 from .switch_miot import SwitchMiot, SwitchMiotTW02
 
 from .const import (
+    CONF_ADAPTIVE_POLLING,
+    CONF_CONFIG_SCAN_INTERVAL,
+    CONF_CONFIRM_DELAY,
+    CONF_COUNTER_SCAN_INTERVAL,
+    CONF_MAX_SCAN_INTERVAL,
+    CONF_MIN_SCAN_INTERVAL,
     CONF_MODEL,
-    DATA_KEY,
+    CONF_PUSH_UPDATES,
+    CONF_RATE_LIMIT,
+    DATA_COORDINATOR,
+    DATA_DEVICE,
+    DATA_SCHEDULER,
+    DATA_SESSIONS,
     DOMAIN,
     DOMAINS,
+    DEFAULT_CONFIG_SCAN_INTERVAL,
+    DEFAULT_CONFIRM_DELAY,
+    DEFAULT_COUNTER_SCAN_INTERVAL,
+    DEFAULT_MAX_SCAN_INTERVAL,
+    DEFAULT_GLOBAL_RATE_LIMIT,
+    DEFAULT_MIN_SCAN_INTERVAL,
+    DEFAULT_RATE_LIMIT,
     DEFAULT_SCAN_INTERVAL,
+    INFO_REFRESH_INTERVAL,
     MODELS_PLUG_WITH_USB_MIIO,
     MODELS_PLUG_MIIO,
     MODELS_POWERSTRIP_MIIO,
     MODELS_ACPARTNER_MIIO,
     MODELS_MIOT,
-    MODEL_QMI_PLUG_TW02
+    MODEL_QMI_PLUG_TW02,
+    POLL_TIER_CONFIG,
+    POLL_TIER_COUNTERS,
+    PUSH_RECONCILE_INTERVAL,
+    SERVICE_REFRESH_DEVICE_INFO
 )
 
 _LOGGER = logging.getLogger(__name__)
 
+CONFIG_SCHEMA = vol.Schema(
+    {
+        vol.Optional(DOMAIN): vol.Schema(
+            {
+                vol.Optional(
+                    CONF_RATE_LIMIT, default=DEFAULT_GLOBAL_RATE_LIMIT
+                ): vol.All(vol.Coerce(float), vol.Range(min=0.1)),
+            }
+        )
+    },
+    extra=vol.ALLOW_EXTRA,
+)
+
 async def async_setup(hass: HomeAssistant, hass_config: dict):
     """Set up the Xiaomi AirFryer Component."""
+    domain_config = hass_config.get(DOMAIN, {})
+    scheduler = hass.data[DATA_SCHEDULER] = FleetPollScheduler(hass)
+
+    @callback
+    def async_stop_polling(event: Event) -> None:
+        """Stop the polls in flight, so they do not hold up the shutdown."""
+        scheduler.async_stop()
+
+    hass.bus.async_listen_once(EVENT_HOMEASSISTANT_STOP, async_stop_polling)
+    sessions = hass.data[DATA_SESSIONS] = MiioSessionPool(
+        domain_config.get(CONF_RATE_LIMIT, DEFAULT_GLOBAL_RATE_LIMIT)
+    )
+
+    # greet all configured devices at once, so their first polls do not wait
+    # for a handshake one after the other
+    devices = []
+    for entry in hass.config_entries.async_entries(DOMAIN):
+        conf = entry.options or entry.data
+        if conf.get(CONF_HOST) and conf.get(CONF_TOKEN):
+            devices.append(
+                (
+                    conf[CONF_HOST],
+                    conf[CONF_TOKEN],
+                    conf.get(CONF_RATE_LIMIT, DEFAULT_RATE_LIMIT),
+                )
+            )
+    if devices:
+        hass.async_create_task(sessions.async_prewarm(devices))
+
+    async_setup_services(hass)
+
+    async def async_refresh_device_info(service: ServiceCall):
+        """Refresh the cached device info of all configured devices."""
+        for data in hass.data.get(DOMAIN, {}).values():
+            await data[DATA_COORDINATOR].async_refresh_info()
+
+    hass.services.async_register(
+        DOMAIN, SERVICE_REFRESH_DEVICE_INFO, async_refresh_device_info
+    )
 
     return True
 
@@ -51,10 +133,15 @@ async def async_update_options(hass: HomeAssistant, entry: ConfigEntry):
 
 async def async_unload_entry(hass: HomeAssistant, entry: ConfigEntry):
     """ check unload integration """
-    return all([
+    unload_ok = all([
         await hass.config_entries.async_forward_entry_unload(entry, domain)
         for domain in DOMAINS
     ])
+    if unload_ok:
+        hass.data[DOMAIN].pop(entry.options[CONF_HOST], None)
+        hass.data[DATA_SESSIONS].close(entry.options[CONF_HOST])
+
+    return unload_ok
 
 
 async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry):
@@ -78,19 +165,21 @@ async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry):
         token = entry.options[CONF_TOKEN]
         model = entry.options.get(CONF_MODEL)
 
-    if DATA_KEY not in hass.data:
-        hass.data.setdefault(DATA_KEY, {})
-        hass.data[DATA_KEY][host] = {}
 
     if DOMAIN not in hass.data:
         hass.data[DOMAIN] = {}
 
     unique_id = None
+    device_info = None
 
+    session = hass.data[DATA_SESSIONS].get(
+        host, token, entry.options.get(CONF_RATE_LIMIT, DEFAULT_RATE_LIMIT)
+    )
     if model is None:
         try:
-            miio_device = Device(host, token)
-            device_info = await hass.async_add_executor_job(miio_device.info)
+            miio_device = AsyncDevice(host, token)
+            miio_device.use_session(session)
+            device_info = await miio_device.async_info()
             model = device_info.model
             unique_id = f"{model}-{device_info.mac_address}"
             _LOGGER.info(
@@ -103,18 +192,18 @@ async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry):
             raise PlatformNotReady from ex
 
     if model in MODELS_PLUG_WITH_USB_MIIO:
-        plug = ChuangmiPlug(host, token, model=model)
+        plug = AsyncChuangmiPlug(host, token, model=model)
     elif model in MODELS_POWERSTRIP_MIIO:
-        plug = PowerStrip(host, token, model=model)
+        plug = AsyncPowerStrip(host, token, model=model)
     elif model in MODELS_PLUG_MIIO:
-        plug = ChuangmiPlug(host, token, model=model)
+        plug = AsyncChuangmiPlug(host, token, model=model)
     elif model in MODELS_ACPARTNER_MIIO:
-        plug = AirConditioningCompanionV3(host, token)
+        plug = AsyncAirConditioningCompanionV3(host, token)
     elif model in MODELS_MIOT:
         if model == MODEL_QMI_PLUG_TW02:
-            plug = SwitchMiotTW02(host, token)
+            plug = SwitchMiotTW02(host, token, model=model)
         else:
-            plug = SwitchMiot(host, token)
+            plug = SwitchMiot(host, token, model=model)
     else:
         _LOGGER.error(
             "Unsupported device found! Please create an issue at "
@@ -123,8 +212,63 @@ async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry):
             model,
         )
         return False
+    plug.use_session(session)
+
+    scan_interval = entry.options.get(CONF_SCAN_INTERVAL, DEFAULT_SCAN_INTERVAL)
+    push = model in MODELS_MIOT and entry.options.get(CONF_PUSH_UPDATES, False)
+    if push:
+        scan_interval = max(scan_interval, PUSH_RECONCILE_INTERVAL)
+    adaptive = None
+    if not push and entry.options.get(CONF_ADAPTIVE_POLLING, False):
+        adaptive = AdaptivePollInterval(
+            entry.options.get(CONF_MIN_SCAN_INTERVAL, DEFAULT_MIN_SCAN_INTERVAL),
+            entry.options.get(CONF_MAX_SCAN_INTERVAL, DEFAULT_MAX_SCAN_INTERVAL),
+        )
+    tier_intervals = {
+        POLL_TIER_COUNTERS: entry.options.get(
+            CONF_COUNTER_SCAN_INTERVAL, DEFAULT_COUNTER_SCAN_INTERVAL
+        ),
+        POLL_TIER_CONFIG: entry.options.get(
+            CONF_CONFIG_SCAN_INTERVAL, DEFAULT_CONFIG_SCAN_INTERVAL
+        ),
+    }
+    confirm_delay = (
+        entry.options.get(CONF_CONFIRM_DELAY, DEFAULT_CONFIRM_DELAY) / 1000
+    )
+    coordinator = XiaomiPlugDataUpdateCoordinator(
+        hass,
+        plug,
+        host,
+        entry.unique_id,
+        scan_interval,
+        adaptive,
+        tier_intervals,
+        confirm_delay,
+    )
+    entry.async_on_unload(coordinator.async_cancel_confirm)
+    # fetch the device info in the background, the entities only read the
+    # cached copy and the coordinator retries it after the next successful poll
+    if device_info is None:
+        hass.async_create_task(coordinator.async_refresh_info())
+    else:
+        # the plug caches the info like after its own miIO.info request
+        plug._info = coordinator.info = device_info
+    entry.async_on_unload(
+        async_track_time_interval(
+            hass, coordinator.async_refresh_info, INFO_REFRESH_INTERVAL
+        )
+    )
+    await coordinator.async_refresh()
+    entry.async_on_unload(
+        hass.data[DATA_SCHEDULER].async_add(coordinator)
+    )
+    if push:
+        entry.async_on_unload(coordinator.async_enable_push())
 
-    hass.data[DOMAIN][host] = plug
+    hass.data[DOMAIN][host] = {
+        DATA_DEVICE: plug,
+        DATA_COORDINATOR: coordinator,
+    }
     # init setup for each supported domains
     for platform in DOMAINS:
         hass.async_create_task(hass.config_entries.async_forward_entry_setup(
@@ -9,7 +9,14 @@ import voluptuous as vol
 from homeassistant import config_entries
 
 from homeassistant.config_entries import SOURCE_REAUTH, ConfigEntry
-from homeassistant.const import CONF_HOST, CONF_NAME, CONF_TOKEN, CONF_DEVICE, CONF_MAC
+from homeassistant.const import (
+    CONF_HOST,
+    CONF_NAME,
+    CONF_TOKEN,
+    CONF_DEVICE,
+    CONF_MAC,
+    CONF_SCAN_INTERVAL,
+)
 from homeassistant.core import callback
 from homeassistant.helpers.device_registry import format_mac
 
@@ -28,7 +35,22 @@ from homeassistant.components.xiaomi_miio.const import (
 from homeassistant.components.xiaomi_miio.device import ConnectXiaomiDevice
 
 from .const import (
+    CONF_ADAPTIVE_POLLING,
+    CONF_CONFIG_SCAN_INTERVAL,
+    CONF_CONFIRM_DELAY,
+    CONF_COUNTER_SCAN_INTERVAL,
+    CONF_MAX_SCAN_INTERVAL,
+    CONF_MIN_SCAN_INTERVAL,
     CONF_MODEL,
+    CONF_PUSH_UPDATES,
+    CONF_RATE_LIMIT,
+    DEFAULT_CONFIG_SCAN_INTERVAL,
+    DEFAULT_CONFIRM_DELAY,
+    DEFAULT_COUNTER_SCAN_INTERVAL,
+    DEFAULT_MAX_SCAN_INTERVAL,
+    DEFAULT_MIN_SCAN_INTERVAL,
+    DEFAULT_RATE_LIMIT,
+    DEFAULT_SCAN_INTERVAL,
     DOMAIN,
     MODELS_ALL_DEVICES
 )
@@ -81,6 +103,9 @@ class OptionsFlowHandler(config_entries.OptionsFlow):
             model = self.config_entry.options.get(CONF_MODEL)
             mac = self.config_entry.options.get(CONF_MAC)
 
+            if user_input[CONF_MIN_SCAN_INTERVAL] > user_input[CONF_MAX_SCAN_INTERVAL]:
+                errors["base"] = "invalid_scan_interval"
+
             if use_cloud and (
                 not cloud_username or not cloud_password or not cloud_country
             ):
@@ -106,15 +131,73 @@ class OptionsFlowHandler(config_entries.OptionsFlow):
                             CONF_CLOUD_USERNAME: cloud_username,
                             CONF_CLOUD_PASSWORD: cloud_password,
                             CONF_CLOUD_COUNTRY: cloud_country,
+                            CONF_SCAN_INTERVAL: user_input[CONF_SCAN_INTERVAL],
+                            CONF_ADAPTIVE_POLLING: user_input[CONF_ADAPTIVE_POLLING],
+                            CONF_MIN_SCAN_INTERVAL: user_input[CONF_MIN_SCAN_INTERVAL],
+                            CONF_MAX_SCAN_INTERVAL: user_input[CONF_MAX_SCAN_INTERVAL],
+                            CONF_COUNTER_SCAN_INTERVAL: user_input[
+                                CONF_COUNTER_SCAN_INTERVAL
+                            ],
+                            CONF_CONFIG_SCAN_INTERVAL: user_input[
+                                CONF_CONFIG_SCAN_INTERVAL
+                            ],
+                            CONF_PUSH_UPDATES: user_input[CONF_PUSH_UPDATES],
+                            CONF_RATE_LIMIT: user_input[CONF_RATE_LIMIT],
+                            CONF_CONFIRM_DELAY: user_input[CONF_CONFIRM_DELAY],
                         }
                 )
 
-        host = self.config_entry.options.get(CONF_HOST)
-        token = self.config_entry.options.get(CONF_TOKEN)
+        options = self.config_entry.options
+        host = options.get(CONF_HOST)
+        token = options.get(CONF_TOKEN)
         settings_schema = vol.Schema(
             {
                 vol.Required(CONF_HOST, default=host): str,
-                vol.Required(CONF_TOKEN, default=token): str
+                vol.Required(CONF_TOKEN, default=token): str,
+                vol.Required(
+                    CONF_SCAN_INTERVAL,
+                    default=options.get(CONF_SCAN_INTERVAL, DEFAULT_SCAN_INTERVAL),
+                ): vol.All(vol.Coerce(int), vol.Range(min=1)),
+                vol.Required(
+                    CONF_ADAPTIVE_POLLING,
+                    default=options.get(CONF_ADAPTIVE_POLLING, False),
+                ): bool,
+                vol.Required(
+                    CONF_MIN_SCAN_INTERVAL,
+                    default=options.get(
+                        CONF_MIN_SCAN_INTERVAL, DEFAULT_MIN_SCAN_INTERVAL
+                    ),
+                ): vol.All(vol.Coerce(int), vol.Range(min=1)),
+                vol.Required(
+                    CONF_MAX_SCAN_INTERVAL,
+                    default=options.get(
+                        CONF_MAX_SCAN_INTERVAL, DEFAULT_MAX_SCAN_INTERVAL
+                    ),
+                ): vol.All(vol.Coerce(int), vol.Range(min=1)),
+                vol.Required(
+                    CONF_COUNTER_SCAN_INTERVAL,
+                    default=options.get(
+                        CONF_COUNTER_SCAN_INTERVAL, DEFAULT_COUNTER_SCAN_INTERVAL
+                    ),
+                ): vol.All(vol.Coerce(int), vol.Range(min=1)),
+                vol.Required(
+                    CONF_CONFIG_SCAN_INTERVAL,
+                    default=options.get(
+                        CONF_CONFIG_SCAN_INTERVAL, DEFAULT_CONFIG_SCAN_INTERVAL
+                    ),
+                ): vol.All(vol.Coerce(int), vol.Range(min=1)),
+                vol.Required(
+                    CONF_PUSH_UPDATES,
+                    default=options.get(CONF_PUSH_UPDATES, False),
+                ): bool,
+                vol.Required(
+                    CONF_RATE_LIMIT,
+                    default=options.get(CONF_RATE_LIMIT, DEFAULT_RATE_LIMIT),
+                ): vol.All(vol.Coerce(float), vol.Range(min=0.1)),
+                vol.Required(
+                    CONF_CONFIRM_DELAY,
+                    default=options.get(CONF_CONFIRM_DELAY, DEFAULT_CONFIRM_DELAY),
+                ): vol.All(vol.Coerce(int), vol.Range(min=0, max=10000)),
             }
         )
 
@@ -9,6 +9,7 @@ from homeassistant.components.sensor import (
 )
 
 from homeassistant.const import (
+    EntityCategory,
     UnitOfElectricCurrent,
     UnitOfElectricPotential,
     UnitOfEnergy,
@@ -22,9 +23,20 @@ DOMAINS = ["sensor", "switch"]
 DATA_KEY = "xiaomi_switch_data"
 DATA_STATE = "state"
 DATA_DEVICE = "device"
+DATA_COORDINATOR = "coordinator"
+DATA_SCHEDULER = "xiaomi_switch_scheduler"
+DATA_SESSIONS = "xiaomi_switch_sessions"
 
 CONF_MODEL = "model"
 CONF_MAC = "mac"
+CONF_ADAPTIVE_POLLING = "adaptive_polling"
+CONF_MIN_SCAN_INTERVAL = "min_scan_interval"
+CONF_MAX_SCAN_INTERVAL = "max_scan_interval"
+CONF_COUNTER_SCAN_INTERVAL = "counter_scan_interval"
+CONF_CONFIG_SCAN_INTERVAL = "config_scan_interval"
+CONF_PUSH_UPDATES = "push_updates"
+CONF_RATE_LIMIT = "rate_limit"
+CONF_CONFIRM_DELAY = "confirm_delay"
 
 MODEL_CHUANGMI_PLUG_V1 = "chuangmi.plug.v1"
 MODEL_QMI_POWERSTRIP_V1 = "qmi.powerstrip.v1"
@@ -88,6 +100,20 @@ MODELS_ALL_DEVICES = MODELS_PLUG_MIIO + MODELS_PLUG_WITH_USB_MIIO + MODELS_POWER
 
 DEFAULT_SCAN_INTERVAL = 30
 SCAN_INTERVAL = timedelta(seconds=DEFAULT_SCAN_INTERVAL)
+DEFAULT_MIN_SCAN_INTERVAL = 5
+DEFAULT_MAX_SCAN_INTERVAL = 120
+DEFAULT_COUNTER_SCAN_INTERVAL = 60
+DEFAULT_CONFIG_SCAN_INTERVAL = 900
+# with push updates the polls only reconcile missed messages
+PUSH_RECONCILE_INTERVAL = 300
+INFO_REFRESH_INTERVAL = timedelta(hours=24)
+# requests per second to a single device and to all devices together
+DEFAULT_RATE_LIMIT = 2
+DEFAULT_GLOBAL_RATE_LIMIT = 20
+# milliseconds after a switch command until the relay is read back, 0 disables
+DEFAULT_CONFIRM_DELAY = 500
+
+SERVICE_REFRESH_DEVICE_INFO = "refresh_device_info"
 
 ATTR_POWER = "power"
 ATTR_TEMPERATURE = "temperature"
@@ -101,6 +127,31 @@ ATTR_WORKING_TIME = "working_time"
 ATTR_COUNT_DOWN_TIME = "count_down_time"
 ATTR_COUNT_DOWN = "count_down"
 ATTR_KEEP_RELAY = "keep_relay"
+ATTR_BUZZER = "buzzer"
+
+# status attributes polled less often than the relay state and load power
+POLL_TIER_COUNTERS = "counters"
+POLL_TIER_CONFIG = "config"
+POLL_TIERS = {
+    POLL_TIER_COUNTERS: {
+        ATTR_TEMPERATURE,
+        ATTR_WORKING_TIME,
+        "power_consumption",
+        "energy",
+        "system_status",
+    },
+    POLL_TIER_CONFIG: {
+        ATTR_WIFI_LED,
+        ATTR_KEEP_RELAY,
+        ATTR_POWER_PRICE,
+        ATTR_COUNT_DOWN_TIME,
+        "led",
+        "buzzer",
+        "mode",
+        "open_time",
+        "close_time",
+    },
+}
 
 @dataclass
 class XiaomiPlugSensorDescription(
@@ -158,3 +209,82 @@ PLUG_SENSORS: tuple[XiaomiPlugSensorDescription, ...] = (
         icon="mdi:chip"
     )
 )
+
+COORDINATOR_SENSORS: tuple[XiaomiPlugSensorDescription, ...] = (
+    XiaomiPlugSensorDescription(
+        key="poll_interval",
+        name="Poll Interval",
+        native_unit_of_measurement=UnitOfTime.SECONDS,
+        entity_category=EntityCategory.DIAGNOSTIC,
+        icon="mdi:timer-sync-outline"
+    ),
+)
+
+# request metrics of the miIO session, the exe_time is only reported by MIoT devices
+SESSION_SENSORS: tuple[XiaomiPlugSensorDescription, ...] = (
+    XiaomiPlugSensorDescription(
+        key="latency_p50",
+        name="Latency p50",
+        native_unit_of_measurement=UnitOfTime.MILLISECONDS,
+        device_class=SensorDeviceClass.DURATION,
+        state_class=SensorStateClass.MEASUREMENT,
+        entity_category=EntityCategory.DIAGNOSTIC,
+        entity_registry_enabled_default=False,
+        icon="mdi:timer-outline"
+    ),
+    XiaomiPlugSensorDescription(
+        key="latency_p95",
+        name="Latency p95",
+        native_unit_of_measurement=UnitOfTime.MILLISECONDS,
+        device_class=SensorDeviceClass.DURATION,
+        state_class=SensorStateClass.MEASUREMENT,
+        entity_category=EntityCategory.DIAGNOSTIC,
+        entity_registry_enabled_default=False,
+        icon="mdi:timer-alert-outline"
+    ),
+    XiaomiPlugSensorDescription(
+        key="timeouts",
+        name="Timeouts",
+        state_class=SensorStateClass.TOTAL_INCREASING,
+        entity_category=EntityCategory.DIAGNOSTIC,
+        entity_registry_enabled_default=False,
+        icon="mdi:timer-off-outline"
+    ),
+    XiaomiPlugSensorDescription(
+        key="retries",
+        name="Retries",
+        state_class=SensorStateClass.TOTAL_INCREASING,
+        entity_category=EntityCategory.DIAGNOSTIC,
+        entity_registry_enabled_default=False,
+        icon="mdi:refresh"
+    ),
+    XiaomiPlugSensorDescription(
+        key="handshakes",
+        name="Handshakes",
+        state_class=SensorStateClass.TOTAL_INCREASING,
+        entity_category=EntityCategory.DIAGNOSTIC,
+        entity_registry_enabled_default=False,
+        icon="mdi:handshake-outline"
+    ),
+    XiaomiPlugSensorDescription(
+        key="exe_time_p50",
+        name="Execution Time p50",
+        native_unit_of_measurement=UnitOfTime.MILLISECONDS,
+        device_class=SensorDeviceClass.DURATION,
+        state_class=SensorStateClass.MEASUREMENT,
+        entity_category=EntityCategory.DIAGNOSTIC,
+        entity_registry_enabled_default=False,
+        icon="mdi:chip"
+    ),
+    XiaomiPlugSensorDescription(
+        key="exe_time_p95",
+        name="Execution Time p95",
+        native_unit_of_measurement=UnitOfTime.MILLISECONDS,
+        device_class=SensorDeviceClass.DURATION,
+        state_class=SensorStateClass.MEASUREMENT,
+        entity_category=EntityCategory.DIAGNOSTIC,
+        entity_registry_enabled_default=False,
+        icon="mdi:chip"
+    ),
+)
+MIOT_SESSION_SENSORS = ["exe_time_p50", "exe_time_p95"]
@@ -0,0 +1,333 @@
+"""Data update coordinator of the Xiaomi Plug/PowerStrip component."""
+import asyncio
+import logging
+from typing import Optional
+
+from homeassistant.core import CALLBACK_TYPE, HomeAssistant, callback
+from homeassistant.helpers import device_registry as dr
+from homeassistant.helpers.event import async_call_later
+from homeassistant.helpers.update_coordinator import (
+    DataUpdateCoordinator,
+    UpdateFailed,
+)
+from miio import DeviceException  # pylint: disable=import-error
+
+from .const import DOMAIN, POLL_TIERS
+
+_LOGGER = logging.getLogger(__name__)
+
+# status attributes the adaptive poll interval is derived from
+ADAPTIVE_ATTRIBUTES = {"is_on", "power_socket", "load_power"}
+POWER_CHANGE_THRESHOLD = 5
+POWER_CHANGE_RATIO = 0.1
+
+
+class AdaptivePollInterval:
+    """Poll faster while the load power changes, slower while it is stable."""
+
+    def __init__(self, minimum: float, maximum: float) -> None:
+        """Initialize the adaptive interval."""
+        self.minimum = minimum
+        self.maximum = maximum
+        self.interval = minimum
+        self._load_power = None
+
+    def boost(self) -> float:
+        """Fall back to the minimum interval, e.g. after the relay toggled."""
+        self.interval = self.minimum
+        return self.interval
+
+    def update(self, state) -> float:
+        """Derive the next interval from a device status."""
+        if hasattr(state, "power_socket"):
+            is_on = state.power_socket == "on"
+        else:
+            is_on = state.is_on
+        load_power = getattr(state, "load_power", None)
+        last_load_power, self._load_power = self._load_power, load_power
+
+        if not is_on:
+            self.interval = self.maximum
+        elif (
+            load_power is not None
+            and last_load_power is not None
+            and abs(load_power - last_load_power) > max(
+                POWER_CHANGE_THRESHOLD, POWER_CHANGE_RATIO * abs(last_load_power)
+            )
+        ):
+            self.interval = self.minimum
+        else:
+            self.interval = min(self.interval * 2, self.maximum)
+
+        return self.interval
+
+
+class XiaomiPlugDataUpdateCoordinator(DataUpdateCoordinator):
+    """Fetch the status of a plug/powerstrip once for all of its entities."""
+
+    def __init__(
+        self,
+        hass: HomeAssistant,
+        plug,
+        host: str,
+        unique_id: str,
+        poll_interval: float,
+        adaptive: Optional[AdaptivePollInterval] = None,
+        tier_intervals: Optional[dict] = None,
+        confirm_delay: float = 0
+    ) -> None:
+        """Initialize the coordinator.
+
+        The coordinator has no update interval, it is polled by the fleet
+        scheduler every poll_interval seconds. The attributes of the POLL_TIERS
+        are only requested every tier_intervals seconds. Switch commands are
+        read back confirm_delay seconds after they were sent.
+        """
+        super().__init__(
+            hass,
+            _LOGGER,
+            name=f"{DOMAIN} {host}",
+            update_interval=None,
+        )
+        self.plug = plug
+        self.host = host
+        self.unique_id = unique_id
+        self.info = None
+        self.poll_interval = poll_interval
+        self.poll_job = None
+        self._adaptive = adaptive
+        self._tier_intervals = tier_intervals or {}
+        self._tier_polled = {}
+        self._required_attributes = []
+        self._in_flight = {}
+        self.confirm_delay = confirm_delay
+        self.data_requested_at = 0.0
+        self._confirm_attributes = set()
+        self._unsub_confirm = None
+        self._read_back_task = None
+
+    @property
+    def required_attributes(self) -> set:
+        """Return the status attributes read by the enabled entities."""
+        attributes = set().union(*self._required_attributes)
+        if attributes and self._adaptive is not None:
+            attributes |= ADAPTIVE_ATTRIBUTES
+        return attributes
+
+    @callback
+    def async_require_attributes(self, attributes) -> CALLBACK_TYPE:
+        """Register the status attributes an entity reads.
+
+        Until the first entity registers, the full status is requested.
+        """
+        attributes = frozenset(attributes)
+        self._required_attributes.append(attributes)
+
+        @callback
+        def remove_attributes() -> None:
+            self._required_attributes.remove(attributes)
+
+        return remove_attributes
+
+    def _due_tiers(self, now: float) -> set:
+        """Return the poll tiers whose interval has elapsed."""
+        # half a poll period of slack, the scheduler jitters the polls
+        slack = self.poll_interval / 2
+        return {
+            tier
+            for tier, interval in self._tier_intervals.items()
+            if tier not in self._tier_polled
+            or now - self._tier_polled[tier] >= interval - slack
+        }
+
+    @callback
+    def async_expire_tiers(self) -> None:
+        """Request all poll tiers on the next poll, e.g. after a setting changed."""
+        self._tier_polled.clear()
+
+    async def _async_single_flight(self, key: str, request):
+        """Run the request once, concurrent callers await the same result."""
+        task = self._in_flight.get(key)
+        if task is None or task.done():
+            task = self._in_flight[key] = self.hass.async_create_task(request())
+        else:
+            _LOGGER.debug("Joining the in-flight %s request of %s", key, self.host)
+
+        # a cancelled caller must not cancel the request of the others
+        return await asyncio.shield(task)
+
+    async def _async_update_data(self):
+        """Fetch state from the device, once for overlapping refreshes."""
+        return await self._async_single_flight("status", self._async_fetch_status)
+
+    async def _async_fetch_status(self):
+        """Fetch state from the device.
+
+        Attributes of a poll tier which is not due are taken over from the
+        previous status.
+        """
+        now = self.hass.loop.time()
+        attributes = self.required_attributes
+        due_tiers = self._due_tiers(now)
+        if attributes and self.data is not None:
+            skipped = set().union(
+                *(
+                    POLL_TIERS[tier]
+                    for tier in self._tier_intervals
+                    if tier not in due_tiers
+                )
+            )
+            attributes = attributes - skipped
+            if not attributes:
+                return self.data
+
+        try:
+            state = await self.plug.async_status(attributes or None)
+        except DeviceException as ex:
+            raise UpdateFailed(f"Got exception while fetching the state: {ex}") from ex
+
+        if self.data is not None and attributes:
+            for key, value in self.data.data.items():
+                state.data.setdefault(key, value)
+        for tier in due_tiers:
+            self._tier_polled[tier] = now
+        self.data_requested_at = now
+
+        _LOGGER.debug("Got new state: %s", state)
+        if self.info is None:
+            self._async_retry_info()
+        if self._adaptive is not None:
+            self.poll_interval = self._adaptive.update(state)
+        return state
+
+    async def async_probe(self) -> bool:
+        """Return true if the device answers a single hello packet."""
+        try:
+            await self.plug.async_protocol.async_send_handshake(retry_count=0)
+        except DeviceException:
+            return False
+        return True
+
+    @callback
+    def async_boost_polling(self) -> None:
+        """Poll at the minimum interval for a while, e.g. after a toggle."""
+        if self._adaptive is None:
+            return
+
+        self.poll_interval = self._adaptive.boost()
+        if self.poll_job is not None:
+            self.poll_job.async_expedite()
+
+    @callback
+    def async_confirm_write(self, attributes) -> None:
+        """Read back the given attributes shortly after a switch command.
+
+        Commands sent within the delay are confirmed by a single read.
+        """
+        if not self.confirm_delay:
+            return
+
+        self._confirm_attributes.update(attributes)
+        if self._unsub_confirm is None:
+            self._unsub_confirm = async_call_later(
+                self.hass, self.confirm_delay, self._async_read_back
+            )
+
+    @callback
+    def async_cancel_confirm(self) -> None:
+        """Cancel a pending read back, e.g. when the entry is unloaded."""
+        if self._unsub_confirm is not None:
+            self._unsub_confirm()
+            self._unsub_confirm = None
+
+    @callback
+    def async_stop(self) -> None:
+        """Cancel the pending read back and the requests in flight."""
+        self.async_cancel_confirm()
+        if self._read_back_task is not None:
+            self._read_back_task.cancel()
+        for task in self._in_flight.values():
+            task.cancel()
+
+    async def _async_read_back(self, _now) -> None:
+        """Merge the read back attributes into the status and notify the entities."""
+        self._unsub_confirm = None
+        attributes, self._confirm_attributes = self._confirm_attributes, set()
+        if self.data is None:
+            return
+
+        requested_at = self.hass.loop.time()
+        self._read_back_task = asyncio.current_task()
+        try:
+            state = await self.plug.async_status(attributes)
+        except DeviceException as ex:
+            _LOGGER.debug("Unable to read back %s of %s: %s", attributes, self.host, ex)
+            return
+        finally:
+            self._read_back_task = None
+
+        _LOGGER.debug("Read back %s of %s: %s", attributes, self.host, state.data)
+        self.data.data.update(state.data)
+        self.data_requested_at = requested_at
+        self.async_set_updated_data(self.data)
+
+    @callback
+    def async_enable_push(self) -> CALLBACK_TYPE:
+        """Apply the properties_changed messages of a MIoT device immediately."""
+        return self.plug.async_subscribe(self._async_handle_message)
+
+    @callback
+    def _async_handle_message(self, method: str, params) -> None:
+        """Merge the pushed properties into the status and notify the entities."""
+        if method != "properties_changed" or self.data is None:
+            return
+
+        changes = self.plug.decode_properties_changed(params)
+        if not changes:
+            return
+
+        _LOGGER.debug("Got pushed properties of %s: %s", self.host, changes)
+        self.data.data.update(changes)
+        self.data_requested_at = self.hass.loop.time()
+        self.async_set_updated_data(self.data)
+
+    async def async_refresh_info(self, *args):
+        """Fetch the miIO info (firmware, hardware, MAC, RSSI) of the device."""
+        try:
+            info = await self._async_single_flight("info", self.plug.async_info)
+        except DeviceException as ex:
+            _LOGGER.debug("Unable to fetch the device info of %s: %s", self.host, ex)
+            return
+
+        self.info = info
+        self.async_update_device_registry()
+
+    @callback
+    def _async_retry_info(self) -> None:
+        """Fetch the missing device info, the device answered a poll again."""
+        task = self._in_flight.get("info")
+        if task is None or task.done():
+            self.hass.async_create_task(self.async_refresh_info())
+
+    @callback
+    def async_update_device_registry(self):
+        """Propagate the cached device info to an already registered device."""
+        if self.info is None:
+            return
+
+        device_registry = dr.async_get(self.hass)
+        device = device_registry.async_get_device(
+            identifiers={(DOMAIN, self.unique_id)}
+        )
+        if device is None:
+            return
+
+        connections = set()
+        if self.info.mac_address:
+            connections.add((dr.CONNECTION_NETWORK_MAC, self.info.mac_address))
+        device_registry.async_update_device(
+            device.id,
+            sw_version=self.info.firmware_version,
+            hw_version=self.info.hardware_version,
+            merge_connections=connections,
+        )
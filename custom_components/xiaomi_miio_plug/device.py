@@ -0,0 +1,188 @@
+"""Awaitable python-miio devices of the Xiaomi Plug/PowerStrip component."""
+# pylint: disable=import-error
+from collections import defaultdict
+
+from miio import (
+    AirConditioningCompanionV3,
+    ChuangmiPlug,
+    Device,
+    PowerStrip,
+)
+from miio.airconditioningcompanion import AirConditioningCompanionStatus
+from miio.chuangmi_plug import (
+    AVAILABLE_PROPERTIES as PLUG_PROPERTIES,
+    ChuangmiPlugStatus,
+)
+from miio.powerstrip import (
+    AVAILABLE_PROPERTIES as POWERSTRIP_PROPERTIES,
+    PowerMode,
+    PowerStripException,
+    PowerStripStatus,
+)
+
+from .transport import AsyncMiioDevice
+from .const import (
+    MODEL_CHUANGMI_PLUG_M1,
+    MODEL_CHUANGMI_PLUG_V1,
+    MODEL_CHUANGMI_PLUG_V3,
+    MODEL_QMI_POWERSTRIP_V1,
+)
+
+
+def properties_for_attributes(status_properties, attributes, available) -> list:
+    """Return the available get_prop properties backing the status attributes."""
+    wanted = set()
+    for attr in attributes:
+        wanted.update(status_properties.get(attr, [attr]))
+
+    return [prop for prop in available if prop in wanted]
+
+
+class AsyncDevice(AsyncMiioDevice, Device):
+    """Generic miIO device used to detect the model."""
+
+
+class AsyncChuangmiPlug(AsyncMiioDevice, ChuangmiPlug):
+    """Chuangmi Plug with awaitable commands."""
+    # status attributes which are backed by differently named properties
+    status_properties = {
+        "is_on": ["on", "power"],
+        "power": ["on", "power"],
+        "usb_power": ["usb_on"],
+        "led": ["wifi_led"],
+    }
+
+    async def async_status(self, attributes=None) -> ChuangmiPlugStatus:
+        """Retrieve properties without blocking.
+
+        If status attributes are given, only the properties backing them are
+        requested from the device.
+        """
+        properties = PLUG_PROPERTIES.get(
+            self.model, PLUG_PROPERTIES[MODEL_CHUANGMI_PLUG_M1]
+        ).copy()
+        if attributes:
+            properties = properties_for_attributes(
+                self.status_properties, attributes, properties
+            )
+        values = []
+        if properties:
+            values = await self.async_get_properties(properties)
+
+        if self.model == MODEL_CHUANGMI_PLUG_V3 and (
+            not attributes or "load_power" in attributes
+        ):
+            load_power = await self.async_send("get_power")  # Response: [300]
+            if len(load_power) == 1:
+                properties.append("load_power")
+                values.append(load_power[0] * 0.01)
+
+        return ChuangmiPlugStatus(defaultdict(lambda: None, zip(properties, values)))
+
+    async def async_on(self):
+        """Power on."""
+        if self.model == MODEL_CHUANGMI_PLUG_V1:
+            return await self.async_send("set_on")
+
+        return await self.async_send("set_power", ["on"])
+
+    async def async_off(self):
+        """Power off."""
+        if self.model == MODEL_CHUANGMI_PLUG_V1:
+            return await self.async_send("set_off")
+
+        return await self.async_send("set_power", ["off"])
+
+    async def async_usb_on(self):
+        """Power on."""
+        return await self.async_send("set_usb_on")
+
+    async def async_usb_off(self):
+        """Power off."""
+        return await self.async_send("set_usb_off")
+
+    async def async_set_wifi_led(self, wifi_led: bool):
+        """Set the wifi led on/off."""
+        return await self.async_send("set_wifi_led", ["on" if wifi_led else "off"])
+
+
+class AsyncPowerStrip(AsyncMiioDevice, PowerStrip):
+    """Power Strip with awaitable commands."""
+    # status attributes which are backed by differently named properties
+    status_properties = {
+        "is_on": ["power"],
+        "load_power": ["power_consume_rate"],
+        "leakage_current": ["elec_leakage"],
+        "led": ["wifi_led"],
+    }
+
+    async def async_status(self, attributes=None) -> PowerStripStatus:
+        """Retrieve properties without blocking.
+
+        If status attributes are given, only the properties backing them are
+        requested from the device.
+        """
+        properties = POWERSTRIP_PROPERTIES.get(
+            self.model, POWERSTRIP_PROPERTIES[MODEL_QMI_POWERSTRIP_V1]
+        )
+        if attributes:
+            properties = properties_for_attributes(
+                self.status_properties, attributes, properties
+            )
+        values = []
+        if properties:
+            values = await self.async_get_properties(properties)
+
+        return PowerStripStatus(defaultdict(lambda: None, zip(properties, values)))
+
+    async def async_on(self):
+        """Power on."""
+        return await self.async_send("set_power", ["on"])
+
+    async def async_off(self):
+        """Power off."""
+        return await self.async_send("set_power", ["off"])
+
+    async def async_set_power_mode(self, mode: PowerMode):
+        """Set the power mode."""
+        return await self.async_send("set_power_mode", [mode.value])
+
+    async def async_set_wifi_led(self, led: bool):
+        """Set the wifi led on/off."""
+        return await self.async_send("set_wifi_led", ["on" if led else "off"])
+
+    async def async_set_power_price(self, price: int):
+        """Set the power price."""
+        if price < 0 or price > 999:
+            raise PowerStripException("Invalid power price: %s" % price)
+
+        return await self.async_send("set_power_price", [price])
+
+
+class AsyncAirConditioningCompanionV3(AsyncMiioDevice, AirConditioningCompanionV3):
+    """Air Conditioning Companion V3 with awaitable commands."""
+
+    async def async_status(self, attributes=None) -> AirConditioningCompanionStatus:
+        """Return device status without blocking.
+
+        If status attributes are given, only the requests backing them are
+        sent to the device.
+        """
+        data = {}
+        if not attributes or "load_power" in attributes:
+            data["model_and_state"] = await self.async_send("get_model_and_state")
+        if not attributes or "power_socket" in attributes:
+            power_socket = await self.async_send(
+                "get_device_prop", ["lumi.0", "plug_state"]
+            )
+            data["power_socket"] = power_socket[0]
+
+        return AirConditioningCompanionStatus(data)
+
+    async def async_socket_on(self):
+        """Socket power on."""
+        return await self.async_send("toggle_plug", ["on"])
+
+    async def async_socket_off(self):
+        """Socket power off."""
+        return await self.async_send("toggle_plug", ["off"])
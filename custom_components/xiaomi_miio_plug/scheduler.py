@@ -0,0 +1,240 @@
+"""Fleet wide poll scheduler of the Xiaomi Plug/PowerStrip component."""
+import asyncio
+import logging
+import random
+
+from homeassistant.core import CALLBACK_TYPE, HomeAssistant, callback
+from homeassistant.helpers.event import async_call_later
+
+_LOGGER = logging.getLogger(__name__)
+
+# 1/phi spreads any number of devices evenly without reshuffling earlier ones
+PHASE_STEP = 0.6180339887498949
+JITTER_FRACTION = 0.05
+LATENCY_SMOOTHING = 0.3
+SLOW_POLL_LATENCY = 2.0
+SLOW_POLL_FAILURES = 2
+DEFAULT_MAX_CONCURRENT_POLLS = 8
+# failed polls after which an offline device is only probed with a hello
+BREAKER_FAILURES = 3
+MAX_PROBE_INTERVAL = 900
+
+
+class PollJob:
+    """Periodic poll of one coordinator.
+
+    After BREAKER_FAILURES failed polls the breaker of the job opens: the
+    device is only probed with a single hello packet, at exponentially
+    growing intervals, until it answers again.
+    """
+
+    def __init__(self, scheduler, coordinator, phase: float):
+        """Initialize the poll job."""
+        self.scheduler = scheduler
+        self.coordinator = coordinator
+        self.phase = phase
+        self.latency = None
+        self.failures = 0
+        self.probes = 0
+        self._due = None
+        self._unsub = None
+        self._task = None
+        self._stopped = False
+
+    @property
+    def interval(self) -> float:
+        """Return the current poll interval of the device."""
+        return self.coordinator.poll_interval
+
+    @property
+    def breaker_open(self) -> bool:
+        """Return true if the device is considered offline."""
+        return self.failures >= BREAKER_FAILURES
+
+    @property
+    def period(self) -> float:
+        """Return the time to the next poll, or probe of an offline device."""
+        if not self.breaker_open:
+            return self.interval
+        return min(self.interval * 2 ** self.probes, MAX_PROBE_INTERVAL)
+
+    @property
+    def slow(self) -> bool:
+        """Return true if the device answers slowly or not at all."""
+        return (
+            self.failures >= SLOW_POLL_FAILURES
+            or (self.latency is not None and self.latency > SLOW_POLL_LATENCY)
+        )
+
+    @callback
+    def async_start(self) -> None:
+        """Schedule the first poll at the phase offset of the device."""
+        self._schedule(self.phase)
+
+    @callback
+    def async_stop(self) -> None:
+        """Cancel the next poll."""
+        if self._unsub is not None:
+            self._unsub()
+            self._unsub = None
+
+    @callback
+    def async_shutdown(self) -> None:
+        """Cancel the next poll and the poll in progress for good."""
+        self._stopped = True
+        self.async_stop()
+        if self._task is not None:
+            self._task.cancel()
+
+    @callback
+    def async_expedite(self) -> None:
+        """Move the next poll forward if it is further away than the interval."""
+        if self._unsub is None:
+            return
+
+        if self._due - self.scheduler.hass.loop.time() > self.interval:
+            self.async_stop()
+            self._schedule(self.interval)
+
+    @callback
+    def _schedule(self, delay: float) -> None:
+        """Schedule the next poll."""
+        loop = self.scheduler.hass.loop
+        self._due = loop.time() + delay
+        self._unsub = async_call_later(self.scheduler.hass, delay, self._async_poll)
+
+    async def _async_poll(self, _now) -> None:
+        """Poll the device and schedule the next poll one period later.
+
+        The next poll is scheduled whatever happens to this one, so an
+        unexpected error does not stop the polling of the device.
+        """
+        self._unsub = None
+        self._task = asyncio.current_task()
+        due = self._due
+
+        try:
+            await self._async_poll_once(due)
+        except asyncio.CancelledError:
+            raise
+        except Exception:  # pylint: disable=broad-except
+            _LOGGER.exception("Unexpected error polling %s", self.coordinator.name)
+        finally:
+            self._task = None
+            self._schedule_next(due)
+
+    async def _async_poll_once(self, due: float) -> None:
+        """Poll or probe the device once, unless the poll is overdue."""
+        loop = self.scheduler.hass.loop
+        async with self.scheduler.lane(self):
+            started = loop.time()
+            # a poll that waited longer than its period is obsolete, the
+            # next one is due anyway
+            if started - due > self.period:
+                _LOGGER.debug(
+                    "Skipping overdue poll of %s (%.1fs late)",
+                    self.coordinator.name,
+                    started - due,
+                )
+            elif self.breaker_open and not await self.coordinator.async_probe():
+                self.probes += 1
+                _LOGGER.debug(
+                    "%s is still offline, next probe in %.0fs",
+                    self.coordinator.name,
+                    self.period,
+                )
+            else:
+                try:
+                    await self.coordinator.async_refresh()
+                finally:
+                    self._record(loop.time() - started)
+
+    @callback
+    def _schedule_next(self, due: float) -> None:
+        """Schedule the next poll one period after the last due time."""
+        if self._stopped:
+            return
+        loop = self.scheduler.hass.loop
+        period = self.period
+        jitter = random.uniform(-JITTER_FRACTION, JITTER_FRACTION) * period
+        next_due = due + period + jitter
+        while next_due <= loop.time():
+            next_due += period
+        if self._unsub is None and self.scheduler.has_job(self):
+            self._schedule(next_due - loop.time())
+
+    def _record(self, latency: float) -> None:
+        """Learn the response latency and reliability of the device."""
+        if self.coordinator.last_update_success:
+            if self.breaker_open:
+                _LOGGER.info("%s is back online", self.coordinator.name)
+            self.failures = 0
+            self.probes = 0
+        else:
+            self.failures += 1
+            if self.failures == BREAKER_FAILURES:
+                _LOGGER.info(
+                    "%s is offline, probing it until it answers again",
+                    self.coordinator.name,
+                )
+
+        if self.latency is None:
+            self.latency = latency
+        else:
+            self.latency += LATENCY_SMOOTHING * (latency - self.latency)
+
+
+class FleetPollScheduler:
+    """Spread the polls of all devices evenly across their intervals.
+
+    Every device keeps its own period, but its polls are shifted by a phase
+    offset, so the polls of a fleet do not burst at the same moment. Devices
+    that answer slowly or time out are polled in a separate, smaller lane so
+    they do not hold up the polls of the responsive devices.
+    """
+
+    def __init__(
+        self,
+        hass: HomeAssistant,
+        max_concurrent: int = DEFAULT_MAX_CONCURRENT_POLLS
+    ) -> None:
+        """Initialize the scheduler."""
+        self.hass = hass
+        self._jobs = []
+        self._count = 0
+        self._fast_lane = asyncio.Semaphore(max_concurrent)
+        self._slow_lane = asyncio.Semaphore(max(1, max_concurrent // 4))
+
+    def lane(self, job: PollJob) -> asyncio.Semaphore:
+        """Return the concurrency lane of the job."""
+        return self._slow_lane if job.slow else self._fast_lane
+
+    def has_job(self, job: PollJob) -> bool:
+        """Return true if the job is still scheduled."""
+        return job in self._jobs
+
+    @callback
+    def async_add(self, coordinator) -> CALLBACK_TYPE:
+        """Start polling the coordinator every poll interval."""
+        phase = (self._count * PHASE_STEP) % 1.0 * coordinator.poll_interval
+        self._count += 1
+
+        job = PollJob(self, coordinator, phase)
+        coordinator.poll_job = job
+        self._jobs.append(job)
+        job.async_start()
+
+        @callback
+        def remove_job() -> None:
+            job.async_stop()
+            coordinator.poll_job = None
+            self._jobs.remove(job)
+
+        return remove_job
+
+    @callback
+    def async_stop(self) -> None:
+        """Stop all polls, read backs and requests in flight, e.g. on shutdown."""
+        for job in self._jobs:
+            job.async_shutdown()
+            job.coordinator.async_stop()
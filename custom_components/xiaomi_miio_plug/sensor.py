@@ -2,8 +2,9 @@
 import logging
 from datetime import timedelta
 
-from homeassistant.core import HomeAssistant
+from homeassistant.core import HomeAssistant, callback
 from homeassistant.helpers.entity_platform import AddEntitiesCallback
+from homeassistant.helpers.update_coordinator import CoordinatorEntity
 from homeassistant.components.sensor import SensorEntity
 from homeassistant.helpers.typing import ConfigType
 from homeassistant.helpers import device_registry as dr
@@ -12,26 +13,27 @@ from homeassistant.const import (
     CONF_HOST,
     CONF_TOKEN
 )
-from miio import DeviceException
-
 from .switch_miot import SystemStatus
 from .const import (
+    CONF_ADAPTIVE_POLLING,
     CONF_MODEL,
-    DATA_KEY,
-    DATA_STATE,
+    CONF_PUSH_UPDATES,
+    COORDINATOR_SENSORS,
+    DATA_COORDINATOR,
+    DATA_DEVICE,
     DOMAIN,
     PLUG_SENSORS,
     MODEL_CHUANGMI_PLUG_V3,
     MODEL_QMI_POWERSTRIP_2A1C1,
     MODELS_POWERSTRIP_MIIO,
     MODELS_MIOT,
+    MIOT_SESSION_SENSORS,
+    SESSION_SENSORS,
     XiaomiPlugSensorDescription
 )
 
 _LOGGER = logging.getLogger(__name__)
 
-SCAN_INTERVAL = timedelta(seconds=30)
-
 async def async_setup_entry(
     hass: HomeAssistant, entry: ConfigType, async_add_entities: AddEntitiesCallback
 ) -> None:
@@ -42,7 +44,8 @@ async def async_setup_entry(
     name = entry.title
     unique_id = entry.unique_id
 
-    plug = hass.data[DOMAIN][host]
+    plug = hass.data[DOMAIN][host][DATA_DEVICE]
+    coordinator = hass.data[DOMAIN][host][DATA_COORDINATOR]
 
     try:
         entities = []
@@ -51,22 +54,43 @@ async def async_setup_entry(
             if ((description.key == "load_power") and
                 (model in MODELS_POWERSTRIP_MIIO or model == MODEL_CHUANGMI_PLUG_V3)):
                     entities.extend(
-                        [XiaomiPlugSensor(entry.options, description, name, unique_id, plug)]
+                        [XiaomiPlugSensor(
+                        entry.options, description, name, unique_id, plug, coordinator
+                    )]
                     )
             elif model in MODELS_MIOT:
                 entities.extend(
-                    [XiaomiPlugSensor(entry.options, description, name, unique_id, plug)]
+                    [XiaomiPlugSensor(
+                        entry.options, description, name, unique_id, plug, coordinator
+                    )]
                 )
 
+        # pushed devices are polled at a fixed interval, as in __init__
+        push = model in MODELS_MIOT and entry.options.get(CONF_PUSH_UPDATES, False)
+        if not push and entry.options.get(CONF_ADAPTIVE_POLLING, False):
+            entities.extend(
+                [XiaomiPlugCoordinatorSensor(
+                    entry.options, description, name, unique_id, plug, coordinator
+                ) for description in COORDINATOR_SENSORS]
+            )
+
+        entities.extend(
+            [XiaomiPlugSessionSensor(
+                entry.options, description, name, unique_id, plug, coordinator
+            ) for description in SESSION_SENSORS
+            if model in MODELS_MIOT or description.key not in MIOT_SESSION_SENSORS]
+        )
+
         async_add_entities(entities)
     except AttributeError as ex:
         _LOGGER.error(ex)
 
-class XiaomiPlugSensor(SensorEntity):
+class XiaomiPlugSensor(CoordinatorEntity, SensorEntity):
     """Implementation of a xiaomi plug sensor."""
     entity_description: XiaomiPlugSensorDescription
 
-    def __init__(self, entry_data, description, name, unique_id, plug):
+    def __init__(self, entry_data, description, name, unique_id, plug, coordinator):
+        super().__init__(coordinator)
         self.entity_description = description
         self._entry_data = entry_data
         self._name = name
@@ -76,8 +100,6 @@ class XiaomiPlugSensor(SensorEntity):
         self._mac = entry_data[CONF_TOKEN]
         self._host = entry_data[CONF_HOST]
         self._plug = plug
-        self._available = True
-        self._skip_update = False
         self._state = None
         self._attr_native_unit_of_measurement = description.native_unit_of_measurement
         self._attr_device_class = description.device_class
@@ -100,18 +122,20 @@ class XiaomiPlugSensor(SensorEntity):
     @property
     def device_info(self):
         """Return the device info."""
-        info = self._plug.info()
+        info = self.coordinator.info
         device_info = {
             "identifiers": {(DOMAIN, self._unique_id)},
             "manufacturer": (self._model or "Xiaomi").split(".", 1)[0].capitalize(),
             "name": self._name,
             "model": self._model,
-            "sw_version": info.firmware_version,
-            "hw_version": info.hardware_version
         }
+        if info is not None:
+            device_info["sw_version"] = info.firmware_version
+            device_info["hw_version"] = info.hardware_version
 
-        if self._mac is not None:
-            device_info["connections"] = {(dr.CONNECTION_NETWORK_MAC, self._mac)}
+        mac = self._mac
+        if mac is not None:
+            device_info["connections"] = {(dr.CONNECTION_NETWORK_MAC, mac)}
 
         return device_info
 
@@ -120,32 +144,80 @@ class XiaomiPlugSensor(SensorEntity):
         """Return the state of the sensor."""
         return self._state
 
-    async def async_update(self):
-        """Fetch state from the device."""
-        # On state change the device doesn't provide the new state immediately.
-        if self._skip_update:
-            self._skip_update = False
-            return
-
-        try:
-            if getattr(self.hass.data[DATA_KEY][self._host], "status", None):
-                state = self.hass.data[DATA_KEY][self._host].status
-            else:
-                state = await self.hass.async_add_executor_job(self._plug.status)
-            _LOGGER.debug("Got new state: %s", state)
-
-            self._available = True
-            self._state = getattr(state, self._attr, None)
-            if self.entity_description.device_class == SensorDeviceClass.VOLTAGE:
-                if self._model == MODEL_QMI_POWERSTRIP_2A1C1:
-                    self._state = self._state / 1000
-            if self.entity_description.device_class == SensorDeviceClass.DATE:
-                self._state = timedelta(seconds=self._state)
-            if self.entity_description.key == "system_status":
-                self._state = SystemStatus(self._state).name
-
-        except DeviceException as ex:
-            if self._available:
-                self._available = False
-                _LOGGER.error("Got exception while fetching the state: %s", ex)
+    @property
+    def _status_attributes(self):
+        """Return the status attributes the sensor reads."""
+        return [self._attr]
+
+    async def async_added_to_hass(self):
+        """Take over the state already fetched by the coordinator."""
+        await super().async_added_to_hass()
+        self.async_on_remove(
+            self.coordinator.async_require_attributes(self._status_attributes)
+        )
+        if self.coordinator.last_update_success and self.coordinator.data is not None:
+            self._update_from_status(self.coordinator.data)
+
+    @callback
+    def _handle_coordinator_update(self):
+        """Handle updated data from the coordinator."""
+        if self.coordinator.last_update_success:
+            self._update_from_status(self.coordinator.data)
+
+        self.async_write_ha_state()
+
+    def _update_from_status(self, state):
+        """Update the sensor from a device status."""
+        self._state = getattr(state, self._attr, None)
+        if self.entity_description.device_class == SensorDeviceClass.VOLTAGE:
+            if self._model == MODEL_QMI_POWERSTRIP_2A1C1:
+                self._state = self._state / 1000
+        if self.entity_description.device_class == SensorDeviceClass.DATE:
+            self._state = timedelta(seconds=self._state)
+        if self.entity_description.key == "system_status":
+            self._state = SystemStatus(self._state).name
+
+
+
+class XiaomiPlugCoordinatorSensor(XiaomiPlugSensor):
+    """Diagnostic sensor reporting a value of the coordinator."""
+
+    @property
+    def _status_attributes(self):
+        """Return no status attributes, the value is kept by the coordinator."""
+        return []
+
+    def _update_from_status(self, state):
+        """Update the sensor from the coordinator."""
+        self._state = getattr(self.coordinator, self._attr, None)
 
+
+class XiaomiPlugSessionSensor(XiaomiPlugCoordinatorSensor):
+    """Diagnostic sensor reporting a request metric of the miIO session.
+
+    The metrics are updated after every poll, failed or not, and stay
+    available while the device does not answer.
+    """
+
+    @property
+    def available(self):
+        """Return true, the metrics are kept while the device is offline."""
+        return True
+
+    @property
+    def extra_state_attributes(self):
+        """Return the latency histogram of the recent requests."""
+        if self._attr.startswith("latency"):
+            return self._plug.async_protocol.metrics.latency_histogram
+        return None
+
+    @callback
+    def _handle_coordinator_update(self):
+        """Handle a poll of the coordinator."""
+        self._update_from_status(self.coordinator.data)
+        self.async_write_ha_state()
+
+    def _update_from_status(self, state):
+        """Update the sensor from the session metrics."""
+        value = getattr(self._plug.async_protocol.metrics, self._attr, None)
+        self._state = round(value, 1) if isinstance(value, float) else value
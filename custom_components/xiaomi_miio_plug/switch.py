@@ -2,8 +2,6 @@
 # pylint: disable=import-error
 import asyncio
 import logging
-from datetime import timedelta
-from functools import partial
 
 from miio import DeviceException
 import voluptuous as vol
@@ -24,7 +22,15 @@ from homeassistant.const import (
     CONF_MAC
 )
 import homeassistant.helpers.config_validation as cv
+from homeassistant.core import (
+    CALLBACK_TYPE,
+    HomeAssistant,
+    ServiceCall,
+    SupportsResponse,
+    callback,
+)
 from homeassistant.helpers import device_registry as dr
+from homeassistant.helpers.update_coordinator import CoordinatorEntity
 from homeassistant.util import slugify
 from homeassistant.components.xiaomi_miio.const import (
     CONF_FLOW_TYPE,
@@ -41,9 +47,12 @@ from .const import (
     ATTR_POWER_PRICE,
     ATTR_PRICE,
     ATTR_WORKING_TIME,
+    ATTR_COUNT_DOWN,
     ATTR_COUNT_DOWN_TIME,
     ATTR_KEEP_RELAY,
+    ATTR_BUZZER,
     CONF_MODEL,
+    DATA_COORDINATOR,
     DATA_STATE,
     DATA_DEVICE,
     DATA_KEY,
@@ -63,8 +72,6 @@ from .const import (
 
 _LOGGER = logging.getLogger(__name__)
 
-SCAN_INTERVAL = timedelta(seconds=30)
-
 DEFAULT_NAME = DEFAULT_NAME + " Switch"
 
 PLATFORM_SCHEMA = PLATFORM_SCHEMA.extend(
@@ -113,6 +120,13 @@ SERVICE_STOP_COUNT_DOWN = "switch_stop_count_down"
 SERVICE_SET_COUNT_DOWN_TIME = "switch_set_count_down_time"
 SERVICE_SET_KEEP_RELAY = "switch_set_keep_relay"
 SERVICE_SET_NOT_KEEP_RELAY = "switch_set_not_keep_relay"
+SERVICE_BULK = "bulk_switch"
+SERVICE_SET_PROPERTIES = "switch_set_properties"
+
+EVENT_BULK_RESULT = f"{DOMAIN}_bulk_result"
+ATTR_ACTION = "action"
+# devices switched at the same time by the bulk service
+BULK_MAX_CONCURRENCY = 16
 
 SERVICE_SCHEMA = vol.Schema({vol.Optional(ATTR_ENTITY_ID): cv.entity_ids})
 
@@ -141,6 +155,62 @@ SERVICE_TO_METHOD = {
     },
 }
 
+BULK_ACTIONS = {
+    "turn_on": "async_turn_on",
+    "turn_off": "async_turn_off",
+    SERVICE_SET_WIFI_LED_ON: "async_set_wifi_led_on",
+    SERVICE_SET_WIFI_LED_OFF: "async_set_wifi_led_off",
+    SERVICE_SET_POWER_MODE: "async_set_power_mode",
+    SERVICE_SET_POWER_PRICE: "async_set_power_price",
+    SERVICE_START_COUNT_DOWN: "async_start_count_down",
+    SERVICE_STOP_COUNT_DOWN: "async_stop_count_down",
+    SERVICE_SET_COUNT_DOWN_TIME: "async_set_count_down_time",
+    SERVICE_SET_KEEP_RELAY: "async_set_keep_relay",
+    SERVICE_SET_NOT_KEEP_RELAY: "async_set_not_keep_relay",
+}
+# the service field an action takes, the other fields are ignored
+BULK_ACTION_PARAMS = {
+    SERVICE_SET_POWER_MODE: ATTR_MODE,
+    SERVICE_SET_POWER_PRICE: ATTR_PRICE,
+    SERVICE_SET_COUNT_DOWN_TIME: ATTR_COUNT_DOWN_TIME,
+}
+
+
+def _require_action_param(value):
+    """Require the parameter of the bulk action, e.g. the mode."""
+    action = value[ATTR_ACTION]
+    param = BULK_ACTION_PARAMS.get(action)
+    if param is not None and param not in value:
+        raise vol.Invalid(f"{action} requires {param}", path=[param])
+    return value
+
+
+SERVICE_SCHEMA_BULK = vol.All(
+    SERVICE_SCHEMA.extend(
+        {
+            vol.Required(ATTR_ACTION): vol.In(list(BULK_ACTIONS)),
+            vol.Optional(ATTR_MODE): vol.All(vol.In(["green", "normal"])),
+            vol.Optional(ATTR_PRICE): vol.All(vol.Coerce(float), vol.Range(min=0)),
+            vol.Optional(ATTR_COUNT_DOWN_TIME): vol.All(
+                vol.Coerce(int), vol.Range(min=0)
+            ),
+        }
+    ),
+    _require_action_param,
+)
+
+SERVICE_SCHEMA_SET_PROPERTIES = SERVICE_SCHEMA.extend(
+    {
+        vol.Optional(ATTR_WIFI_LED): cv.boolean,
+        vol.Optional(ATTR_BUZZER): cv.boolean,
+        vol.Optional(ATTR_KEEP_RELAY): cv.boolean,
+        vol.Optional(ATTR_COUNT_DOWN): cv.boolean,
+        vol.Optional(ATTR_COUNT_DOWN_TIME): vol.All(
+            vol.Coerce(int), vol.Range(min=0)
+        ),
+    }
+)
+
 SERVICE_TO_METHOD_V2 = {
     SERVICE_START_COUNT_DOWN: {"method": "async_start_count_down"},
     SERVICE_STOP_COUNT_DOWN: {"method": "async_stop_count_down"},
@@ -152,6 +222,169 @@ SERVICE_TO_METHOD_V2 = {
     SERVICE_SET_NOT_KEEP_RELAY: {"method": "async_set_not_keep_relay"},
 }
 
+class SwitchEntityIndex:
+    """Switch entities by entity id and by host, for the service calls."""
+
+    def __init__(self) -> None:
+        """Initialize the index."""
+        self.by_entity_id = {}
+        self.by_host = {}
+
+    @callback
+    def async_add(self, entity) -> CALLBACK_TYPE:
+        """Index an added entity, the returned callback removes it again."""
+        entity_id = entity.entity_id
+        host = entity.coordinator.host
+        self.by_entity_id[entity_id] = entity
+        self.by_host.setdefault(host, []).append(entity)
+
+        @callback
+        def remove_entity() -> None:
+            self.by_entity_id.pop(entity_id, None)
+            self.by_host[host].remove(entity)
+            if not self.by_host[host]:
+                del self.by_host[host]
+
+        return remove_entity
+
+    def targets(self, entity_ids=None) -> list:
+        """Return the entities of the given ids, all entities without ids."""
+        if not entity_ids:
+            return list(self.by_entity_id.values())
+        return [
+            self.by_entity_id[entity_id]
+            for entity_id in entity_ids
+            if entity_id in self.by_entity_id
+        ]
+
+
+@callback
+def async_setup_services(hass: HomeAssistant) -> None:
+    """Register the switch services once for all config entries."""
+    index = hass.data[DATA_KEY] = SwitchEntityIndex()
+
+    async def async_service_handler(service: ServiceCall):
+        """Map services to methods on Xiaomi Plug/PowerStrip."""
+        method = SERVICE_TO_METHOD.get(service.service)
+        if method is None:
+            method = SERVICE_TO_METHOD_V2.get(service.service)
+        params = {
+            key: value
+            for key, value in service.data.items()
+            if key != ATTR_ENTITY_ID
+        }
+        devices = [
+            device
+            for device in index.targets(service.data.get(ATTR_ENTITY_ID))
+            if hasattr(device, method["method"])
+        ]
+        for device in devices:
+            await getattr(device, method["method"])(**params)
+
+        if devices:
+            await asyncio.gather(
+                *(device.async_update_ha_state(True) for device in devices)
+            )
+
+    for service, method in {**SERVICE_TO_METHOD, **SERVICE_TO_METHOD_V2}.items():
+        hass.services.async_register(
+            DOMAIN,
+            service,
+            async_service_handler,
+            schema=method.get("schema", SERVICE_SCHEMA),
+        )
+
+    async def async_bulk_service_handler(service: ServiceCall):
+        """Run an action on many devices at once and report per entity."""
+        action = service.data[ATTR_ACTION]
+        method = BULK_ACTIONS[action]
+        params = {}
+        param = BULK_ACTION_PARAMS.get(action)
+        if param is not None:
+            params[param] = service.data[param]
+
+        # the channels of a host run one after the other, the hosts at once
+        hosts = {}
+        for device in index.targets(service.data.get(ATTR_ENTITY_ID)):
+            hosts.setdefault(device.coordinator.host, []).append(device)
+
+        results = {}
+        semaphore = asyncio.Semaphore(BULK_MAX_CONCURRENCY)
+
+        async def async_run_host(host_devices):
+            async with semaphore:
+                for device in host_devices:
+                    if not hasattr(device, method):
+                        results[device.entity_id] = None
+                        continue
+                    try:
+                        result = await getattr(device, method)(**params)
+                    except (DeviceException, ValueError) as ex:
+                        _LOGGER.error(
+                            "%s of %s failed: %s", action, device.entity_id, ex
+                        )
+                        result = False
+                    results[device.entity_id] = result
+
+        await asyncio.gather(
+            *(async_run_host(host_devices) for host_devices in hosts.values())
+        )
+
+        result = {
+            ATTR_ACTION: action,
+            "succeeded": [eid for eid, ok in results.items() if ok],
+            "failed": [eid for eid, ok in results.items() if ok is False],
+            "skipped": [eid for eid, ok in results.items() if ok is None],
+        }
+        hass.bus.async_fire(EVENT_BULK_RESULT, result)
+        return result
+
+    hass.services.async_register(
+        DOMAIN,
+        SERVICE_BULK,
+        async_bulk_service_handler,
+        schema=SERVICE_SCHEMA_BULK,
+        supports_response=SupportsResponse.OPTIONAL,
+    )
+
+    async def async_set_properties_handler(service: ServiceCall):
+        """Write several settings per device and report the result codes."""
+        settings = {
+            key: value
+            for key, value in service.data.items()
+            if key != ATTR_ENTITY_ID
+        }
+        devices = [
+            device
+            for device in index.targets(service.data.get(ATTR_ENTITY_ID))
+            if hasattr(device, "async_set_properties")
+        ]
+        results = {}
+
+        async def async_set_device(device):
+            try:
+                result = await device.async_set_properties(**settings)
+            except (DeviceException, ValueError) as ex:
+                _LOGGER.error(
+                    "Setting %s of %s failed: %s", list(settings), device.entity_id, ex
+                )
+                result = {setting: None for setting in settings}
+            results[device.entity_id] = result
+
+        # the writes of all devices are sent at once, one request per device
+        await asyncio.gather(*(async_set_device(device) for device in devices))
+
+        return results
+
+    hass.services.async_register(
+        DOMAIN,
+        SERVICE_SET_PROPERTIES,
+        async_set_properties_handler,
+        schema=SERVICE_SCHEMA_SET_PROPERTIES,
+        supports_response=SupportsResponse.OPTIONAL,
+    )
+
+
 async def async_setup_platform(hass, config, async_add_entities, discovery_info=None):
     """Import Xiaomi Plug/PowerStrip configuration from YAML."""
     _LOGGER.warning(
@@ -177,34 +410,32 @@ async def async_setup_entry(hass, config_entry, async_add_entities):
     unique_id = config_entry.unique_id
 
     if config_entry.options[CONF_FLOW_TYPE] == CONF_DEVICE:
-        if DATA_KEY not in hass.data:
-            hass.data[DATA_KEY] = {}
-
-        plug = hass.data[DOMAIN][host]
+        plug = hass.data[DOMAIN][host][DATA_DEVICE]
+        coordinator = hass.data[DOMAIN][host][DATA_COORDINATOR]
         if model in MODELS_PLUG_WITH_USB_MIIO:
             # The device has two switchable channels (mains and a USB port).
             # A switch device per channel will be created.
             for channel_usb in [True, False]:
-                device = ChuangMiPlugSwitch(name, plug, model, unique_id, channel_usb)
+                device = ChuangMiPlugSwitch(
+                    name, plug, model, unique_id, coordinator, channel_usb
+                )
                 entities.append(device)
-                hass.data[DATA_KEY][host] = device
         elif model in MODELS_POWERSTRIP_MIIO:
-            device = XiaomiPowerStripSwitch(name, plug, model, unique_id)
+            device = XiaomiPowerStripSwitch(name, plug, model, unique_id, coordinator)
             entities.append(device)
-            hass.data[DATA_KEY][host] = device
         elif model in MODELS_PLUG_MIIO:
-            device = XiaomiPlugGenericSwitch(name, plug, model, unique_id)
+            device = XiaomiPlugGenericSwitch(name, plug, model, unique_id, coordinator)
             entities.append(device)
-            hass.data[DATA_KEY][host] = device
         elif model in MODELS_ACPARTNER_MIIO:
-            device = XiaomiAirConditioningCompanionSwitch(name, plug, model, unique_id)
+            device = XiaomiAirConditioningCompanionSwitch(
+                name, plug, model, unique_id, coordinator
+            )
             entities.append(device)
-            hass.data[DATA_KEY][host] = device
-            #hass.data[DATA_KEY][host][DATA_DEVICE] = device
         elif model in MODELS_MIOT:
-            device = XiaomiPowerStripMiot(name, plug, model, unique_id, config_entry.options)
+            device = XiaomiPowerStripMiot(
+                name, plug, model, unique_id, coordinator, config_entry.options
+            )
             entities.append(device)
-            hass.data[DATA_KEY][host] = device
         else:
             _LOGGER.error(
                 "Unsupported device found! Please create an issue at "
@@ -214,56 +445,15 @@ async def async_setup_entry(hass, config_entry, async_add_entities):
             )
             return
 
-        async def async_service_handler(service):
-            """Map services to methods on Xiaomi Plug/PowerStrip."""
-            method = SERVICE_TO_METHOD.get(service.service)
-            if method is None:
-                method = SERVICE_TO_METHOD_V2.get(service.service)
-            params = {
-                key: value
-                for key, value in service.data.items()
-                if key != ATTR_ENTITY_ID
-            }
-            entity_ids = service.data.get(ATTR_ENTITY_ID)
-            if entity_ids:
-                devices = [
-                    device
-                    for device in hass.data[DATA_KEY].values()
-                    if device.entity_id in entity_ids
-                ]
-            else:
-                devices = hass.data[DATA_KEY].values()
-            update_tasks = []
-            for device in devices:
-                if not hasattr(device, method["method"]):
-                    continue
-                await getattr(device, method["method"])(**params)
-                update_tasks.append(device.async_update_ha_state(True))
-
-            if update_tasks:
-                await asyncio.wait(update_tasks)
-
-        for service, _ in SERVICE_TO_METHOD.items():
-            schema = SERVICE_TO_METHOD[service].get("schema", SERVICE_SCHEMA)
-            hass.services.async_register(
-                DOMAIN, service, async_service_handler, schema=schema
-            )
-        if model in MODELS_MIOT:
-            for service, _ in SERVICE_TO_METHOD_V2.items():
-                schema = SERVICE_TO_METHOD_V2[service].get("schema", SERVICE_SCHEMA)
-                hass.services.async_register(
-                    DOMAIN, service, async_service_handler, schema=schema
-                )
-
-
     async_add_entities(entities, update_before_add=False)
 
 
-class XiaomiPlugGenericSwitch(SwitchEntity):
+class XiaomiPlugGenericSwitch(CoordinatorEntity, SwitchEntity):
     """Representation of a Xiaomi Plug Generic."""
 
-    def __init__(self, name, plug, model, unique_id):
+    def __init__(self, name, plug, model, unique_id, coordinator):
         """Initialize the plug switch."""
+        super().__init__(coordinator)
         self._name = name
         self._plug = plug
         self._model = model
@@ -273,10 +463,11 @@ class XiaomiPlugGenericSwitch(SwitchEntity):
         self._icon = "mdi:power-socket"
         self._available = False
         self._state = None
-        self._status = None
         self._state_attrs = {ATTR_TEMPERATURE: None, ATTR_MODEL: self._model}
         self._device_features = FEATURE_FLAGS_GENERIC
-        self._skip_update = False
+        self._written_at = 0.0
+        self._status_attributes = ["is_on", ATTR_TEMPERATURE]
+        self._confirm_attributes = ["is_on"]
 
     @property
     def unique_id(self):
@@ -296,7 +487,7 @@ class XiaomiPlugGenericSwitch(SwitchEntity):
     @property
     def available(self):
         """Return true when state is known."""
-        return self._available
+        return super().available and self._available
 
     @property
     def extra_state_attributes(self):
@@ -311,39 +502,74 @@ class XiaomiPlugGenericSwitch(SwitchEntity):
     @property
     def device_info(self):
         """Return the device info."""
-        info = self._plug.info()
+        info = self.coordinator.info
         device_info = {
             "identifiers": {(DOMAIN, self._unique_id)},
             "manufacturer": (self._model or "Xiaomi").split(".", 1)[0].capitalize(),
             "name": self._name,
             "model": self._model,
-            "sw_version": info.firmware_version,
-            "hw_version": info.hardware_version
         }
+        if info is not None:
+            device_info["sw_version"] = info.firmware_version
+            device_info["hw_version"] = info.hardware_version
 
-        if self._mac is not None:
-            device_info["connections"] = {(dr.CONNECTION_NETWORK_MAC, self._mac)}
+        mac = self._mac
+        if mac is None and info is not None:
+            mac = info.mac_address
+        if mac is not None:
+            device_info["connections"] = {(dr.CONNECTION_NETWORK_MAC, mac)}
 
         return device_info
 
     @property
     def status(self):
         """ Return the device status """
-        return self._status
+        return self.coordinator.data
+
+    async def async_added_to_hass(self):
+        """Take over the state already fetched by the coordinator."""
+        await super().async_added_to_hass()
+        self.async_on_remove(
+            self.coordinator.async_require_attributes(self._status_attributes)
+        )
+        self.async_on_remove(self.hass.data[DATA_KEY].async_add(self))
+        if self.coordinator.last_update_success and self.coordinator.data is not None:
+            self._available = True
+            self._update_from_status(self.coordinator.data)
+
+    @callback
+    def _handle_coordinator_update(self):
+        """Handle updated data from the coordinator."""
+        if self.coordinator.last_update_success:
+            self._available = True
+            state = self._state
+            self._update_from_status(self.coordinator.data)
+            # a status requested before the last switch command is outdated
+            # for the relay, the read back will confirm or correct it
+            if self.coordinator.data_requested_at < self._written_at:
+                self._state = state
+
+        self.async_write_ha_state()
 
     async def _try_command(self, mask_error, func, *args, **kwargs):
         """Call a plug command handling error messages."""
         try:
-            result = await self.hass.async_add_executor_job(
-                partial(func, *args, **kwargs)
-            )
+            result = await func(*args, **kwargs)
 
             _LOGGER.debug("Response received from plug: %s", result)
 
-            # The Chuangmi Plug V3 returns 0 on success on usb_on/usb_off.
-            if func in ["usb_on", "usb_off"] and result == 0:
+            # The Chuangmi Plug V3 returns 0 on success on usb_on/usb_off,
+            # as the only element of the result list.
+            if func.__name__ in ["async_usb_on", "async_usb_off"] and result in (
+                0,
+                [0],
+            ):
                 return True
 
+            # MIoT devices answer a result code per property, 0 on success
+            if isinstance(result, list) and result and isinstance(result[0], dict):
+                return all(prop.get("code") == 0 for prop in result)
+
             return result == SUCCESS
         except DeviceException as exc:
             if self._available:
@@ -352,50 +578,53 @@ class XiaomiPlugGenericSwitch(SwitchEntity):
 
             return False
 
+    async def _try_setting(self, mask_error, func, *args, **kwargs):
+        """Write a setting, the rarely polled settings are fetched again."""
+        result = await self._try_command(mask_error, func, *args, **kwargs)
+        if result:
+            self.coordinator.async_expire_tiers()
+
+        return result
+
     async def async_turn_on(self, **kwargs):
         """Turn the plug on."""
-        result = await self._try_command("Turning the plug on failed.", self._plug.on)
+        result = await self._try_command("Turning the plug on failed.", self._plug.async_on)
 
         if result:
-            self._state = True
-            self._skip_update = True
+            self._async_switched(True)
+
+        return result
 
     async def async_turn_off(self, **kwargs):
         """Turn the plug off."""
-        result = await self._try_command("Turning the plug off failed.", self._plug.off)
+        result = await self._try_command("Turning the plug off failed.", self._plug.async_off)
 
         if result:
-            self._state = False
-            self._skip_update = True
-
-    async def async_update(self):
-        """Fetch state from the device."""
-        # On state change the device doesn't provide the new state immediately.
-        if self._skip_update:
-            self._skip_update = False
-            return
+            self._async_switched(False)
 
-        try:
-            state = await self.hass.async_add_executor_job(self._plug.status)
-            _LOGGER.debug("Got new state: %s", state)
-            self._status = state
+        return result
 
-            self._available = True
-            self._state = state.is_on
-            self._state_attrs[ATTR_TEMPERATURE] = state.temperature
+    @callback
+    def _async_switched(self, state: bool) -> None:
+        """Show the commanded state until the relay is read back."""
+        self._state = state
+        self._written_at = self.hass.loop.time()
+        self.async_write_ha_state()
+        self.coordinator.async_boost_polling()
+        self.coordinator.async_confirm_write(self._confirm_attributes)
 
-        except DeviceException as ex:
-            if self._available:
-                self._available = False
-                _LOGGER.error("Got exception while fetching the state: %s", ex)
+    def _update_from_status(self, state):
+        """Update the entity from a device status."""
+        self._state = state.is_on
+        self._state_attrs[ATTR_TEMPERATURE] = state.temperature
 
     async def async_set_wifi_led_on(self):
         """Turn the wifi led on."""
         if self._device_features & FEATURE_SET_WIFI_LED == 0:
             return
 
-        await self._try_command(
-            "Turning the wifi led on failed.", self._plug.set_wifi_led, True
+        return await self._try_setting(
+            "Turning the wifi led on failed.", self._plug.async_set_wifi_led, True
         )
 
     async def async_set_wifi_led_off(self):
@@ -403,8 +632,8 @@ class XiaomiPlugGenericSwitch(SwitchEntity):
         if self._device_features & FEATURE_SET_WIFI_LED == 0:
             return
 
-        await self._try_command(
-            "Turning the wifi led off failed.", self._plug.set_wifi_led, False
+        return await self._try_setting(
+            "Turning the wifi led off failed.", self._plug.async_set_wifi_led, False
         )
 
     async def async_set_power_price(self, price: int):
@@ -412,9 +641,9 @@ class XiaomiPlugGenericSwitch(SwitchEntity):
         if self._device_features & FEATURE_SET_POWER_PRICE == 0:
             return
 
-        await self._try_command(
+        return await self._try_setting(
             "Setting the power price of the power strip failed.",
-            self._plug.set_power_price,
+            self._plug.async_set_power_price,
             price,
         )
 
@@ -423,8 +652,8 @@ class XiaomiPlugGenericSwitch(SwitchEntity):
         if self._device_features & FEATURE_COUNTDOWN == 0:
             return
 
-        await self._try_command(
-            "Start count down failed.", self._plug.count_down, True
+        return await self._try_setting(
+            "Start count down failed.", self._plug.async_count_down, True
         )
 
     async def async_stop_count_down(self):
@@ -432,19 +661,19 @@ class XiaomiPlugGenericSwitch(SwitchEntity):
         if self._device_features & FEATURE_COUNTDOWN == 0:
             return
 
-        await self._try_command(
-            "Stop count down failed.", self._plug.count_down, False
+        return await self._try_setting(
+            "Stop count down failed.", self._plug.async_count_down, False
         )
 
-    async def async_set_count_down_time(self, price: int):
+    async def async_set_count_down_time(self, count_down_time: int):
         """Set the count time."""
         if self._device_features & FEATURE_COUNTDOWN == 0:
             return
 
-        await self._try_command(
+        return await self._try_setting(
             "Setting the count time of the power strip failed.",
-            self._plug.set_count_down_time,
-            price,
+            self._plug.async_set_count_down_time,
+            count_down_time,
         )
 
     async def async_set_keep_relay(self):
@@ -452,8 +681,8 @@ class XiaomiPlugGenericSwitch(SwitchEntity):
         if self._device_features & FEATURE_SET_KEEP_RELAY == 0:
             return
 
-        await self._try_command(
-            "Set keep relay failed.", self._plug.set_keep_relay, True
+        return await self._try_setting(
+            "Set keep relay failed.", self._plug.async_set_keep_relay, True
         )
 
     async def async_set_not_keep_relay(self):
@@ -461,17 +690,17 @@ class XiaomiPlugGenericSwitch(SwitchEntity):
         if self._device_features & FEATURE_SET_KEEP_RELAY == 0:
             return
 
-        await self._try_command(
-            "Set not keep relay failed.", self._plug.set_keep_relay, False
+        return await self._try_setting(
+            "Set not keep relay failed.", self._plug.async_set_keep_relay, False
         )
 
 
 class XiaomiPowerStripSwitch(XiaomiPlugGenericSwitch):
     """Representation of a Xiaomi Power Strip."""
 
-    def __init__(self, name, plug, model, unique_id):
+    def __init__(self, name, plug, model, unique_id, coordinator):
         """Initialize the plug switch."""
-        super().__init__(name, plug, model, unique_id)
+        super().__init__(name, plug, model, unique_id, coordinator)
 
         if self._model == MODEL_ZIMI_POWERSTRIP_V2:
             self._device_features = FEATURE_FLAGS_POWER_STRIP_V2
@@ -489,49 +718,37 @@ class XiaomiPowerStripSwitch(XiaomiPlugGenericSwitch):
         if self._device_features & FEATURE_SET_POWER_PRICE == 1:
             self._state_attrs[ATTR_POWER_PRICE] = None
 
-    async def async_update(self):
-        """Fetch state from the device."""
-        # On state change the device doesn't provide the new state immediately.
-        if self._skip_update:
-            self._skip_update = False
-            return
-
-        try:
-            state = await self.hass.async_add_executor_job(self._plug.status)
-            _LOGGER.debug("Got new state: %s", state)
-            self._status = state
+        self._status_attributes.append(ATTR_LOAD_POWER)
+        if self._device_features & FEATURE_SET_POWER_MODE == 1:
+            self._status_attributes.append("mode")
 
-            self._available = True
-            self._state = state.is_on
-            self._state_attrs.update(
-                {ATTR_TEMPERATURE: state.temperature, ATTR_LOAD_POWER: state.load_power}
-            )
+    def _update_from_status(self, state):
+        """Update the entity from a device status."""
+        self._state = state.is_on
+        self._state_attrs.update(
+            {ATTR_TEMPERATURE: state.temperature, ATTR_LOAD_POWER: state.load_power}
+        )
 
-            if self._device_features & FEATURE_SET_POWER_MODE == 1 and state.mode:
-                self._state_attrs[ATTR_POWER_MODE] = state.mode.value
+        if self._device_features & FEATURE_SET_POWER_MODE == 1 and state.mode:
+            self._state_attrs[ATTR_POWER_MODE] = state.mode.value
 
-            if self._device_features & FEATURE_SET_WIFI_LED == 1 and state.wifi_led:
-                self._state_attrs[ATTR_WIFI_LED] = state.wifi_led
+        if self._device_features & FEATURE_SET_WIFI_LED == 1 and state.wifi_led:
+            self._state_attrs[ATTR_WIFI_LED] = state.wifi_led
 
-            if (
-                self._device_features & FEATURE_SET_POWER_PRICE == 1
-                and state.power_price
-            ):
-                self._state_attrs[ATTR_POWER_PRICE] = state.power_price
-
-        except DeviceException as ex:
-            if self._available:
-                self._available = False
-                _LOGGER.error("Got exception while fetching the state: %s", ex)
+        if (
+            self._device_features & FEATURE_SET_POWER_PRICE == 1
+            and state.power_price
+        ):
+            self._state_attrs[ATTR_POWER_PRICE] = state.power_price
 
     async def async_set_power_mode(self, mode: str):
         """Set the power mode."""
         if self._device_features & FEATURE_SET_POWER_MODE == 0:
             return
 
-        await self._try_command(
+        return await self._try_setting(
             "Setting the power mode of the power strip failed.",
-            self._plug.set_power_mode,
+            self._plug.async_set_power_mode,
             PowerMode(mode),
         )
 
@@ -539,14 +756,14 @@ class XiaomiPowerStripSwitch(XiaomiPlugGenericSwitch):
 class ChuangMiPlugSwitch(XiaomiPlugGenericSwitch):
     """Representation of a Chuang Mi Plug V1 and V3."""
 
-    def __init__(self, name, plug, model, unique_id, channel_usb):
+    def __init__(self, name, plug, model, unique_id, coordinator, channel_usb):
         """Initialize the plug switch."""
         name = f"{name} USB" if channel_usb else name
 
         if unique_id is not None and channel_usb:
             unique_id = f"{unique_id}-usb"
 
-        super().__init__(name, plug, model, unique_id)
+        super().__init__(name, plug, model, unique_id, coordinator)
         self._channel_usb = channel_usb
 
         if self._model == MODEL_CHUANGMI_PLUG_V3:
@@ -555,128 +772,109 @@ class ChuangMiPlugSwitch(XiaomiPlugGenericSwitch):
             if self._channel_usb is False:
                 self._state_attrs[ATTR_LOAD_POWER] = None
 
+        self._status_attributes = [ATTR_TEMPERATURE, ATTR_WIFI_LED]
+        if self._channel_usb:
+            self._status_attributes.append("usb_power")
+            self._confirm_attributes = ["usb_power"]
+        else:
+            self._status_attributes.extend(["is_on", ATTR_LOAD_POWER])
+
     async def async_turn_on(self, **kwargs):
         """Turn a channel on."""
         if self._channel_usb:
             result = await self._try_command(
-                "Turning the plug on failed.", self._plug.usb_on
+                "Turning the plug on failed.", self._plug.async_usb_on
             )
         else:
             result = await self._try_command(
-                "Turning the plug on failed.", self._plug.on
+                "Turning the plug on failed.", self._plug.async_on
             )
 
         if result:
-            self._state = True
-            self._skip_update = True
+            self._async_switched(True)
+
+        return result
 
     async def async_turn_off(self, **kwargs):
         """Turn a channel off."""
         if self._channel_usb:
             result = await self._try_command(
-                "Turning the plug on failed.", self._plug.usb_off
+                "Turning the plug on failed.", self._plug.async_usb_off
             )
         else:
             result = await self._try_command(
-                "Turning the plug on failed.", self._plug.off
+                "Turning the plug on failed.", self._plug.async_off
             )
 
         if result:
-            self._state = False
-            self._skip_update = True
-
-    async def async_update(self):
-        """Fetch state from the device."""
-        # On state change the device doesn't provide the new state immediately.
-        if self._skip_update:
-            self._skip_update = False
-            return
-
-        try:
-            state = await self.hass.async_add_executor_job(self._plug.status)
-            _LOGGER.debug("Got new state: %s", state)
-            self._status = state
+            self._async_switched(False)
 
-            self._available = True
-            if self._channel_usb:
-                self._state = state.usb_power
-            else:
-                self._state = state.is_on
+        return result
 
-            self._state_attrs[ATTR_TEMPERATURE] = state.temperature
+    def _update_from_status(self, state):
+        """Update the entity from a device status."""
+        if self._channel_usb:
+            self._state = state.usb_power
+        else:
+            self._state = state.is_on
 
-            if state.wifi_led:
-                self._state_attrs[ATTR_WIFI_LED] = state.wifi_led
+        self._state_attrs[ATTR_TEMPERATURE] = state.temperature
 
-            if self._channel_usb is False and state.load_power:
-                self._state_attrs[ATTR_LOAD_POWER] = state.load_power
+        if state.wifi_led:
+            self._state_attrs[ATTR_WIFI_LED] = state.wifi_led
 
-        except DeviceException as ex:
-            if self._available:
-                self._available = False
-                _LOGGER.error("Got exception while fetching the state: %s", ex)
+        if self._channel_usb is False and state.load_power:
+            self._state_attrs[ATTR_LOAD_POWER] = state.load_power
 
 
 class XiaomiAirConditioningCompanionSwitch(XiaomiPlugGenericSwitch):
     """Representation of a Xiaomi AirConditioning Companion."""
 
-    def __init__(self, name, plug, model, unique_id):
+    def __init__(self, name, plug, model, unique_id, coordinator):
         """Initialize the acpartner switch."""
-        super().__init__(name, plug, model, unique_id)
+        super().__init__(name, plug, model, unique_id, coordinator)
 
         self._state_attrs.update({ATTR_TEMPERATURE: None, ATTR_LOAD_POWER: None})
+        self._status_attributes = ["power_socket", ATTR_LOAD_POWER]
+        # the status of the companion can't be built without the load power
+        self._confirm_attributes = ["power_socket", ATTR_LOAD_POWER]
 
     async def async_turn_on(self, **kwargs):
         """Turn the socket on."""
         result = await self._try_command(
-            "Turning the socket on failed.", self._plug.socket_on
+            "Turning the socket on failed.", self._plug.async_socket_on
         )
 
         if result:
-            self._state = True
-            self._skip_update = True
+            self._async_switched(True)
+
+        return result
 
     async def async_turn_off(self, **kwargs):
         """Turn the socket off."""
         result = await self._try_command(
-            "Turning the socket off failed.", self._plug.socket_off
+            "Turning the socket off failed.", self._plug.async_socket_off
         )
 
         if result:
-            self._state = False
-            self._skip_update = True
-
-    async def async_update(self):
-        """Fetch state from the device."""
-        # On state change the device doesn't provide the new state immediately.
-        if self._skip_update:
-            self._skip_update = False
-            return
+            self._async_switched(False)
 
-        try:
-            state = await self.hass.async_add_executor_job(self._plug.status)
-            _LOGGER.debug("Got new state: %s", state)
-            self._status = state
-
-            self._available = True
-            self._state = state.power_socket == "on"
-            self._state_attrs[ATTR_LOAD_POWER] = state.load_power
+        return result
 
-        except DeviceException as ex:
-            if self._available:
-                self._available = False
-                _LOGGER.error("Got exception while fetching the state: %s", ex)
+    def _update_from_status(self, state):
+        """Update the entity from a device status."""
+        self._state = state.power_socket == "on"
+        self._state_attrs[ATTR_LOAD_POWER] = state.load_power
 
 
 class XiaomiPowerStripMiot(XiaomiPlugGenericSwitch):
     """Representation of a Xiaomi Power Strip Miot"""
 
-    def __init__(self, name, plug, model, unique_id, config):
+    def __init__(self, name, plug, model, unique_id, coordinator, config):
         """Initialize the plug switch."""
-        super().__init__(name, plug, model, unique_id)
+        super().__init__(name, plug, model, unique_id, coordinator)
         self._mac = config.get(CONF_MAC, config.get(CONF_TOKEN))
         self._host = config[CONF_HOST]
-        self._status = None
 
         if self._model == MODEL_QMI_POWERSTRIP_2A1C1:
             self._device_features = FEATURE_FLAGS_POWER_STRIP_V3
@@ -700,46 +898,64 @@ class XiaomiPowerStripMiot(XiaomiPlugGenericSwitch):
         if self._model != MODEL_QMI_PLUG_TW02:
             self._state_attrs[ATTR_KEEP_RELAY] = None
 
-    async def async_update(self):
-        """Fetch state from the device."""
-        # On state change the device doesn't provide the new state immediately.
-        if self._skip_update:
-            self._skip_update = False
-            return
-
-        try:
-            state = await self.hass.async_add_executor_job(self._plug.status)
-            self._status = state
-            _LOGGER.debug("Got new state: %s", state)
-
-            self._available = True
-            self._state = state.is_on
-            self._state_attrs.update(
-                {ATTR_TEMPERATURE: state.temperature, ATTR_LOAD_POWER: state.load_power}
-            )
+        self._status_attributes.extend([ATTR_LOAD_POWER, ATTR_WORKING_TIME])
+        if self._device_features & FEATURE_SET_POWER_MODE == 1:
+            self._status_attributes.append("mode")
+        if self._model != MODEL_QMI_PLUG_TW02:
+            self._status_attributes.append(ATTR_KEEP_RELAY)
 
-            if self._device_features & FEATURE_SET_POWER_MODE == 1 and state.mode:
-                self._state_attrs[ATTR_POWER_MODE] = state.mode
+    def _update_from_status(self, state):
+        """Update the entity from a device status."""
+        self._state = state.is_on
+        self._state_attrs.update(
+            {ATTR_TEMPERATURE: state.temperature, ATTR_LOAD_POWER: state.load_power}
+        )
 
-            if self._device_features & FEATURE_SET_WIFI_LED == 1 and state.wifi_led:
-                self._state_attrs[ATTR_WIFI_LED] = state.wifi_led
+        if self._device_features & FEATURE_SET_POWER_MODE == 1 and state.mode:
+            self._state_attrs[ATTR_POWER_MODE] = state.mode
 
-            self._state_attrs[ATTR_WORKING_TIME] = state.working_time
-            if self._model != MODEL_QMI_PLUG_TW02:
-                self._state_attrs[ATTR_KEEP_RELAY] = state.keep_relay
+        if self._device_features & FEATURE_SET_WIFI_LED == 1 and state.wifi_led:
+            self._state_attrs[ATTR_WIFI_LED] = state.wifi_led
 
-        except DeviceException as ex:
-            if self._available:
-                self._available = False
-                _LOGGER.error("Got exception while fetching the state: %s", ex)
+        self._state_attrs[ATTR_WORKING_TIME] = state.working_time
+        if self._model != MODEL_QMI_PLUG_TW02:
+            self._state_attrs[ATTR_KEEP_RELAY] = state.keep_relay
 
     async def async_set_power_mode(self, mode: str):
         """Set the power mode."""
         if self._device_features & FEATURE_SET_POWER_MODE == 0:
             return
 
-        await self._try_command(
+        return await self._try_setting(
             "Setting the power mode of the power strip failed.",
-            self._plug.set_power_mode,
+            self._plug.async_set_power_mode,
             PowerMode(mode),
         )
+
+    async def async_set_properties(self, **settings):
+        """Write several settings in one request.
+
+        Returns the result code per setting, 0 on success and None if the
+        device doesn't support the setting, didn't answer or a concurrent
+        write of another value superseded it.
+        """
+        properties = self._plug.setting_properties
+        values = {
+            properties[setting]: value
+            for setting, value in settings.items()
+            if setting in properties
+        }
+        codes = {}
+        if values:
+            try:
+                codes = await self._plug.async_set_properties(values)
+            except DeviceException as exc:
+                if self._available:
+                    _LOGGER.error("Setting %s failed: %s", list(settings), exc)
+                    self._available = False
+            else:
+                self.coordinator.async_expire_tiers()
+
+        return {
+            setting: codes.get(properties.get(setting)) for setting in settings
+        }
@@ -2,6 +2,7 @@
 Support for Xiaomi AirFryer.
 
 """
+import asyncio
 import enum
 from typing import Any, Dict
 import logging
@@ -9,7 +10,10 @@ import click
 
 from miio.click_common import command, format_output
 from miio.device import DeviceStatus
+from miio.exceptions import DeviceError, PayloadDecodeException
+from miio.exceptions import DeviceException as MiioDeviceException
 from miio.miot_device import MiotDevice
+from .transport import AsyncMiioDevice
 from .const import (
     MODEL_QMI_POWERSTRIP_2A1C1,
     MODEL_QMI_PLUG_TW02
@@ -17,6 +21,8 @@ from .const import (
 
 _LOGGER = logging.getLogger(__name__)
 
+# seconds in which property writes are collected into one set_properties request
+WRITE_COALESCE_WINDOW = 0.05
 
 MIOT_MAPPING = {
     # https://home.miot-spec.com/spec?type=urn%3Amiot-spec-v2%3Adevice%3Aoutlet%3A0000A002%3Aqmi-2a1c1%3A1%3A0000C816
@@ -74,7 +80,14 @@ MIOT_MAPPING = {
 }
 
 
-class DeviceException(Exception):
+# (siid, piid) -> property name, to decode the properties_changed messages
+MIOT_PROPERTY_INDEX = {
+    model: {(prop["siid"], prop["piid"]): did for did, prop in mapping.items()}
+    for model, mapping in MIOT_MAPPING.items()
+}
+
+
+class DeviceException(MiioDeviceException):
     """Exception wrapping any communication errors with the device."""
 
 
@@ -115,7 +128,7 @@ class SwitchStatusMiot(DeviceStatus):
     @property
     def is_on(self) -> bool:
         """True if device is currently on."""
-        return self.data["status"]
+        return self.data.get("status")
 
     @property
     def mode(self) -> int:
@@ -134,77 +147,77 @@ class SwitchStatusMiot(DeviceStatus):
     @property
     def temperature(self) -> int:
         """Temperature"""
-        return self.data["temperature"]
+        return self.data.get("temperature")
 
     @property
     def working_time(self) -> int:
         """Working time"""
-        return self.data["working_time"]
+        return self.data.get("working_time")
 
     @property
     def load_power(self) -> int:
         """Load Power"""
-        return self.data["load_power"]
+        return self.data.get("load_power")
 
     @property
     def voltage(self) -> int:
         """Voltage"""
-        return self.data["voltage"]
+        return self.data.get("voltage")
 
     @property
     def current(self) -> int:
         """Current"""
-        return self.data["current"]
+        return self.data.get("current")
 
     @property
     def power_consumption(self) -> int:
         """Power Consumption"""
-        return self.data["power_consumption"]
+        return self.data.get("power_consumption")
 
     @property
     def energy(self) -> int:
         """Energy"""
-        return self.data["energy"]
+        return self.data.get("energy")
 
     @property
     def count_down_time(self) -> int:
         """Count Down Time"""
-        return self.data["count_down_time"]
+        return self.data.get("count_down_time")
 
     @property
     def remain_time(self) -> int:
         """Remain Time"""
-        return self.data["remain_time"]
+        return self.data.get("remain_time")
 
     @property
     def enable_count_down(self) -> int:
         """Enable Count Down"""
-        return self.data["enable_count_down"]
+        return self.data.get("enable_count_down")
 
     @property
     def open_time(self) -> int:
         """Loop open time"""
-        return self.data["open_time"]
+        return self.data.get("open_time")
 
     @property
     def close_time(self) -> int:
         """Loop close time"""
-        return self.data["close_time"]
+        return self.data.get("close_time")
 
     @property
     def enable_relay_loop(self) -> int:
         """Enable relay loop"""
-        return self.data["enable_relay_loop"]
+        return self.data.get("enable_relay_loop")
 
     @property
     def wifi_led(self) -> int:
         """LED"""
-        return self.data["enable_led"]
+        return self.data.get("enable_led")
 
     @property
     def buzzer(self) -> int:
         """Buzzer"""
-        return self.data["enable_buzzer"]
+        return self.data.get("enable_buzzer")
 
     @property
     def system_status(self) -> int:
@@ -218,12 +231,29 @@ class SwitchStatusMiot(DeviceStatus):
     @property
     def keep_relay(self) -> int:
         """Keep Relay"""
-        return self.data["keep_relay"]
+        return self.data.get("keep_relay")
 
 
-class SwitchMiot(MiotDevice):
+class SwitchMiot(AsyncMiioDevice, MiotDevice):
     """Interface for Plug/PowerStrip Miot"""
     mapping = MIOT_MAPPING[MODEL_QMI_POWERSTRIP_2A1C1]
+    property_index = MIOT_PROPERTY_INDEX[MODEL_QMI_POWERSTRIP_2A1C1]
+    # status attributes which are backed by a differently named property
+    status_properties = {
+        "is_on": "status",
+        "wifi_led": "enable_led",
+        "buzzer": "enable_buzzer",
+    }
+    # settings of the set_properties service and their writable properties
+    setting_properties = {
+        "wifi_led": "enable_led",
+        "buzzer": "enable_buzzer",
+        "keep_relay": "keep_relay",
+        "count_down": "enable_count_down",
+        "count_down_time": "count_down_time",
+    }
+    # largest accepted and smallest rejected get_properties batch per model/firmware
+    _batch_limits: Dict[tuple, Dict[str, int]] = {}
 
     def __init__(
         self,
@@ -239,6 +269,8 @@ class SwitchMiot(MiotDevice):
 
         super().__init__(ip, token, start_id, debug, lazy_discover)
         self._model = model
+        self._pending_writes = None
+        self._own_batch_limit = {"good": 0, "bad": None}
 
     @command(
         default_output=format_output(
@@ -248,13 +280,189 @@ class SwitchMiot(MiotDevice):
     )
     def status(self) -> SwitchStatusMiot:
         """Retrieve properties."""
+        return self._parse_status(self.get_properties_for_mapping())
+
+    async def async_status(self, attributes=None) -> SwitchStatusMiot:
+        """Retrieve properties without blocking.
+
+        If status attributes are given, only the properties backing them are
+        requested from the device.
+        """
+        properties = None
+        if attributes:
+            properties = self.properties_for_attributes(attributes)
+
+        return self._parse_status(
+            await self.async_get_properties_for_mapping(properties=properties)
+        )
+
+    def properties_for_attributes(self, attributes) -> list:
+        """Return the mapped properties backing the given status attributes."""
+        wanted = {self.status_properties.get(attr, attr) for attr in attributes}
+        return [did for did in self._get_mapping() if did in wanted]
+
+    def decode_properties_changed(self, params: list) -> Dict[str, Any]:
+        """Return the values by property name of a properties_changed message."""
+        changes = {}
+        for prop in params:
+            did = self.property_index.get((prop.get("siid"), prop.get("piid")))
+            if did is not None and "value" in prop:
+                changes[did] = prop["value"]
+
+        return changes
+
+    def _parse_status(self, properties: list) -> SwitchStatusMiot:
+        """Build the status container of the properties response."""
         return SwitchStatusMiot(
             {
                 prop["did"]: prop["value"] if prop["code"] == 0 else None
-                for prop in self.get_properties_for_mapping()
+                for prop in properties
             }
         )
 
+    async def async_get_properties_for_mapping(
+        self, *, max_properties=None, properties=None
+    ) -> list:
+        """Retrieve raw properties based on mapping without blocking.
+
+        Without max_properties the batch size learned for the model is used.
+        """
+        properties = [
+            {"did": k, **v}
+            for k, v in self._get_mapping().items()
+            if "aiid" not in v and (properties is None or k in properties)
+        ]
+
+        if max_properties is not None:
+            return await self.async_get_properties(
+                properties, property_getter="get_properties", max_properties=max_properties
+            )
+
+        return await self._async_get_properties_batched(properties)
+
+    @property
+    def _batch_limit(self) -> Dict[str, int]:
+        """Return the learned batch limits of this model and firmware.
+
+        Until the firmware is known the limits are kept per device, other
+        firmware versions of the model may accept different batches.
+        """
+        if self._info is None:
+            return self._own_batch_limit
+        return self._batch_limits.setdefault(
+            (self._info.model, self._info.firmware_version), {"good": 0, "bad": None}
+        )
+
+    async def _async_get_properties_batched(self, properties: list) -> list:
+        """Request the properties in the largest batches the device accepts.
+
+        As long as no batch was rejected, all properties are requested at
+        once. A batch the device answers with an error or a truncated
+        response is remembered as too large and the request falls back to
+        the largest accepted (or half the) batch. Later polls bisect between
+        both until the largest accepted batch is found.
+        """
+        limit = self._batch_limit
+        if limit["bad"] is None:
+            batch = len(properties)
+        else:
+            batch = min(len(properties), (limit["good"] + limit["bad"]) // 2)
+        batch = max(batch, 1)
+
+        while True:
+            try:
+                values = await self.async_get_properties(
+                    properties, property_getter="get_properties", max_properties=batch
+                )
+            except (DeviceError, PayloadDecodeException) as ex:
+                if batch == 1:
+                    raise
+                values = None
+                _LOGGER.debug("Batch of %s properties rejected: %s", batch, ex)
+
+            if values is not None and (len(values) == len(properties) or batch == 1):
+                limit["good"] = max(limit["good"], batch)
+                return values
+
+            limit["bad"] = min(limit["bad"] or batch, batch)
+            if 0 < limit["good"] < batch:
+                batch = limit["good"]
+            else:
+                batch = max(batch // 2, 1)
+
+    async def async_set_property(self, property_key: str, value, coalesce: bool = True):
+        """Set property value using the existing mapping without blocking.
+
+        Without coalesce the write is sent right away in a request of its
+        own, the relay is switched this way.
+        """
+        if coalesce:
+            codes = await self.async_set_properties({property_key: value})
+        else:
+            codes = await self._async_write_properties({property_key: value})
+        return [
+            {
+                "did": property_key,
+                **self._get_mapping()[property_key],
+                "code": codes.get(property_key),
+            }
+        ]
+
+    async def async_set_properties(self, values: Dict[str, Any]) -> Dict[str, int]:
+        """Set several properties at once and return the result code of each.
+
+        Writes issued within WRITE_COALESCE_WINDOW are sent to the device in
+        a single set_properties request, a later value of the same property
+        wins. A result code of 0 means the property was set, a write
+        superseded by a later value gets None.
+        """
+        mapping = self._get_mapping()
+        unknown = [did for did in values if did not in mapping]
+        if unknown:
+            raise DeviceException("Unknown properties of %s: %s" % (self._model, unknown))
+
+        if self._pending_writes is None:
+            self._pending_writes = (
+                {},
+                asyncio.get_running_loop().create_task(self._async_flush_writes()),
+            )
+        pending, task = self._pending_writes
+        pending.update(values)
+
+        codes = await asyncio.shield(task)
+        # pending holds the values sent, a writer of another value was superseded
+        return {
+            did: codes.get(did) if pending[did] == value else None
+            for did, value in values.items()
+        }
+
+    async def _async_flush_writes(self) -> Dict[str, int]:
+        """Send the collected writes and return the result code per property."""
+        try:
+            await asyncio.sleep(WRITE_COALESCE_WINDOW)
+        finally:
+            pending, _ = self._pending_writes
+            self._pending_writes = None
+
+        return await self._async_write_properties(pending)
+
+    async def _async_write_properties(self, values: Dict[str, Any]) -> Dict[str, int]:
+        """Send one set_properties request and return the result code per property."""
+        mapping = self._get_mapping()
+        _LOGGER.debug("Setting %s properties at once: %s", len(values), values)
+        response = await self.async_send(
+            "set_properties",
+            [{"did": did, **mapping[did], "value": value} for did, value in values.items()],
+        )
+
+        codes = {}
+        for prop in response:
+            # not all devices echo the did, the siid/piid pair identifies it
+            did = self.property_index.get((prop.get("siid"), prop.get("piid")))
+            codes[did or prop.get("did")] = prop.get("code")
+
+        return codes
+
     @command(
         click.argument("mode", type=bool),
         default_output=format_output("Setting mode {mode}"),
@@ -315,13 +523,43 @@ class SwitchMiot(MiotDevice):
     def off(self):
         return self.set_property("status", False)
 
+    async def async_set_power_mode(self, mode: bool):
+        """Set power mode."""
+        return await self.async_set_property("mode", mode)
+
+    async def async_count_down(self, mode: bool):
+        """Start/Stop count down."""
+        return await self.async_set_property("enable_count_down", mode)
+
+    async def async_set_count_down_time(self, time: int):
+        """Setting count down time. """
+        return await self.async_set_property("count_down_time", time)
+
+    async def async_set_wifi_led(self, mode: bool):
+        """Set Wifi LED."""
+        return await self.async_set_property("enable_led", mode)
+
+    async def async_set_buzzer(self, mode: bool):
+        """Set Buzzer."""
+        return await self.async_set_property("enable_buzzer", mode)
+
+    async def async_set_keep_relay(self, mode: bool):
+        """Set keep relay."""
+        return await self.async_set_property("keep_relay", mode)
+
+    async def async_on(self):
+        return await self.async_set_property("status", True, coalesce=False)
+
+    async def async_off(self):
+        return await self.async_set_property("status", False, coalesce=False)
+
 class SwitchStatusMiotTW02(SwitchStatusMiot):
     """Container for status reports for Xiaomi SwitchStatusMiot."""
 
     @property
     def is_on(self) -> bool:
         """True if device is currently on."""
-        return self.data["on"]
+        return self.data.get("on")
 
     @property
     def mode(self) -> int:
@@ -331,35 +569,41 @@ class SwitchStatusMiotTW02(SwitchStatusMiot):
     @property
     def remain_time(self) -> int:
         """Remain Time"""
-        return self.data["count_down_remain_tm"]
+        return self.data.get("count_down_remain_tm")
 
     @property
     def open_time(self) -> int:
         """Loop open time"""
-        return self.data["loop_relay_break_tm"]
+        return self.data.get("loop_relay_break_tm")
 
     @property
     def close_time(self) -> int:
         """Loop close time"""
-        return self.data["loop_relay_close_tm"]
+        return self.data.get("loop_relay_close_tm")
 
 
 class SwitchMiotTW02(SwitchMiot):
     """Interface for Plug Miot TW02"""
     mapping = MIOT_MAPPING[MODEL_QMI_PLUG_TW02]
+    property_index = MIOT_PROPERTY_INDEX[MODEL_QMI_PLUG_TW02]
+    status_properties = {
+        "is_on": "on",
+        "mode": "on",
+        "remain_time": "count_down_remain_tm",
+        "open_time": "loop_relay_break_tm",
+        "close_time": "loop_relay_close_tm",
+    }
+    setting_properties = {
+        "count_down": "enable_count_down",
+        "count_down_time": "count_down_time",
+    }
 
-    @command(
-        default_output=format_output(
-            "",
-            "Status: {result.status.name}\n"
-        )
-    )
-    def status(self) -> SwitchStatusMiotTW02:
-        """Retrieve properties."""
+    def _parse_status(self, properties: list) -> SwitchStatusMiotTW02:
+        """Build the status container of the properties response."""
         return SwitchStatusMiotTW02(
             {
                 prop["did"]: prop["value"] if prop["code"] == 0 else None
-                for prop in self.get_properties_for_mapping()
+                for prop in properties
             }
         )
 
@@ -375,4 +619,14 @@ class SwitchMiotTW02(SwitchMiot):
         return self.set_property("on", True)
 
     def off(self):
-        return self.set_property("on", False)
\ No newline at end of file
+        return self.set_property("on", False)
+
+    async def async_set_power_mode(self, mode: bool):
+        """Set power mode."""
+        return await self.async_set_property("on", mode, coalesce=False)
+
+    async def async_on(self):
+        return await self.async_set_property("on", True, coalesce=False)
+
+    async def async_off(self):
+        return await self.async_set_property("on", False, coalesce=False)
\ No newline at end of file
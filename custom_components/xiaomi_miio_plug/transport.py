@@ -0,0 +1,676 @@
+"""Asyncio transport of the miIO protocol used by the Xiaomi Plug/PowerStrip."""
+# pylint: disable=import-error
+import asyncio
+import heapq
+import itertools
+import logging
+import math
+import random
+from collections import deque
+from datetime import timedelta
+from typing import Any, Callable, Dict, List, Optional
+
+import construct
+from miio import DeviceException
+from miio.deviceinfo import DeviceInfo
+from miio.exceptions import DeviceError, PayloadDecodeException, RecoverableError
+from miio.protocol import Message
+
+from .const import DEFAULT_GLOBAL_RATE_LIMIT, DEFAULT_RATE_LIMIT
+
+_LOGGER = logging.getLogger(__name__)
+
+MIIO_PORT = 54321
+DEFAULT_TIMEOUT = 5
+DEFAULT_RETRY_COUNT = 3
+
+# magic, length 32
+HELLO_BYTES = bytes.fromhex(
+    "21310020ffffffffffffffffffffffffffffffffffffffffffffffffffffffff"
+)
+HELLO_LENGTH = 32
+RECOVERABLE_ERRORS = [-30001, -9999]
+# consecutive timeouts after which the session is considered lost
+SESSION_LOST_TIMEOUTS = 2
+# commands which only read, besides the get_* commands
+READ_COMMANDS = ["miIO.info"]
+PRIORITY_WRITE = 0
+PRIORITY_READ = 1
+# largest tolerated offset of the device clock from the extrapolated stamp
+MAX_CLOCK_DRIFT = 10
+# samples the rolling request metrics are computed from
+METRICS_WINDOW = 100
+# upper bounds (ms) of the buckets of the request latency histogram
+LATENCY_BUCKETS = [50, 100, 250, 500, 1000, 2500, 5000]
+
+
+class TokenBucket:
+    """Allow rate requests per second on average, in bursts of up to burst."""
+
+    def __init__(self, rate: float, burst: int = None) -> None:
+        """Initialize the bucket, full."""
+        self.rate = rate
+        self.burst = burst or max(1, math.ceil(rate))
+        self._tokens = self.burst
+        self._updated = None
+        # the lock wakes its waiters in order, so the bucket drains fairly
+        self._lock = asyncio.Lock()
+
+    def _refill(self, now: float) -> None:
+        """Add the tokens earned since the last refill."""
+        if self._updated is not None:
+            self._tokens = min(
+                self.burst, self._tokens + (now - self._updated) * self.rate
+            )
+        self._updated = now
+
+    async def async_acquire(self) -> None:
+        """Wait for and take a token."""
+        async with self._lock:
+            loop = asyncio.get_running_loop()
+            self._refill(loop.time())
+            if self._tokens < 1:
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+                self._refill(loop.time())
+            self._tokens -= 1
+
+
+def _percentile(samples, fraction: float) -> Optional[float]:
+    """Return the nearest-rank percentile of the samples, None without samples."""
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, math.ceil(fraction * len(ordered)) - 1)]
+
+
+class SessionMetrics:
+    """Request latency, timeouts, retries and handshakes of one miIO session.
+
+    The latencies and the MIoT exe_time of the device are kept for the last
+    METRICS_WINDOW requests, the counters since the session was created.
+    """
+
+    def __init__(self) -> None:
+        """Initialize the metrics."""
+        self.latencies = deque(maxlen=METRICS_WINDOW)
+        self.exe_times = deque(maxlen=METRICS_WINDOW)
+        self.requests = 0
+        self.timeouts = 0
+        self.retries = 0
+        self.handshakes = 0
+
+    def add_response(self, latency: float, payload: dict) -> None:
+        """Record the latency (s) of a response and the exe_time it reports."""
+        self.requests += 1
+        self.latencies.append(latency * 1000)
+        if isinstance(payload.get("exe_time"), (int, float)):
+            self.exe_times.append(payload["exe_time"])
+
+    @property
+    def latency_p50(self) -> Optional[float]:
+        """Return the median latency (ms) of the recent requests."""
+        return _percentile(self.latencies, 0.5)
+
+    @property
+    def latency_p95(self) -> Optional[float]:
+        """Return the 95th percentile latency (ms) of the recent requests."""
+        return _percentile(self.latencies, 0.95)
+
+    @property
+    def exe_time_p50(self) -> Optional[float]:
+        """Return the median execution time (ms) reported by the device."""
+        return _percentile(self.exe_times, 0.5)
+
+    @property
+    def exe_time_p95(self) -> Optional[float]:
+        """Return the 95th percentile execution time (ms) reported by the device."""
+        return _percentile(self.exe_times, 0.95)
+
+    @property
+    def latency_histogram(self) -> Dict[str, int]:
+        """Return the recent latencies counted per LATENCY_BUCKETS bucket."""
+        histogram = {f"<={bound}ms": 0 for bound in LATENCY_BUCKETS}
+        histogram[f">{LATENCY_BUCKETS[-1]}ms"] = 0
+        for latency in self.latencies:
+            bound = next((bound for bound in LATENCY_BUCKETS if latency <= bound), None)
+            if bound is None:
+                histogram[f">{LATENCY_BUCKETS[-1]}ms"] += 1
+            else:
+                histogram[f"<={bound}ms"] += 1
+        return histogram
+
+
+class MiioProtocol(asyncio.DatagramProtocol):
+    """Talk the miIO protocol to one device without blocking a thread.
+
+    The protocol does the handshake, encrypts the requests with the device
+    token and matches the responses to the pending requests by their id.
+    The device id and stamp of the handshake are kept as a session: the
+    stamp is extrapolated from the last packet of the device, so the device
+    is only greeted again when its clock jumped or it stopped answering.
+    Unsolicited messages of the device (e.g. MIoT properties_changed) are
+    acknowledged and passed on to the subscribed listeners. The device gets
+    one command at a time, writes before reads, and no faster than all of
+    the rate_limits allow. The latencies, timeouts, retries and handshakes
+    are kept in metrics. A recorder, if set, is passed every decrypted
+    exchange with its latency (None on timeouts) and every unsolicited
+    message.
+    """
+
+    def __init__(
+        self,
+        host: str,
+        token: str,
+        timeout: int = DEFAULT_TIMEOUT,
+        retry_count: int = DEFAULT_RETRY_COUNT,
+        rate_limits: List[TokenBucket] = None
+    ) -> None:
+        """Initialize the protocol."""
+        self.host = host
+        self.token = token
+        self.rate_limits = rate_limits or []
+        self.recorder: Optional[
+            Callable[[str, Optional[dict], Optional[dict], float], None]
+        ] = None
+        self.metrics = SessionMetrics()
+        self._token = bytes.fromhex(token if token is not None else 32 * "0")
+        self._timeout = timeout
+        self._retry_count = retry_count
+        self._transport = None
+        self._connecting = None
+        self._handshake = None
+        self._discovered = False
+        self._device_id = bytes()
+        self._device_ts = None
+        self._stamp_time = None
+        self._timeouts = 0
+        self._id = random.randint(1, 9000)
+        self._requests: Dict[int, asyncio.Future] = {}
+        self._listeners: List[Callable[[str, Any], None]] = []
+        # one command at a time, queued by priority and arrival
+        self._busy = False
+        self._waiting = []
+        self._sequence = itertools.count()
+        self._reads: Dict[tuple, asyncio.Task] = {}
+
+    def connection_made(self, transport) -> None:
+        """Store the datagram transport."""
+        self._transport = transport
+
+    def connection_lost(self, exc) -> None:
+        """Fail all pending requests when the socket is gone."""
+        self._transport = None
+        self._discovered = False
+        self._fail_pending(exc or ConnectionError(f"Connection to {self.host} lost"))
+
+    def error_received(self, exc) -> None:
+        """Fail all pending requests on a socket error (e.g. ICMP unreachable)."""
+        _LOGGER.debug("%s: socket error: %s", self.host, exc)
+        self._fail_pending(exc)
+
+    def datagram_received(self, data: bytes, addr) -> None:
+        """Dispatch a received packet to the request waiting for it."""
+        if len(data) == HELLO_LENGTH:
+            self._handle_hello(data)
+            return
+
+        if len(data) < int.from_bytes(data[2:4], "big"):
+            self._fail_pending(
+                PayloadDecodeException(
+                    "Truncated response of %s bytes from %s" % (len(data), self.host)
+                )
+            )
+            return
+
+        try:
+            message = Message.parse(data, token=self._token)
+        except construct.core.ChecksumError:
+            self._fail_pending(
+                DeviceException(
+                    "Got checksum error which indicates use "
+                    "of an invalid token. "
+                    "Please check your token!"
+                )
+            )
+            return
+        except (construct.ConstructError, DeviceException) as ex:
+            _LOGGER.debug("%s: unable to parse packet: %s", self.host, ex)
+            return
+
+        header = message.header.value
+        payload = message.data.value
+        if not isinstance(payload, dict):
+            _LOGGER.debug("%s: dropping undecodable payload %s", self.host, payload)
+            return
+
+        drift = self._clock_drift(header.ts)
+        if drift is not None and abs(drift) > MAX_CLOCK_DRIFT:
+            _LOGGER.debug("%s: device clock drifted by %.0fs", self.host, drift)
+            self._discovered = False
+        self._set_stamp(header.ts)
+        _LOGGER.debug(
+            "%s:%s (ts: %s, id: %s) << %s",
+            self.host,
+            MIIO_PORT,
+            header.ts,
+            payload.get("id"),
+            payload,
+        )
+
+        if "method" in payload:
+            self._handle_message(payload)
+            return
+
+        future = self._requests.get(payload.get("id"))
+        if future is None or future.done():
+            _LOGGER.debug("%s: dropping unexpected response %s", self.host, payload)
+            return
+        future.set_result(payload)
+
+    def _handle_hello(self, data: bytes) -> None:
+        """Take over the device id and stamp of a handshake response."""
+        try:
+            message = Message.parse(data)
+        except construct.ConstructError as ex:
+            _LOGGER.debug("%s: unable to parse handshake: %s", self.host, ex)
+            return
+
+        header = message.header.value
+        self._device_id = header.device_id
+        self._set_stamp(header.ts)
+        self._discovered = True
+        if self._handshake is not None and not self._handshake.done():
+            self._handshake.set_result(message)
+
+    def _set_stamp(self, device_ts) -> None:
+        """Remember the clock of the device, any packet proves the session."""
+        self._device_ts = device_ts
+        self._stamp_time = asyncio.get_running_loop().time()
+        self._timeouts = 0
+
+    def _stamp(self):
+        """Return the current device time extrapolated from the last packet."""
+        elapsed = asyncio.get_running_loop().time() - self._stamp_time
+        return self._device_ts + timedelta(seconds=elapsed)
+
+    def _clock_drift(self, device_ts) -> Optional[float]:
+        """Return the offset of a device stamp from the extrapolated clock."""
+        if self._device_ts is None:
+            return None
+        return (device_ts - self._stamp()).total_seconds()
+
+    @property
+    def discovered(self) -> bool:
+        """Return true if a handshake of the session is known."""
+        return self._discovered
+
+    def _handle_message(self, payload: dict) -> None:
+        """Acknowledge an unsolicited message and pass it to the listeners."""
+        if "id" in payload and self._transport is not None:
+            self._transport.sendto(
+                self._build_packet({"id": payload["id"], "result": ["ok"]})
+            )
+        if self.recorder is not None:
+            self.recorder(self.host, None, payload, 0)
+
+        for listener in list(self._listeners):
+            listener(payload["method"], payload.get("params", []))
+
+    def subscribe(self, listener: Callable[[str, Any], None]) -> Callable[[], None]:
+        """Pass the unsolicited messages of the device to the listener."""
+        self._listeners.append(listener)
+
+        def unsubscribe() -> None:
+            self._listeners.remove(listener)
+
+        return unsubscribe
+
+    def _fail_pending(self, exc: Exception) -> None:
+        """Fail all requests waiting for a response."""
+        for future in self._requests.values():
+            if not future.done():
+                future.set_exception(exc)
+
+    def _next_id(self) -> int:
+        """Increment and return the sequence id."""
+        self._id += 1
+        if self._id >= 9999:
+            self._id = 1
+        return self._id
+
+    async def _async_connect(self) -> None:
+        """Open the datagram endpoint to the device."""
+        if self._transport is not None:
+            return
+
+        if self._connecting is None:
+            loop = asyncio.get_running_loop()
+            self._connecting = loop.create_task(
+                loop.create_datagram_endpoint(
+                    lambda: self, remote_addr=(self.host, MIIO_PORT)
+                )
+            )
+        try:
+            await asyncio.shield(self._connecting)
+        except OSError as ex:
+            raise DeviceException(f"Unable to connect to {self.host}: {ex}") from ex
+        finally:
+            self._connecting = None
+
+    async def async_send_handshake(self, retry_count: int = None) -> Message:
+        """Send a handshake and wait for the device id and stamp."""
+        await self._async_connect()
+        retry_count = self._retry_count if retry_count is None else retry_count
+
+        if self._handshake is None or self._handshake.done():
+            self._handshake = asyncio.get_running_loop().create_future()
+            self.metrics.handshakes += 1
+        handshake = self._handshake
+
+        for _ in range(retry_count + 1):
+            self._transport.sendto(HELLO_BYTES)
+            try:
+                return await asyncio.wait_for(
+                    asyncio.shield(handshake), self._timeout
+                )
+            except asyncio.TimeoutError:
+                continue
+
+        _LOGGER.debug("Unable to discover a device at address %s", self.host)
+        raise DeviceException("Unable to discover the device %s" % self.host)
+
+    def _build_packet(self, payload: dict) -> bytes:
+        """Encrypt a payload into a packet stamped just after the device."""
+        header = {
+            "length": 0,
+            "unknown": 0x00000000,
+            "device_id": self._device_id,
+            "ts": self._stamp() + timedelta(seconds=1),
+        }
+        return Message.build(
+            {"data": {"value": payload}, "header": {"value": header}, "checksum": 0},
+            token=self._token,
+        )
+
+    def _is_read(self, command: str) -> bool:
+        """Return true if the command only reads from the device."""
+        return command.startswith("get_") or command in READ_COMMANDS
+
+    async def async_send(
+        self,
+        command: str,
+        parameters: Any = None,
+        retry_count: int = None
+    ) -> Any:
+        """Build and send the given command and wait for its response.
+
+        Writes are queued ahead of reads, and identical reads which overlap
+        share a single request.
+        """
+        retry_count = self._retry_count if retry_count is None else retry_count
+        if not self._is_read(command):
+            return await self._async_send(
+                command, parameters, retry_count, PRIORITY_WRITE
+            )
+
+        key = (command, repr(parameters))
+        task = self._reads.get(key)
+        if task is None:
+            task = self._reads[key] = asyncio.get_running_loop().create_task(
+                self._async_send(command, parameters, retry_count, PRIORITY_READ)
+            )
+            task.add_done_callback(lambda done: self._read_done(key, done))
+        else:
+            _LOGGER.debug("%s: joining the pending %s request", self.host, command)
+
+        return await asyncio.shield(task)
+
+    def _read_done(self, key: tuple, task: asyncio.Task) -> None:
+        """Forget a finished shared read and retrieve its outcome.
+
+        The exception of a read whose waiters were all cancelled would
+        otherwise be logged as never retrieved.
+        """
+        if self._reads.get(key) is task:
+            del self._reads[key]
+        if not task.cancelled():
+            task.exception()
+
+    async def _async_send(
+        self,
+        command: str,
+        parameters: Any,
+        retry_count: int,
+        priority: int
+    ) -> Any:
+        """Send the command when it is its turn and retry it on timeouts.
+
+        Mirrors MiIOProtocol.send: an implicit handshake is done first and the
+        command is retried with an incremented id on timeouts. The device is
+        released between the attempts, so a timing out read does not hold up
+        a queued write.
+        """
+        while True:
+            await self._async_acquire(priority)
+            try:
+                for bucket in self.rate_limits:
+                    await bucket.async_acquire()
+                payload = await self._async_exchange(command, parameters)
+            except (asyncio.TimeoutError, OSError) as ex:
+                self._timeouts += 1
+                if isinstance(ex, asyncio.TimeoutError):
+                    self.metrics.timeouts += 1
+                if retry_count > 0:
+                    self.metrics.retries += 1
+                    _LOGGER.debug(
+                        "Retrying with incremented id, retries left: %s", retry_count
+                    )
+                    retry_count -= 1
+                    self._id += 100
+                    # a single lost packet does not invalidate the session
+                    if self._timeouts >= SESSION_LOST_TIMEOUTS:
+                        self._discovered = False
+                    continue
+
+                raise DeviceException("No response from the device") from ex
+            finally:
+                self._release()
+
+            if "error" in payload:
+                error = payload["error"]
+                if "code" in error and error["code"] in RECOVERABLE_ERRORS:
+                    if retry_count > 0:
+                        self.metrics.retries += 1
+                        _LOGGER.debug(
+                            "Retrying to send failed command, retries left: %s",
+                            retry_count,
+                        )
+                        retry_count -= 1
+                        continue
+
+                    raise DeviceException(
+                        "Unable to recover failed command"
+                    ) from RecoverableError(error)
+                raise DeviceError(error)
+
+            return payload.get("result", payload)
+
+    async def _async_exchange(self, command: str, parameters: Any) -> dict:
+        """Send the command once and wait for its response."""
+        if not self._discovered:
+            await self.async_send_handshake()
+
+        request_id = self._next_id()
+        request = {
+            "id": request_id,
+            "method": command,
+            "params": parameters if parameters is not None else [],
+        }
+        packet = self._build_packet(request)
+        _LOGGER.debug("%s:%s >>: %s", self.host, MIIO_PORT, request)
+
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._requests[request_id] = future
+        sent = loop.time()
+        try:
+            self._transport.sendto(packet)
+            payload = await asyncio.wait_for(future, self._timeout)
+        except asyncio.TimeoutError:
+            if self.recorder is not None:
+                self.recorder(self.host, request, None, loop.time() - sent)
+            raise
+        finally:
+            self._requests.pop(request_id, None)
+
+        latency = loop.time() - sent
+        self.metrics.add_response(latency, payload)
+        if self.recorder is not None:
+            self.recorder(self.host, request, payload, latency)
+        return payload
+
+    async def _async_acquire(self, priority: int) -> None:
+        """Wait until the device is free and no more urgent command waits."""
+        if not self._busy and not self._waiting:
+            self._busy = True
+            return
+
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiting, (priority, next(self._sequence), future))
+        try:
+            await future
+        except asyncio.CancelledError:
+            # the device was handed over just before the cancellation
+            if future.done() and not future.cancelled():
+                self._release()
+            raise
+
+    def _release(self) -> None:
+        """Hand the device over to the most urgent waiting command."""
+        while self._waiting:
+            _, _, future = heapq.heappop(self._waiting)
+            if not future.done():
+                future.set_result(None)
+                return
+
+        self._busy = False
+
+    def close(self) -> None:
+        """Cancel the reads in flight and close the datagram endpoint."""
+        for task in list(self._reads.values()):
+            task.cancel()
+        self._reads.clear()
+        if self._transport is not None:
+            self._transport.close()
+            self._transport = None
+
+
+class MiioSessionPool:
+    """Share one miIO session (socket, device id and stamp) per host.
+
+    The requests of every session are limited by the rate of its device and
+    by the rate shared by all sessions. New sessions are made by the
+    session_factory and get the recorder of the pool.
+    """
+
+    def __init__(self, rate_limit: float = DEFAULT_GLOBAL_RATE_LIMIT) -> None:
+        """Initialize the pool."""
+        self._sessions: Dict[str, MiioProtocol] = {}
+        self.rate_limit = TokenBucket(rate_limit)
+        self.session_factory = MiioProtocol
+        self.recorder = None
+
+    def get(
+        self, host: str, token: str, rate_limit: float = DEFAULT_RATE_LIMIT
+    ) -> MiioProtocol:
+        """Return the session of the host, a new one if the token changed."""
+        session = self._sessions.get(host)
+        if session is None or session.token != token:
+            if session is not None:
+                session.close()
+            session = self._sessions[host] = self.session_factory(
+                host, token, rate_limits=[TokenBucket(rate_limit), self.rate_limit]
+            )
+            session.recorder = self.recorder
+        elif session.rate_limits[0].rate != rate_limit:
+            session.rate_limits[0] = TokenBucket(rate_limit)
+        return session
+
+    async def async_prewarm(self, devices: List[tuple]) -> None:
+        """Do the handshakes of the (host, token, rate_limit) devices concurrently."""
+        sessions = [self.get(*device) for device in devices]
+        results = await asyncio.gather(
+            *(
+                session.async_send_handshake()
+                for session in sessions
+                if not session.discovered
+            ),
+            return_exceptions=True,
+        )
+        for result in results:
+            if isinstance(result, Exception):
+                _LOGGER.debug("Unable to pre-warm a session: %s", result)
+
+    def close(self, host: str) -> None:
+        """Close and forget the session of the host."""
+        session = self._sessions.pop(host, None)
+        if session is not None:
+            session.close()
+
+
+class AsyncMiioDevice:
+    """Mixin adding awaitable counterparts to a python-miio device."""
+
+    _async_protocol: Optional[MiioProtocol] = None
+
+    @property
+    def async_protocol(self) -> MiioProtocol:
+        """Return the asyncio protocol of the device, created on first use."""
+        if self._async_protocol is None:
+            self._async_protocol = MiioProtocol(self.ip, self.token)
+        return self._async_protocol
+
+    def use_session(self, session: MiioProtocol) -> None:
+        """Talk through a session shared with other users of the host."""
+        self._async_protocol = session
+
+    async def async_send(self, command: str, parameters: Any = None) -> Any:
+        """Send a command to the device."""
+        return await self.async_protocol.async_send(command, parameters)
+
+    def async_subscribe(
+        self, listener: Callable[[str, Any], None]
+    ) -> Callable[[], None]:
+        """Pass the unsolicited messages of the device to the listener."""
+        return self.async_protocol.subscribe(listener)
+
+    async def async_get_properties(
+        self,
+        properties: List,
+        *,
+        property_getter: str = "get_prop",
+        max_properties: int = None
+    ) -> List:
+        """Request properties in slices based on given max_properties."""
+        _props = properties.copy()
+        values = []
+        while _props:
+            values.extend(
+                await self.async_send(property_getter, _props[:max_properties])
+            )
+            if max_properties is None:
+                break
+
+            _props[:] = _props[max_properties:]
+
+        return values
+
+    async def async_info(self) -> DeviceInfo:
+        """Get (and cache) miIO protocol information from the device."""
+        self._info = DeviceInfo(await self.async_send("miIO.info"))
+        return self._info
+
+    def async_close(self) -> None:
+        """Release the socket of the device."""
+        if self._async_protocol is not None:
+            self._async_protocol.close()
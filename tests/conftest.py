@@ -0,0 +1,74 @@
+"""Fixtures of the Xiaomi Plug/PowerStrip tests, backed by the device simulator."""
+import asyncio
+import inspect
+
+import pytest
+
+from custom_components.xiaomi_miio_plug.const import MODEL_QMI_POWERSTRIP_2A1C1
+from custom_components.xiaomi_miio_plug.transport import HELLO_LENGTH, MiioProtocol
+from tools.simulator import DeviceServer, Simulator
+
+TIMEOUT = 0.2
+
+
+@pytest.hookimpl(tryfirst=True)
+def pytest_pyfunc_call(pyfuncitem):
+    """Run the coroutine tests in a fresh event loop."""
+    if not inspect.iscoroutinefunction(pyfuncitem.obj):
+        return None
+
+    arguments = {
+        name: pyfuncitem.funcargs[name] for name in pyfuncitem._fixtureinfo.argnames
+    }
+    asyncio.run(pyfuncitem.obj(**arguments))
+    return True
+
+
+class LossyServer(DeviceServer):
+    """Device server which loses the commands while lose_commands is set.
+
+    Unlike the random loss of a FaultProfile, the tests decide exactly which
+    packets get lost. Handshakes are always answered.
+    """
+
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self.lose_commands = 0
+        self.lost = 0
+
+    def datagram_received(self, data: bytes, addr) -> None:
+        if len(data) != HELLO_LENGTH and self.lose_commands:
+            self.lose_commands -= 1
+            self.lost += 1
+            return
+        super().datagram_received(data, addr)
+
+
+class LossySimulator(Simulator):
+    """Simulator whose devices lose commands on request."""
+
+    def server_factory(self, host, device):
+        return LossyServer(device, self.push)
+
+
+@pytest.fixture
+def simulator():
+    """Return a simulator of one MIoT power strip, start it with async with."""
+    return LossySimulator([MODEL_QMI_POWERSTRIP_2A1C1])
+
+
+@pytest.fixture
+def device(simulator):
+    """Return the host, token and model of the simulated device."""
+    return simulator.config_entries()[0]
+
+
+@pytest.fixture
+def make_session(device):
+    """Return a factory of sessions to the simulated device, short timeouts."""
+
+    def factory(**kwargs) -> MiioProtocol:
+        kwargs.setdefault("timeout", TIMEOUT)
+        return MiioProtocol(device["host"], device["token"], **kwargs)
+
+    return factory
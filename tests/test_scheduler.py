@@ -0,0 +1,112 @@
+"""Tests of the fleet poll scheduler."""
+import asyncio
+
+import pytest
+from homeassistant.core import HomeAssistant
+
+from custom_components.xiaomi_miio_plug.scheduler import (
+    BREAKER_FAILURES,
+    FleetPollScheduler,
+)
+
+POLL_INTERVAL = 0.05
+
+
+class FakeCoordinator:
+    """Coordinator of a device which answers while online is set."""
+
+    name = "fake plug"
+
+    def __init__(self) -> None:
+        self.poll_interval = POLL_INTERVAL
+        self.poll_job = None
+        self.online = True
+        self.last_update_success = True
+        self.refreshes = 0
+        self.probes = 0
+        self.stopped = False
+
+    async def async_refresh(self) -> None:
+        self.refreshes += 1
+        self.last_update_success = self.online
+
+    async def async_probe(self) -> bool:
+        self.probes += 1
+        return self.online
+
+    def async_stop(self) -> None:
+        self.stopped = True
+
+
+@pytest.fixture
+def config_dir(tmp_path):
+    """Return the config directory of the Home Assistant instance."""
+    return str(tmp_path)
+
+
+async def wait_for(condition, timeout: float = 3) -> None:
+    """Wait until the condition is true."""
+    async with asyncio.timeout(timeout):
+        while not condition():
+            await asyncio.sleep(0.01)
+
+
+async def test_breaker_probes_offline_device(config_dir):
+    hass = HomeAssistant(config_dir)
+    coordinator = FakeCoordinator()
+    coordinator.online = False
+    remove_job = FleetPollScheduler(hass).async_add(coordinator)
+    try:
+        job = coordinator.poll_job
+        await wait_for(lambda: coordinator.probes >= 3)
+        # once open, the breaker replaces the polls by probes backing off
+        assert coordinator.refreshes == BREAKER_FAILURES
+        assert job.breaker_open
+        assert job.period == POLL_INTERVAL * 2 ** job.probes
+
+        coordinator.online = True
+        await wait_for(lambda: not job.breaker_open)
+        refreshes = coordinator.refreshes
+        await wait_for(lambda: coordinator.refreshes >= refreshes + 2)
+        assert job.probes == 0
+        assert job.period == POLL_INTERVAL
+    finally:
+        remove_job()
+
+
+async def test_unexpected_error_keeps_polling(config_dir):
+    hass = HomeAssistant(config_dir)
+    coordinator = FakeCoordinator()
+
+    async def async_refresh() -> None:
+        coordinator.refreshes += 1
+        raise RuntimeError("bug")
+
+    coordinator.async_refresh = async_refresh
+    remove_job = FleetPollScheduler(hass).async_add(coordinator)
+    try:
+        await wait_for(lambda: coordinator.refreshes >= 3)
+    finally:
+        remove_job()
+
+
+async def test_stop_cancels_poll_in_progress(config_dir):
+    hass = HomeAssistant(config_dir)
+    coordinator = FakeCoordinator()
+    polling = asyncio.Event()
+
+    async def async_refresh() -> None:
+        coordinator.refreshes += 1
+        polling.set()
+        await asyncio.sleep(10)
+
+    coordinator.async_refresh = async_refresh
+    scheduler = FleetPollScheduler(hass)
+    scheduler.async_add(coordinator)
+    await asyncio.wait_for(polling.wait(), 3)
+
+    scheduler.async_stop()
+    await wait_for(lambda: coordinator.poll_job._task is None)
+    await asyncio.sleep(5 * POLL_INTERVAL)
+    assert coordinator.stopped
+    assert coordinator.refreshes == 1
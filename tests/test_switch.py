@@ -0,0 +1,78 @@
+"""Tests of the switch entities against the device simulator."""
+import pytest
+import voluptuous as vol
+
+from custom_components.xiaomi_miio_plug.const import MODEL_CHUANGMI_PLUG_V3
+from custom_components.xiaomi_miio_plug.device import AsyncChuangmiPlug
+from custom_components.xiaomi_miio_plug.switch import (
+    SERVICE_SCHEMA_BULK,
+    ChuangMiPlugSwitch,
+)
+from custom_components.xiaomi_miio_plug.transport import MiioProtocol
+from tools.simulator import Simulator
+
+
+class FakeCoordinator:
+    """Coordinator which counts the expired poll tiers."""
+
+    def __init__(self) -> None:
+        self.expired = 0
+
+    def async_expire_tiers(self) -> None:
+        self.expired += 1
+
+
+@pytest.fixture
+def plug_v3():
+    """Return a simulator of one Chuangmi Plug V3, start it with async with."""
+    return Simulator([MODEL_CHUANGMI_PLUG_V3])
+
+
+def make_switch(device, session, coordinator) -> ChuangMiPlugSwitch:
+    """Return the USB switch of the plug talking through the session."""
+    plug = AsyncChuangmiPlug(device["host"], device["token"], model=device["model"])
+    plug.use_session(session)
+    return ChuangMiPlugSwitch("plug", plug, device["model"], None, coordinator, True)
+
+
+async def test_usb_commands_succeed(plug_v3):
+    device = plug_v3.config_entries()[0]
+    coordinator = FakeCoordinator()
+    async with plug_v3:
+        session = MiioProtocol(device["host"], device["token"], timeout=0.2)
+        try:
+            switch = make_switch(device, session, coordinator)
+            off = await switch._try_command("failed", switch._plug.async_usb_off)
+            usb_on = plug_v3.devices[device["host"]].properties["usb_on"]
+            on = await switch._try_command("failed", switch._plug.async_usb_on)
+        finally:
+            session.close()
+
+    assert off and on
+    assert not usb_on
+    assert plug_v3.devices[device["host"]].properties["usb_on"]
+    # switching doesn't change the rarely polled settings
+    assert coordinator.expired == 0
+
+
+async def test_settings_expire_poll_tiers(plug_v3):
+    device = plug_v3.config_entries()[0]
+    coordinator = FakeCoordinator()
+    async with plug_v3:
+        session = MiioProtocol(device["host"], device["token"], timeout=0.2)
+        try:
+            switch = make_switch(device, session, coordinator)
+            result = await switch.async_set_wifi_led_off()
+        finally:
+            session.close()
+
+    assert result
+    assert coordinator.expired == 1
+
+
+def test_bulk_action_requires_its_parameter():
+    with pytest.raises(vol.Invalid, match="requires mode"):
+        SERVICE_SCHEMA_BULK({"action": "switch_set_power_mode"})
+
+    assert SERVICE_SCHEMA_BULK({"action": "switch_set_power_mode", "mode": "green"})
+    assert SERVICE_SCHEMA_BULK({"action": "turn_on"}) == {"action": "turn_on"}
@@ -0,0 +1,218 @@
+"""Tests of the MIoT power strip against the device simulator."""
+import asyncio
+
+import pytest
+from miio import DeviceException
+
+from custom_components.xiaomi_miio_plug.const import (
+    MODEL_QMI_PLUG_TW02,
+    MODEL_QMI_POWERSTRIP_2A1C1,
+)
+from custom_components.xiaomi_miio_plug.switch_miot import (
+    MIOT_MAPPING,
+    SwitchMiot,
+    SwitchMiotTW02,
+)
+from custom_components.xiaomi_miio_plug.transport import MiioProtocol
+from tools.simulator import Simulator
+
+BATCH_LIMIT = 4
+
+
+@pytest.fixture(autouse=True)
+def batch_limits(monkeypatch):
+    """Forget the batch limits learned by other tests."""
+    limits = {}
+    monkeypatch.setattr(SwitchMiot, "_batch_limits", limits)
+    return limits
+
+
+def limit_batches(virtual_device) -> list:
+    """Reject get_properties batches above BATCH_LIMIT, return the rejected sizes."""
+    rejected = []
+    get_properties = virtual_device._get_properties
+
+    def limited(params):
+        if len(params) > BATCH_LIMIT:
+            rejected.append(len(params))
+            # answered as invalid params, like a device out of buffer space
+            raise KeyError(len(params))
+        return get_properties(params)
+
+    virtual_device._get_properties = limited
+    return rejected
+
+
+def make_plug(device, session) -> SwitchMiot:
+    """Return the power strip talking through the session."""
+    plug = SwitchMiot(device["host"], device["token"], model=device["model"])
+    plug.use_session(session)
+    return plug
+
+
+async def test_learn_batch_limit(simulator, device, make_session, batch_limits):
+    properties = len(MIOT_MAPPING[device["model"]])
+    async with simulator:
+        rejected = limit_batches(simulator.devices[device["host"]])
+        session = make_session()
+        try:
+            plug = make_plug(device, session)
+            await plug.async_info()
+            for _ in range(3):
+                values = await plug.async_get_properties_for_mapping()
+                assert len(values) == properties
+            assert rejected
+            rejected.clear()
+            values = await plug.async_get_properties_for_mapping()
+        finally:
+            session.close()
+
+    assert len(values) == properties
+    assert not rejected
+    assert batch_limits == {(device["model"], "1.0.0_sim"): {"good": 4, "bad": 5}}
+
+
+async def test_reuse_batch_limit(simulator, device, make_session, batch_limits):
+    batch_limits[(device["model"], "1.0.0_sim")] = {"good": 4, "bad": 5}
+    async with simulator:
+        rejected = limit_batches(simulator.devices[device["host"]])
+        session = make_session()
+        try:
+            plug = make_plug(device, session)
+            await plug.async_info()
+            values = await plug.async_get_properties_for_mapping()
+        finally:
+            session.close()
+
+    assert len(values) == len(MIOT_MAPPING[device["model"]])
+    assert not rejected
+
+
+async def test_keep_batch_limit_per_device_without_firmware(
+    simulator, device, make_session, batch_limits
+):
+    async with simulator:
+        limit_batches(simulator.devices[device["host"]])
+        session = make_session()
+        try:
+            plug = make_plug(device, session)
+            await plug.async_get_properties_for_mapping()
+        finally:
+            session.close()
+
+    assert not batch_limits
+    assert plug._own_batch_limit["bad"] is not None
+
+
+async def test_keep_batch_limit_per_model(batch_limits):
+    simulator = Simulator([MODEL_QMI_POWERSTRIP_2A1C1, MODEL_QMI_PLUG_TW02])
+    strip, plug = simulator.config_entries()
+    async with simulator:
+        # only the power strip rejects large batches, the firmware is the same
+        limit_batches(simulator.devices[strip["host"]])
+        for device, device_class in ((strip, SwitchMiot), (plug, SwitchMiotTW02)):
+            session = MiioProtocol(device["host"], device["token"], timeout=0.2)
+            try:
+                miot = device_class(device["host"], device["token"], model=device["model"])
+                miot.use_session(session)
+                await miot.async_info()
+                await miot.async_get_properties_for_mapping()
+            finally:
+                session.close()
+
+    assert batch_limits[(MODEL_QMI_POWERSTRIP_2A1C1, "1.0.0_sim")]["bad"] is not None
+    assert batch_limits[(MODEL_QMI_PLUG_TW02, "1.0.0_sim")]["bad"] is None
+
+
+def test_decode_properties_changed():
+    plug = SwitchMiot("127.0.0.1", 32 * "0")
+    changes = plug.decode_properties_changed(
+        [
+            {"siid": 2, "piid": 1, "value": True},
+            {"siid": 2, "piid": 2},
+            {"siid": 99, "piid": 1, "value": 1},
+        ]
+    )
+
+    assert changes == {"status": True}
+
+
+async def test_pushed_properties_changed(simulator, device, make_session):
+    simulator.push = True
+    messages = []
+    async with simulator:
+        session = make_session()
+        try:
+            plug = make_plug(device, session)
+            plug.async_subscribe(lambda method, params: messages.append((method, params)))
+            await plug.async_off()
+            await asyncio.sleep(0.05)
+        finally:
+            session.close()
+
+    assert [method for method, _ in messages] == ["properties_changed"]
+    assert plug.decode_properties_changed(messages[0][1]) == {"status": False}
+
+
+async def test_relay_writes_are_sent_alone(simulator, device, make_session):
+    async with simulator:
+        session = make_session()
+        try:
+            plug = make_plug(device, session)
+            await session.async_send_handshake()
+            requests = simulator.devices[device["host"]].requests
+            on, off = await asyncio.gather(plug.async_on(), plug.async_off())
+            sent = simulator.devices[device["host"]].requests - requests
+        finally:
+            session.close()
+
+    assert sent == 2
+    assert on[0]["code"] == 0
+    assert off[0]["code"] == 0
+    assert not simulator.devices[device["host"]].is_on
+
+
+async def test_coalesced_writes_report_superseded_values(
+    simulator, device, make_session
+):
+    async with simulator:
+        session = make_session()
+        try:
+            plug = make_plug(device, session)
+            await session.async_send_handshake()
+            requests = simulator.devices[device["host"]].requests
+            first, second = await asyncio.gather(
+                plug.async_set_properties({"count_down_time": 5}),
+                plug.async_set_properties({"count_down_time": 9, "enable_led": True}),
+            )
+            sent = simulator.devices[device["host"]].requests - requests
+        finally:
+            session.close()
+
+    assert sent == 1
+    assert first == {"count_down_time": None}
+    assert second == {"count_down_time": 0, "enable_led": 0}
+    assert simulator.devices[device["host"]].properties["count_down_time"] == 9
+
+
+async def test_unknown_property_is_a_device_exception(device):
+    plug = SwitchMiot(device["host"], device["token"], model=device["model"])
+
+    with pytest.raises(DeviceException, match="Unknown properties"):
+        await plug.async_set_properties({"no_such_property": 1})
+
+
+async def test_partial_write_reply(simulator, device, make_session):
+    async with simulator:
+        virtual_device = simulator.devices[device["host"]]
+        # the device answers without the result of the property
+        virtual_device._set_properties = lambda params: []
+        session = make_session()
+        try:
+            plug = make_plug(device, session)
+            result = await plug.async_set_property("count_down_time", 5)
+        finally:
+            session.close()
+
+    assert result[0]["did"] == "count_down_time"
+    assert result[0]["code"] is None
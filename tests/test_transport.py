@@ -0,0 +1,211 @@
+"""Tests of the asyncio miIO transport against the device simulator."""
+import asyncio
+
+import pytest
+from miio import DeviceException
+
+from custom_components.xiaomi_miio_plug.transport import MiioSessionPool, TokenBucket
+
+
+async def test_handshake_once_per_session(simulator, device, make_session):
+    async with simulator:
+        session = make_session()
+        try:
+            info = await session.async_send("miIO.info")
+            await session.async_send("miIO.info")
+            assert session.discovered
+        finally:
+            session.close()
+
+    assert info["model"] == device["model"]
+    assert session.metrics.handshakes == 1
+
+
+async def test_handshake_again_on_clock_drift(simulator, device, make_session):
+    async with simulator:
+        session = make_session()
+        try:
+            await session.async_send("miIO.info")
+            # a power cycle restarts the clock of the device
+            simulator.devices[device["host"]].reboot()
+            await session.async_send("miIO.info")
+            assert not session.discovered
+            await session.async_send("miIO.info")
+            assert session.discovered
+        finally:
+            session.close()
+
+    assert session.metrics.handshakes == 2
+
+
+async def test_retry_lost_command(simulator, device, make_session):
+    async with simulator:
+        server = simulator.servers[device["host"]]
+        session = make_session(retry_count=2)
+        try:
+            await session.async_send_handshake()
+            server.lose_commands = 1
+            info = await session.async_send("miIO.info")
+        finally:
+            session.close()
+
+    assert info["model"] == device["model"]
+    assert session.metrics.timeouts == 1
+    assert session.metrics.retries == 1
+    # a single lost packet keeps the session
+    assert session.metrics.handshakes == 1
+
+
+async def test_timeout_after_retries(simulator, device, make_session):
+    async with simulator:
+        server = simulator.servers[device["host"]]
+        session = make_session(retry_count=2)
+        try:
+            await session.async_send_handshake()
+            server.lose_commands = 3
+            with pytest.raises(DeviceException, match="No response"):
+                await session.async_send("miIO.info")
+        finally:
+            session.close()
+
+    assert server.lost == 3
+    assert session.metrics.timeouts == 3
+    assert session.metrics.retries == 2
+    # the session is considered lost after consecutive timeouts
+    assert session.metrics.handshakes == 2
+
+
+async def test_timeout_without_device(make_session):
+    session = make_session(retry_count=1)
+    try:
+        with pytest.raises(DeviceException, match="Unable to discover"):
+            await session.async_send("miIO.info")
+    finally:
+        session.close()
+
+    assert not session.discovered
+
+
+def record_methods(session) -> list:
+    """Return the list the session appends the method of every request to."""
+    methods = []
+
+    def recorder(host, request, response, latency):
+        if request is not None:
+            methods.append((request["method"], request["params"]))
+
+    session.recorder = recorder
+    return methods
+
+
+async def test_writes_ahead_of_reads(simulator, make_session):
+    status = [{"did": "status", "siid": 2, "piid": 1}]
+    mode = [{"did": "mode", "siid": 2, "piid": 2}]
+    switch_on = [{"did": "status", "siid": 2, "piid": 1, "value": True}]
+    async with simulator:
+        session = make_session()
+        try:
+            await session.async_send_handshake()
+            methods = record_methods(session)
+            first = asyncio.ensure_future(session.async_send("get_properties", status))
+            # the first read has the device, the others queue up behind it
+            while not session._busy:
+                await asyncio.sleep(0)
+            read = asyncio.ensure_future(session.async_send("get_properties", mode))
+            write = asyncio.ensure_future(session.async_send("set_properties", switch_on))
+            await asyncio.gather(first, read, write)
+        finally:
+            session.close()
+
+    assert methods == [
+        ("get_properties", status),
+        ("set_properties", switch_on),
+        ("get_properties", mode),
+    ]
+
+
+async def test_overlapping_reads_share_a_request(simulator, device, make_session):
+    params = [{"did": "status", "siid": 2, "piid": 1}]
+    async with simulator:
+        session = make_session()
+        try:
+            await session.async_send_handshake()
+            methods = record_methods(session)
+            first, second = await asyncio.gather(
+                session.async_send("get_properties", params),
+                session.async_send("get_properties", params),
+            )
+            await session.async_send("get_properties", params)
+        finally:
+            session.close()
+
+    assert first == second
+    # a read after the shared one finished is sent again
+    assert len(methods) == 2
+    assert not session._reads
+
+
+async def test_close_cancels_shared_reads(simulator, device, make_session):
+    async with simulator:
+        server = simulator.servers[device["host"]]
+        session = make_session()
+        try:
+            await session.async_send_handshake()
+            server.lose_commands = 1
+            read = asyncio.ensure_future(session.async_send("miIO.info"))
+            await asyncio.sleep(0.01)
+        finally:
+            session.close()
+
+        with pytest.raises(asyncio.CancelledError):
+            await read
+    assert not session._reads
+
+
+async def test_token_bucket_burst_and_refill():
+    loop = asyncio.get_running_loop()
+    bucket = TokenBucket(rate=20, burst=2)
+
+    started = loop.time()
+    for _ in range(2):
+        await bucket.async_acquire()
+    assert loop.time() - started < 0.04
+
+    # without tokens left every request waits 1 / rate
+    for _ in range(2):
+        await bucket.async_acquire()
+    assert 0.09 <= loop.time() - started < 0.3
+
+    # an idle bucket refills up to the burst, not beyond
+    await asyncio.sleep(0.3)
+    started = loop.time()
+    for _ in range(3):
+        await bucket.async_acquire()
+    assert 0.04 <= loop.time() - started < 0.2
+
+
+async def test_rate_limits_per_device_and_shared(simulator, device):
+    pool = MiioSessionPool(rate_limit=50)
+    async with simulator:
+        session = pool.get(device["host"], device["token"], rate_limit=10)
+        try:
+            assert pool.get(device["host"], device["token"], rate_limit=10) is session
+            assert [bucket.rate for bucket in session.rate_limits] == [10, 50]
+            assert session.rate_limits[1] is pool.rate_limit
+
+            loop = asyncio.get_running_loop()
+            started = loop.time()
+            for _ in range(3):
+                await session.async_send("miIO.info")
+            # the burst of the device is its rate, the requests don't wait
+            assert loop.time() - started < 0.5
+
+            # a changed rate takes effect on the running session
+            pool.get(device["host"], device["token"], rate_limit=2)
+            for _ in range(2):
+                await session.async_send("miIO.info")
+            started = loop.time()
+            await session.async_send("miIO.info")
+            assert loop.time() - started >= 0.45
+        finally:
+            pool.close(device["host"])
@@ -0,0 +1 @@
+"""Development tools of the Xiaomi Plug/PowerStrip component."""
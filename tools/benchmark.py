@@ -0,0 +1,581 @@
+"""Fleet polling benchmark of the Xiaomi Plug/PowerStrip component.
+
+Sets up a Home Assistant instance with one config entry per simulated device
+and measures, for each fleet size, the polls per second, the event loop lag,
+the queue depth of the executor of Home Assistant, the status latency and
+the state writes per poll cycle. Fault scenarios inject packet loss,
+latency, reboots or an outage and additionally measure the availability
+handling: the time to detect an offline device and to recover, spurious
+unavailable transitions, the outcome of switch commands and the threads in
+use. The results are written as JSON and can be compared against a stored
+baseline:
+
+    python -m tools.benchmark --devices 10,100,1000 --output results.json
+    python -m tools.benchmark --scenarios flapping,outage --devices 100
+    python -m tools.benchmark --baseline tools/benchmark_baseline.json
+"""
+import argparse
+import asyncio
+import json
+import logging
+import platform
+import resource
+import sys
+import tempfile
+import threading
+import time
+from typing import Dict, List, Optional
+
+from homeassistant import bootstrap, loader
+from homeassistant.config_entries import ConfigEntries, ConfigEntry
+from homeassistant.components.xiaomi_miio.const import CONF_FLOW_TYPE
+from homeassistant.const import (
+    CONF_DEVICE,
+    CONF_HOST,
+    CONF_SCAN_INTERVAL,
+    CONF_TOKEN,
+    EVENT_STATE_CHANGED,
+    STATE_UNAVAILABLE,
+)
+from homeassistant.const import __version__ as HA_VERSION
+from homeassistant.core import HomeAssistant
+from homeassistant.helpers.entity import Entity
+from homeassistant.runner import MAX_EXECUTOR_WORKERS
+from homeassistant.setup import async_setup_component
+from homeassistant.util.executor import InterruptibleThreadPoolExecutor
+
+from custom_components.xiaomi_miio_plug.const import (
+    CONF_MODEL,
+    CONF_RATE_LIMIT,
+    DATA_COORDINATOR,
+    DATA_KEY,
+    DOMAIN,
+    MODELS_MIOT,
+    MODELS_PLUG_MIIO,
+    MODELS_POWERSTRIP_MIIO,
+)
+from tools.simulator import FaultProfile, Simulator
+
+_LOGGER = logging.getLogger(__name__)
+
+DEFAULT_DEVICES = [10, 50, 100, 200, 500, 1000]
+DEFAULT_MODELS = MODELS_PLUG_MIIO + MODELS_POWERSTRIP_MIIO + MODELS_MIOT
+DEFAULT_DURATION = 30
+DEFAULT_SCAN_INTERVAL = 10
+# the global rate limit must not be the bottleneck of the largest fleet
+DEFAULT_GLOBAL_RATE_LIMIT = 1000
+LAG_PROBE_INTERVAL = 0.05
+# switch commands sent every COMMAND_INTERVAL seconds, to as many entities
+COMMAND_INTERVAL = 5
+COMMAND_SAMPLE = 5
+# time the fleet gets to come back after an outage
+OUTAGE_RECOVERY_WINDOW = 120
+# polls sent during an outage may only fail this many seconds after it
+OUTAGE_GRACE = 30
+
+SCENARIOS = {
+    "clean": FaultProfile(),
+    "lossy": FaultProfile(loss=0.05),
+    "flapping": FaultProfile(loss=0.2, latency=0.05, jitter=0.5, reorder=0.1),
+    "slow": FaultProfile(latency=1.0, jitter=1.0),
+    "reboots": FaultProfile(reboot_interval=20, reboot_downtime=3),
+    "outage": FaultProfile(outage_start=5, outage_duration=60),
+}
+
+# compared metrics, True if higher is better
+METRICS = {
+    "poll_efficiency": True,
+    "loop_lag_p99_ms": False,
+    "executor_queue_depth_max": False,
+    "status_latency_p50_ms": False,
+    "status_latency_p99_ms": False,
+    "state_writes_per_cycle": False,
+    "spurious_unavailable": False,
+    "time_to_detect_max_s": False,
+    "time_to_recover_max_s": False,
+    "command_success_ratio": True,
+    "threads_max": False,
+}
+DEFAULT_TOLERANCE = 0.25
+# below these differences a metric is noise, whatever the ratio
+ABSOLUTE_TOLERANCE = {
+    "poll_efficiency": 0.05,
+    "loop_lag_p99_ms": 5.0,
+    "executor_queue_depth_max": 1,
+    "status_latency_p50_ms": 2.0,
+    "status_latency_p99_ms": 5.0,
+    "state_writes_per_cycle": 0.5,
+    "spurious_unavailable": 2,
+    "time_to_detect_max_s": 5.0,
+    "time_to_recover_max_s": 10.0,
+    "command_success_ratio": 0.05,
+    "threads_max": 2,
+}
+
+
+def percentile(samples: List[float], fraction: float) -> Optional[float]:
+    """Return the nearest-rank percentile of the samples."""
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def _ms(seconds: Optional[float]) -> Optional[float]:
+    return None if seconds is None else round(seconds * 1000, 2)
+
+
+def _us(seconds: Optional[float]) -> Optional[float]:
+    return None if seconds is None else round(seconds * 1000000, 1)
+
+
+def _round(seconds: Optional[float]) -> Optional[float]:
+    return None if seconds is None else round(seconds, 2)
+
+
+class FleetMetrics:
+    """Collect the poll, latency, loop lag and state write samples of a run.
+
+    The availability transitions of the switches and the outcome of switch
+    commands are recorded against the fault profile of the run.
+    """
+
+    def __init__(
+        self, hass: HomeAssistant, faults: FaultProfile, commands: bool = True
+    ) -> None:
+        """Initialize the metrics, switch commands are only sent if commands."""
+        self.hass = hass
+        self.faults = faults
+        self.send_commands = commands
+        self.recording = False
+        self.epoch = None
+        self.polls = 0
+        self.failed_polls = 0
+        self.latencies: List[float] = []
+        self.loop_lags: List[float] = []
+        self.queue_depths: List[int] = []
+        self.busy_threads: List[int] = []
+        self.threads: List[int] = []
+        self.state_writes = 0
+        self.write_costs: List[float] = []
+        self.went_unavailable: Dict[str, List[float]] = {}
+        self.went_available: Dict[str, List[float]] = {}
+        self.commands: List[bool] = []
+        self.command_latencies: List[float] = []
+        self._tasks = []
+        self._unsub_state = None
+        self._write_ha_state = None
+
+    def instrument(self) -> None:
+        """Count the scheduled polls, time the status requests and count state writes.
+
+        Read backs and confirmations request the status as well, they are
+        timed but not counted as polls.
+        """
+        for data in self.hass.data[DOMAIN].values():
+            coordinator = data[DATA_COORDINATOR]
+            coordinator.async_refresh = self._counted(coordinator)
+            plug = coordinator.plug
+            plug.async_status = self._timed(plug.async_status)
+
+        metrics = self
+        write_ha_state = self._write_ha_state = Entity.async_write_ha_state
+
+        def async_write_ha_state(entity) -> None:
+            if not metrics.recording or entity.platform is None or (
+                entity.platform.platform_name != DOMAIN
+            ):
+                write_ha_state(entity)
+                return
+
+            started = time.perf_counter()
+            write_ha_state(entity)
+            metrics.write_costs.append(time.perf_counter() - started)
+            metrics.state_writes += 1
+
+        Entity.async_write_ha_state = async_write_ha_state
+        self._unsub_state = self.hass.bus.async_listen(
+            EVENT_STATE_CHANGED, self._async_state_changed
+        )
+
+    def restore(self) -> None:
+        """Undo the instrumentation of the entities."""
+        if self._write_ha_state is not None:
+            Entity.async_write_ha_state = self._write_ha_state
+            self._write_ha_state = None
+        if self._unsub_state is not None:
+            self._unsub_state()
+            self._unsub_state = None
+
+    def _async_state_changed(self, event) -> None:
+        """Record the availability transitions of the switches."""
+        entity_id = event.data["entity_id"]
+        if not self.recording or entity_id not in self.hass.data[DATA_KEY].by_entity_id:
+            return
+
+        old, new = event.data["old_state"], event.data["new_state"]
+        was_unavailable = old is not None and old.state == STATE_UNAVAILABLE
+        is_unavailable = new is not None and new.state == STATE_UNAVAILABLE
+        elapsed = self.hass.loop.time() - self.epoch
+        if is_unavailable and not was_unavailable:
+            self.went_unavailable.setdefault(entity_id, []).append(elapsed)
+        elif was_unavailable and not is_unavailable:
+            self.went_available.setdefault(entity_id, []).append(elapsed)
+
+    def _counted(self, coordinator):
+        async_refresh = coordinator.async_refresh
+
+        async def async_counted_refresh():
+            await async_refresh()
+            if not self.recording:
+                return
+            if coordinator.last_update_success:
+                self.polls += 1
+            else:
+                self.failed_polls += 1
+
+        return async_counted_refresh
+
+    def _timed(self, async_status):
+        loop = self.hass.loop
+
+        async def async_timed_status(*args, **kwargs):
+            started = loop.time()
+            result = await async_status(*args, **kwargs)
+            if self.recording:
+                self.latencies.append(loop.time() - started)
+            return result
+
+        return async_timed_status
+
+    async def _async_probe_lag(self) -> None:
+        """Sample the loop lag and the default executor of Home Assistant.
+
+        The executor is sampled through its ThreadPoolExecutor internals:
+        the calls waiting in its work queue and the threads not idling.
+        """
+        loop = self.hass.loop
+        # pylint: disable=protected-access
+        executor = loop._default_executor
+        while True:
+            started = loop.time()
+            await asyncio.sleep(LAG_PROBE_INTERVAL)
+            self.loop_lags.append(loop.time() - started - LAG_PROBE_INTERVAL)
+            self.queue_depths.append(executor._work_queue.qsize())
+            self.busy_threads.append(
+                len(executor._threads) - executor._idle_semaphore._value
+            )
+            self.threads.append(threading.active_count())
+
+    async def _async_send_commands(self) -> None:
+        """Turn a few switches on every COMMAND_INTERVAL, in turns."""
+        loop = self.hass.loop
+        entities = list(self.hass.data[DATA_KEY].by_entity_id.values())
+        turn = 0
+        while entities:
+            await asyncio.sleep(COMMAND_INTERVAL)
+            sample = [
+                entities[(turn + index) % len(entities)]
+                for index in range(min(COMMAND_SAMPLE, len(entities)))
+            ]
+            turn += len(sample)
+
+            async def async_command(entity):
+                started = loop.time()
+                succeeded = await entity.async_turn_on()
+                self.commands.append(bool(succeeded))
+                self.command_latencies.append(loop.time() - started)
+
+            await asyncio.gather(*(async_command(entity) for entity in sample))
+
+    def start(self) -> None:
+        """Start recording."""
+        self.recording = True
+        self.epoch = self.hass.loop.time()
+        self._tasks = [self.hass.loop.create_task(self._async_probe_lag())]
+        if self.send_commands:
+            self._tasks.append(self.hass.loop.create_task(self._async_send_commands()))
+
+    def stop(self) -> None:
+        """Stop recording."""
+        self.recording = False
+        for task in self._tasks:
+            task.cancel()
+
+    def _availability(self) -> dict:
+        """Return the availability metrics against the fault profile."""
+        faults = self.faults
+        transitions = sum(len(times) for times in self.went_unavailable.values())
+        result = {"unavailable_transitions": transitions}
+        if faults.outage_start is None:
+            result["spurious_unavailable"] = transitions
+            return result
+
+        start, end = faults.outage_start, faults.outage_end
+        detect, recover, spurious = [], [], 0
+        for entity_id, times in self.went_unavailable.items():
+            in_outage = [
+                elapsed for elapsed in times if start <= elapsed < end + OUTAGE_GRACE
+            ]
+            spurious += len(times) - len(in_outage)
+            if in_outage:
+                detect.append(in_outage[0] - start)
+                back = [
+                    elapsed
+                    for elapsed in self.went_available.get(entity_id, [])
+                    if elapsed >= max(end, in_outage[0])
+                ]
+                if back:
+                    recover.append(back[0] - end)
+
+        switches = len(self.hass.data[DATA_KEY].by_entity_id)
+        result.update(
+            {
+                "spurious_unavailable": spurious,
+                "detected_ratio": round(len(detect) / switches, 3),
+                "time_to_detect_p50_s": _round(percentile(detect, 0.5)),
+                "time_to_detect_max_s": _round(max(detect, default=None)),
+                "recovered_ratio": round(len(recover) / max(len(detect), 1), 3),
+                "time_to_recover_p50_s": _round(percentile(recover, 0.5)),
+                "time_to_recover_max_s": _round(max(recover, default=None)),
+            }
+        )
+        return result
+
+    def result(self, devices: int, duration: float, scan_interval: float) -> dict:
+        """Return the metrics of the run."""
+        polls_per_second = self.polls / duration
+        expected = devices / scan_interval
+        cycles = self.polls / devices
+        return {
+            "devices": devices,
+            "polls": self.polls,
+            "failed_polls": self.failed_polls,
+            "polls_per_second": round(polls_per_second, 2),
+            "expected_polls_per_second": round(expected, 2),
+            "poll_efficiency": round(polls_per_second / expected, 3),
+            "loop_lag_p50_ms": _ms(percentile(self.loop_lags, 0.5)),
+            "loop_lag_p99_ms": _ms(percentile(self.loop_lags, 0.99)),
+            "loop_lag_max_ms": _ms(max(self.loop_lags, default=None)),
+            "executor_queue_depth_max": max(self.queue_depths, default=0),
+            "status_latency_p50_ms": _ms(percentile(self.latencies, 0.5)),
+            "status_latency_p99_ms": _ms(percentile(self.latencies, 0.99)),
+            "state_writes": self.state_writes,
+            "state_writes_per_cycle": round(self.state_writes / cycles, 2)
+            if cycles
+            else None,
+            "state_write_p50_us": _us(percentile(self.write_costs, 0.5)),
+            "state_write_p99_us": _us(percentile(self.write_costs, 0.99)),
+            "commands": len(self.commands),
+            "command_success_ratio": round(sum(self.commands) / len(self.commands), 3)
+            if self.commands
+            else None,
+            "command_latency_p99_ms": _ms(percentile(self.command_latencies, 0.99)),
+            "busy_threads_max": max(self.busy_threads, default=0),
+            "threads_max": max(self.threads, default=0),
+            **self._availability(),
+        }
+
+
+async def async_start_hass(config_dir: str) -> HomeAssistant:
+    """Return a minimal Home Assistant instance storing into config_dir.
+
+    The loop gets the default executor the runner of Home Assistant sets up.
+    """
+    loop = asyncio.get_running_loop()
+    # pylint: disable=protected-access
+    if not isinstance(loop._default_executor, InterruptibleThreadPoolExecutor):
+        loop.set_default_executor(
+            InterruptibleThreadPoolExecutor(
+                thread_name_prefix="SyncWorker", max_workers=MAX_EXECUTOR_WORKERS
+            )
+        )
+    hass = HomeAssistant(config_dir)
+    hass.config.skip_pip = True
+    loader.async_setup(hass)
+    hass.config_entries = ConfigEntries(hass, {})
+    await hass.config_entries.async_initialize()
+    await bootstrap.load_registries(hass)
+    return hass
+
+
+def config_entry(device: dict, scan_interval: int) -> ConfigEntry:
+    """Return the config entry of a simulated device."""
+    return ConfigEntry(
+        version=1,
+        minor_version=1,
+        domain=DOMAIN,
+        title=f"Plug {device['host']}",
+        data={},
+        source="user",
+        options={
+            CONF_FLOW_TYPE: CONF_DEVICE,
+            CONF_HOST: device["host"],
+            CONF_TOKEN: device["token"],
+            CONF_MODEL: device["model"],
+            CONF_SCAN_INTERVAL: scan_interval,
+        },
+        unique_id=device["host"],
+    )
+
+
+async def async_run(
+    devices: int,
+    duration: float = DEFAULT_DURATION,
+    scan_interval: int = DEFAULT_SCAN_INTERVAL,
+    models: Optional[List[str]] = None,
+    global_rate_limit: float = DEFAULT_GLOBAL_RATE_LIMIT,
+    scenario: str = "clean",
+) -> dict:
+    """Poll a fleet of simulated devices for duration seconds and return the metrics.
+
+    The faults of the scenario start with the measurement, a run with an
+    outage lasts until the fleet had the time to come back.
+    """
+    faults = SCENARIOS[scenario]
+    if faults.outage_end is not None:
+        duration = max(duration, faults.outage_end + OUTAGE_RECOVERY_WINDOW)
+    simulator = Simulator.fleet(devices, models or DEFAULT_MODELS, faults=faults)
+    with tempfile.TemporaryDirectory() as config_dir:
+        hass = await async_start_hass(config_dir)
+        metrics = FleetMetrics(hass, faults)
+        async with simulator:
+            try:
+                await async_setup_component(
+                    hass, DOMAIN, {DOMAIN: {CONF_RATE_LIMIT: global_rate_limit}}
+                )
+                started = hass.loop.time()
+                await asyncio.gather(
+                    *(
+                        hass.config_entries.async_add(config_entry(device, scan_interval))
+                        for device in simulator.config_entries()
+                    )
+                )
+                await hass.async_block_till_done()
+                setup_seconds = hass.loop.time() - started
+
+                metrics.instrument()
+                # the first polls of the fleet are spread over one interval
+                await asyncio.sleep(scan_interval)
+                simulator.start_faults()
+                metrics.start()
+                await asyncio.sleep(duration)
+                metrics.stop()
+                dropped = simulator.dropped
+            finally:
+                metrics.restore()
+                await hass.async_stop(force=True)
+
+    result = {"scenario": scenario, **metrics.result(devices, duration, scan_interval)}
+    result["setup_seconds"] = round(setup_seconds, 2)
+    result["dropped_packets"] = dropped
+    return result
+
+
+def compare(results: List[dict], baseline: dict, tolerance: float) -> List[str]:
+    """Return the regressions of the results against the baseline results."""
+    def key(result):
+        return result.get("scenario", "clean"), result["devices"]
+
+    reference = {key(result): result for result in baseline["results"]}
+    regressions = []
+    for result in results:
+        base = reference.get(key(result))
+        if base is None:
+            continue
+        for metric, higher_is_better in METRICS.items():
+            value, expected = result.get(metric), base.get(metric)
+            if value is None or expected is None:
+                continue
+            change = expected - value if higher_is_better else value - expected
+            if change > max(ABSOLUTE_TOLERANCE[metric], tolerance * abs(expected)):
+                regressions.append(
+                    f"{result['scenario']}, {result['devices']} devices: "
+                    f"{metric} {value} (baseline {expected})"
+                )
+    return regressions
+
+
+async def async_main(args) -> int:
+    """Run the sweep and compare it against the baseline."""
+    models = args.models.split(",") if args.models else None
+    results = []
+    for scenario in args.scenarios:
+        for devices in args.devices:
+            _LOGGER.info("Benchmarking %s devices, %s", devices, scenario)
+            results.append(
+                await async_run(
+                    devices,
+                    args.duration,
+                    args.scan_interval,
+                    models,
+                    args.global_rate_limit,
+                    scenario,
+                )
+            )
+            _LOGGER.info("%s", results[-1])
+
+    report = {
+        "home_assistant": HA_VERSION,
+        "python": platform.python_version(),
+        "duration": args.duration,
+        "scan_interval": args.scan_interval,
+        "results": results,
+    }
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            file.write(output + "\n")
+    else:
+        print(output)
+
+    if not args.baseline:
+        return 0
+
+    with open(args.baseline, encoding="utf-8") as file:
+        regressions = compare(results, json.load(file), args.tolerance)
+    for regression in regressions:
+        _LOGGER.error("Regression: %s", regression)
+    return 1 if regressions else 0
+
+
+def main() -> None:
+    """Run the benchmark from the command line."""
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument(
+        "--devices",
+        type=lambda value: [int(count) for count in value.split(",")],
+        default=DEFAULT_DEVICES,
+        help="comma separated fleet sizes",
+    )
+    parser.add_argument("--models", help="comma separated models of the fleet")
+    parser.add_argument(
+        "--scenarios",
+        type=lambda value: value.split(","),
+        default=["clean"],
+        help="comma separated fault scenarios: " + ", ".join(SCENARIOS),
+    )
+    parser.add_argument("--duration", type=float, default=DEFAULT_DURATION)
+    parser.add_argument("--scan-interval", type=int, default=DEFAULT_SCAN_INTERVAL)
+    parser.add_argument(
+        "--global-rate-limit", type=float, default=DEFAULT_GLOBAL_RATE_LIMIT
+    )
+    parser.add_argument("--output", help="write the JSON results to this file")
+    parser.add_argument("--baseline", help="compare against these JSON results")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    logging.getLogger("homeassistant").setLevel(logging.WARNING)
+    logging.getLogger("homeassistant.loader").setLevel(logging.ERROR)
+    logging.getLogger("custom_components").setLevel(logging.WARNING)
+
+    # a client and a server socket per device
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    wanted = 8192 if hard == resource.RLIM_INFINITY else min(hard, 8192)
+    resource.setrlimit(resource.RLIMIT_NOFILE, (max(soft, wanted), hard))
+
+    sys.exit(asyncio.run(async_main(args)))
+
+
+if __name__ == "__main__":
+    main()
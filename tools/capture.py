@@ -0,0 +1,642 @@
+"""Capture and replay of the miIO traffic of the Xiaomi Plug/PowerStrip component.
+
+`record` sets up Home Assistant with the config entries of this component
+found in a configuration directory, polls the real devices with the token
+of each entry and logs every decrypted exchange with its time and latency:
+
+    python -m tools.capture record /config --duration 600 --output plugs.jsonl.gz
+
+`replay` drives the status requests of the recorded devices from a capture,
+at the original or an accelerated speed (0 replays without waiting). The
+recorded responses are served verbatim, including timeouts, error responses
+and non-zero property codes; requests which were not recorded exactly are
+answered from the recorded state of the device. By default the blocking
+python-miio paths (SwitchMiot.status(), ChuangmiPlug.status(),
+PowerStrip.status()) are timed, with --async the awaitable paths of the
+component and with --hass the component itself including its entities:
+
+    python -m tools.capture replay plugs.jsonl.gz --speed 10
+    python -m tools.capture replay plugs.jsonl.gz --speed 0 --async
+    python -m tools.capture replay plugs.jsonl.gz --hass --speed 10
+"""
+import argparse
+import asyncio
+import bisect
+import gzip
+import json
+import logging
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from homeassistant.config_entries import ConfigEntry
+from homeassistant.components.xiaomi_miio.const import CONF_FLOW_TYPE
+from homeassistant.const import CONF_DEVICE, CONF_HOST, CONF_SCAN_INTERVAL
+from homeassistant.setup import async_setup_component
+from miio import (
+    AirConditioningCompanionV3,
+    ChuangmiPlug,
+    DeviceException,
+    PowerStrip,
+)
+from miio.exceptions import DeviceError
+
+from custom_components.xiaomi_miio_plug.const import (
+    CONF_MODEL,
+    DATA_COORDINATOR,
+    DATA_SESSIONS,
+    DEFAULT_SCAN_INTERVAL,
+    DOMAIN,
+    MODEL_QMI_PLUG_TW02,
+    MODELS_ACPARTNER_MIIO,
+    MODELS_MIOT,
+    MODELS_POWERSTRIP_MIIO,
+)
+from custom_components.xiaomi_miio_plug.device import (
+    AsyncAirConditioningCompanionV3,
+    AsyncChuangmiPlug,
+    AsyncPowerStrip,
+)
+from custom_components.xiaomi_miio_plug.switch_miot import SwitchMiot, SwitchMiotTW02
+from custom_components.xiaomi_miio_plug.transport import MiioProtocol
+from tools.benchmark import (
+    FleetMetrics,
+    _ms,
+    _us,
+    async_start_hass,
+    config_entry,
+    percentile,
+)
+from tools.simulator import CODE_OK, CODE_UNKNOWN_PROPERTY, FaultProfile
+
+_LOGGER = logging.getLogger(__name__)
+
+FORMAT_VERSION = 1
+DEFAULT_DURATION = 600
+DEFAULT_SPEED = 1.0
+# the token of the replayed devices, the replay does not encrypt anything
+REPLAY_TOKEN = 32 * "0"
+# methods which read the status, a gap of POLL_GAP seconds starts a new poll
+STATUS_METHODS = ["get_prop", "get_properties", "get_model_and_state"]
+POLL_GAP = 1.0
+
+# an exchange: (time, method, params, response, latency), method and params
+# are None for unsolicited messages of the device, response for timeouts
+Exchange = Tuple[float, Optional[str], Any, Optional[dict], float]
+
+
+class ReplayExhausted(DeviceException):
+    """The capture ended before the request."""
+
+
+class Capture:
+    """The recorded devices and their exchanges.
+
+    Stored as gzip compressed JSON lines: a header with the model and scan
+    interval of every host, then one [time, host, method, params, response,
+    latency] list per exchange, in seconds since the start of the capture.
+    """
+
+    def __init__(
+        self, devices: Dict[str, dict] = None, exchanges: Dict[str, List] = None
+    ) -> None:
+        """Initialize the capture."""
+        self.devices = devices or {}
+        self.exchanges: Dict[str, List[Exchange]] = exchanges or {}
+        self._epoch = None
+
+    @property
+    def duration(self) -> float:
+        """Return the time from the start to the last recorded exchange."""
+        return max(
+            (exchanges[-1][0] for exchanges in self.exchanges.values() if exchanges),
+            default=0.0,
+        )
+
+    def record(
+        self,
+        host: str,
+        request: Optional[dict],
+        response: Optional[dict],
+        latency: float,
+    ) -> None:
+        """Add an exchange, the recorder of the miIO sessions.
+
+        The token the device reports in its miIO.info is not stored.
+        """
+        now = time.monotonic()
+        if self._epoch is None:
+            self._epoch = now - latency
+        method = params = None
+        if request is not None:
+            method, params = request["method"], request["params"]
+        if response is not None:
+            response = {key: value for key, value in response.items() if key != "id"}
+            if method == "miIO.info" and isinstance(response.get("result"), dict):
+                response["result"] = {
+                    key: value
+                    for key, value in response["result"].items()
+                    if key != "token"
+                }
+        self.exchanges.setdefault(host, []).append(
+            (
+                round(now - latency - self._epoch, 3),
+                method,
+                params,
+                response,
+                round(latency, 3),
+            )
+        )
+
+    def save(self, path: str) -> None:
+        """Write the capture to path."""
+        lines = [
+            [exchange[0], host, *exchange[1:]]
+            for host, exchanges in self.exchanges.items()
+            for exchange in exchanges
+        ]
+        lines.sort(key=lambda line: line[0])
+        with gzip.open(path, "wt", encoding="utf-8") as file:
+            file.write(
+                json.dumps({"version": FORMAT_VERSION, "devices": self.devices}) + "\n"
+            )
+            for line in lines:
+                file.write(json.dumps(line, separators=(",", ":")) + "\n")
+
+    @classmethod
+    def load(cls, path: str) -> "Capture":
+        """Read a capture from path."""
+        with gzip.open(path, "rt", encoding="utf-8") as file:
+            header = json.loads(file.readline())
+            if header.get("version") != FORMAT_VERSION:
+                raise ValueError(f"Unsupported capture version {header.get('version')}")
+            exchanges: Dict[str, List[Exchange]] = {}
+            for line in file:
+                moment, host, method, params, response, latency = json.loads(line)
+                exchanges.setdefault(host, []).append(
+                    (moment, method, params, response, latency)
+                )
+        return cls(header["devices"], exchanges)
+
+
+class ReplayLog:
+    """Serve the recorded exchanges of one device along its timeline.
+
+    A request is answered by the next recorded exchange of its method at
+    the current time of the log. The recorded state of the device (the
+    values of all responses and unsolicited messages so far) answers the
+    requests whose parameters differ from the recorded ones.
+    """
+
+    def __init__(self, exchanges: List[Exchange], speed: float) -> None:
+        """Initialize the log."""
+        self.speed = speed
+        self.now = 0.0
+        self.waited = 0.0
+        self.served = 0
+        self.timeouts = 0
+        self.error_responses = 0
+        self.nonzero_codes = 0
+        self._exchanges = sorted(exchanges, key=lambda exchange: exchange[0])
+        self._by_method: Dict[str, List[Exchange]] = {}
+        for exchange in self._exchanges:
+            if exchange[1] is not None:
+                self._by_method.setdefault(exchange[1], []).append(exchange)
+        self._times = {
+            method: [exchange[0] for exchange in exchanges]
+            for method, exchanges in self._by_method.items()
+        }
+        self._applied = 0
+        self._props: Dict[str, Any] = {}
+        self._properties: Dict[tuple, dict] = {}
+
+    def polls(self) -> List[float]:
+        """Return the start times of the recorded status polls."""
+        times = sorted(
+            moment
+            for method in STATUS_METHODS
+            for moment in self._times.get(method, [])
+        )
+        polls = []
+        for moment in times:
+            if not polls or moment - polls[-1] > POLL_GAP:
+                polls.append(moment)
+        return polls
+
+    def _apply(self, until: float) -> None:
+        """Take over the values of the exchanges completed until then."""
+        while self._applied < len(self._exchanges):
+            moment, method, params, response, latency = self._exchanges[self._applied]
+            if moment + latency > until:
+                return
+            self._applied += 1
+            if response is None:
+                continue
+            result = response.get("result")
+            if method == "get_prop" and isinstance(result, list):
+                self._props.update(zip(params, result))
+            elif method == "get_properties" and isinstance(result, list):
+                for prop in result:
+                    self._properties[(prop.get("siid"), prop.get("piid"))] = prop
+            elif response.get("method") == "properties_changed":
+                for prop in response.get("params", []):
+                    key = (prop.get("siid"), prop.get("piid"))
+                    self._properties[key] = {**prop, "code": CODE_OK}
+
+    def _answer(self, method: str, params: list, response: dict) -> dict:
+        """Answer a status request from the recorded state."""
+        if method == "get_prop":
+            result = [self._props.get(name) for name in params]
+        else:
+            result = []
+            for param in params:
+                recorded = self._properties.get((param.get("siid"), param.get("piid")))
+                if recorded is None:
+                    result.append({**param, "code": CODE_UNKNOWN_PROPERTY})
+                else:
+                    result.append({**recorded, **param})
+        return {**response, "result": result}
+
+    def exchange(self, method: str, params: Any) -> Tuple[Optional[dict], float]:
+        """Return the response and latency of a request at the current time."""
+        exchanges = self._by_method.get(method)
+        if not exchanges:
+            self._apply(self.now)
+            if method in ("get_prop", "get_properties"):
+                return self._answer(method, params, {}), 0.0
+            return {"result": ["ok"]}, 0.0
+
+        index = bisect.bisect_left(self._times[method], self.now)
+        if index == len(exchanges):
+            raise ReplayExhausted(f"The capture has no {method} after {self.now:.1f}s")
+
+        moment, _, recorded_params, response, latency = exchanges[index]
+        self._apply(moment + latency)
+        self.served += 1
+        if response is None:
+            self.timeouts += 1
+        elif "error" in response:
+            self.error_responses += 1
+        elif params != recorded_params and method in ("get_prop", "get_properties"):
+            response = self._answer(method, params, response)
+        if response is not None and method == "get_properties":
+            self.nonzero_codes += sum(
+                1
+                for prop in response.get("result", [])
+                if isinstance(prop, dict) and prop.get("code", CODE_OK) != CODE_OK
+            )
+        return response, latency
+
+    @staticmethod
+    def result(response: Optional[dict]) -> Any:
+        """Return the result of a response or raise like the miIO protocol."""
+        if response is None:
+            raise DeviceException("No response from the device")
+        if "error" in response:
+            raise DeviceError(response["error"])
+        return response.get("result", response)
+
+
+class ReplayProtocol:
+    """Stand-in for the blocking protocol of a python-miio device."""
+
+    def __init__(self, log: ReplayLog) -> None:
+        """Initialize the protocol."""
+        self.log = log
+
+    def send(
+        self,
+        command: str,
+        parameters: Any = None,
+        retry_count: int = None,
+        *,
+        extra_parameters=None,
+    ) -> Any:
+        """Return the recorded response of the command."""
+        response, latency = self.log.exchange(
+            command, parameters if parameters is not None else []
+        )
+        if self.log.speed:
+            started = time.perf_counter()
+            time.sleep(latency / self.log.speed)
+            self.log.waited += time.perf_counter() - started
+        return self.log.result(response)
+
+
+class ReplaySession(MiioProtocol):
+    """Stand-in for the miIO session of a device, answered by a replay log.
+
+    With a clock the time of the log follows the clock, otherwise the
+    driver of the replay sets it.
+    """
+
+    def __init__(
+        self, host: str, log: ReplayLog, clock: Callable[[], float] = None
+    ) -> None:
+        """Initialize the session."""
+        super().__init__(host, REPLAY_TOKEN)
+        self.log = log
+        self._clock = clock
+        self._discovered = True
+
+    async def async_send_handshake(self, retry_count: int = None) -> None:
+        """Skip the handshake, the replayed device is always known."""
+
+    async def async_send(
+        self, command: str, parameters: Any = None, retry_count: int = None
+    ) -> Any:
+        """Return the recorded response of the command."""
+        if self._clock is not None:
+            self.log.now = self._clock()
+        response, latency = self.log.exchange(
+            command, parameters if parameters is not None else []
+        )
+        if self.log.speed:
+            loop = asyncio.get_running_loop()
+            started = loop.time()
+            await asyncio.sleep(latency / self.log.speed)
+            self.log.waited += loop.time() - started
+        return self.log.result(response)
+
+
+def replay_device(host: str, model: str, blocking: bool):
+    """Return a python-miio (blocking) or component device of the model."""
+    if model in MODELS_MIOT:
+        if model == MODEL_QMI_PLUG_TW02:
+            return SwitchMiotTW02(host, REPLAY_TOKEN, model=model)
+        return SwitchMiot(host, REPLAY_TOKEN, model=model)
+    if model in MODELS_ACPARTNER_MIIO:
+        if blocking:
+            return AirConditioningCompanionV3(host, REPLAY_TOKEN)
+        return AsyncAirConditioningCompanionV3(host, REPLAY_TOKEN)
+    if model in MODELS_POWERSTRIP_MIIO:
+        device_class = PowerStrip if blocking else AsyncPowerStrip
+    else:
+        device_class = ChuangmiPlug if blocking else AsyncChuangmiPlug
+    return device_class(host, REPLAY_TOKEN, model=model)
+
+
+class ReplayStats:
+    """Collect the status costs and served responses of a replay, per model."""
+
+    def __init__(self) -> None:
+        """Initialize the statistics."""
+        self.models: Dict[str, dict] = {}
+
+    def add(self, model: str, cost: Optional[float], start_lag: float) -> None:
+        """Add a status call, its cost without the replayed latency or None if failed."""
+        stats = self.models.setdefault(
+            model, {"polls": 0, "failed_polls": 0, "costs": [], "start_lags": []}
+        )
+        stats["polls"] += 1
+        stats["start_lags"].append(start_lag)
+        if cost is None:
+            stats["failed_polls"] += 1
+        else:
+            stats["costs"].append(cost)
+
+    def result(self, logs: Dict[str, Tuple[str, ReplayLog]]) -> dict:
+        """Return the statistics by model."""
+        result = {}
+        for model, stats in sorted(self.models.items()):
+            model_logs = [log for log_model, log in logs.values() if log_model == model]
+            result[model] = {
+                "devices": len(model_logs),
+                "polls": stats["polls"],
+                "failed_polls": stats["failed_polls"],
+                "status_cost_p50_us": _us(percentile(stats["costs"], 0.5)),
+                "status_cost_p99_us": _us(percentile(stats["costs"], 0.99)),
+                "start_lag_p99_ms": _ms(percentile(stats["start_lags"], 0.99)),
+                "responses": sum(log.served for log in model_logs),
+                "timeouts": sum(log.timeouts for log in model_logs),
+                "error_responses": sum(log.error_responses for log in model_logs),
+                "nonzero_codes": sum(log.nonzero_codes for log in model_logs),
+            }
+        return result
+
+
+def replay_blocking(capture: Capture, speed: float) -> dict:
+    """Call status() of the blocking device classes at the recorded polls."""
+    logs = {
+        host: (device["model"], ReplayLog(capture.exchanges.get(host, []), speed))
+        for host, device in capture.devices.items()
+    }
+    stats = ReplayStats()
+    started = time.perf_counter()
+
+    def replay(host: str) -> None:
+        model, log = logs[host]
+        device = replay_device(host, model, True)
+        device._protocol = ReplayProtocol(log)  # pylint: disable=protected-access
+        for moment in log.polls():
+            if speed:
+                time.sleep(max(0.0, started + moment / speed - time.perf_counter()))
+            start_lag = max(0.0, time.perf_counter() - started - moment / speed) if speed else 0.0
+            log.now = moment
+            waited, called = log.waited, time.perf_counter()
+            try:
+                device.status()
+            except ReplayExhausted:
+                return
+            except DeviceException as ex:
+                _LOGGER.debug("%s: replayed status failed: %s", host, ex)
+                stats.add(model, None, start_lag)
+                continue
+            stats.add(model, time.perf_counter() - called - (log.waited - waited), start_lag)
+
+    with ThreadPoolExecutor(max(1, len(logs))) as executor:
+        list(executor.map(replay, logs))
+    return stats.result(logs)
+
+
+async def async_replay(capture: Capture, speed: float) -> dict:
+    """Await async_status() of the component devices at the recorded polls."""
+    logs = {
+        host: (device["model"], ReplayLog(capture.exchanges.get(host, []), speed))
+        for host, device in capture.devices.items()
+    }
+    stats = ReplayStats()
+    loop = asyncio.get_running_loop()
+    started = loop.time()
+
+    async def async_replay_device(host: str) -> None:
+        model, log = logs[host]
+        device = replay_device(host, model, False)
+        device.use_session(ReplaySession(host, log))
+        for moment in log.polls():
+            if speed:
+                await asyncio.sleep(max(0.0, started + moment / speed - loop.time()))
+            start_lag = max(0.0, loop.time() - started - moment / speed) if speed else 0.0
+            log.now = moment
+            waited, called = log.waited, time.perf_counter()
+            try:
+                await device.async_status()
+            except ReplayExhausted:
+                return
+            except DeviceException as ex:
+                _LOGGER.debug("%s: replayed status failed: %s", host, ex)
+                stats.add(model, None, start_lag)
+                continue
+            stats.add(model, time.perf_counter() - called - (log.waited - waited), start_lag)
+
+    await asyncio.gather(*(async_replay_device(host) for host in logs))
+    return stats.result(logs)
+
+
+async def async_replay_hass(capture: Capture, speed: float) -> dict:
+    """Run the component against the capture and measure polls and state writes.
+
+    The scan intervals of the recorded entries are shortened by the speed.
+    """
+    duration = capture.duration / speed
+    scan_intervals = {
+        host: max(1, round(device.get(CONF_SCAN_INTERVAL, DEFAULT_SCAN_INTERVAL) / speed))
+        for host, device in capture.devices.items()
+    }
+    with tempfile.TemporaryDirectory() as config_dir:
+        hass = await async_start_hass(config_dir)
+        metrics = FleetMetrics(hass, FaultProfile(), commands=False)
+        try:
+            await async_setup_component(hass, DOMAIN, {})
+            started = hass.loop.time()
+            logs = {
+                host: ReplayLog(capture.exchanges.get(host, []), speed)
+                for host in capture.devices
+            }
+
+            def session_factory(host, token, rate_limits=None):
+                return ReplaySession(
+                    host, logs[host], lambda: (hass.loop.time() - started) * speed
+                )
+
+            hass.data[DATA_SESSIONS].session_factory = session_factory
+            await asyncio.gather(
+                *(
+                    hass.config_entries.async_add(
+                        config_entry(
+                            {"host": host, "token": REPLAY_TOKEN, "model": device["model"]},
+                            scan_intervals[host],
+                        )
+                    )
+                    for host, device in capture.devices.items()
+                )
+            )
+            await hass.async_block_till_done()
+            metrics.instrument()
+            metrics.start()
+            await asyncio.sleep(max(0.0, duration - (hass.loop.time() - started)))
+            metrics.stop()
+        finally:
+            metrics.restore()
+            await hass.async_stop(force=True)
+
+    devices = len(capture.devices)
+    scan_interval = sum(scan_intervals.values()) / max(devices, 1)
+    result = metrics.result(devices, duration, scan_interval)
+    result["responses"] = sum(log.served for log in logs.values())
+    result["nonzero_codes"] = sum(log.nonzero_codes for log in logs.values())
+    return result
+
+
+def load_entries(config_dir: str) -> List[dict]:
+    """Return the options of the config entries of this component in config_dir."""
+    with open(
+        os.path.join(config_dir, ".storage", "core.config_entries"), encoding="utf-8"
+    ) as file:
+        stored = json.load(file)
+    return [
+        {**(entry.get("data") or {}), **(entry.get("options") or {})}
+        for entry in stored["data"]["entries"]
+        if entry["domain"] == DOMAIN
+    ]
+
+
+async def async_record(config_dir: str, duration: float) -> Capture:
+    """Poll the configured devices for duration seconds and capture the exchanges."""
+    entries = load_entries(config_dir)
+    capture = Capture()
+    with tempfile.TemporaryDirectory() as work_dir:
+        hass = await async_start_hass(work_dir)
+        try:
+            await async_setup_component(hass, DOMAIN, {})
+            hass.data[DATA_SESSIONS].recorder = capture.record
+            await asyncio.gather(
+                *(
+                    hass.config_entries.async_add(
+                        ConfigEntry(
+                            version=1,
+                            minor_version=1,
+                            domain=DOMAIN,
+                            title=options[CONF_HOST],
+                            data={},
+                            source="user",
+                            options={CONF_FLOW_TYPE: CONF_DEVICE, **options},
+                            unique_id=options[CONF_HOST],
+                        )
+                    )
+                    for options in entries
+                )
+            )
+            await hass.async_block_till_done()
+            for options in entries:
+                host = options[CONF_HOST]
+                data = hass.data.get(DOMAIN, {}).get(host)
+                info = data[DATA_COORDINATOR].info if data is not None else None
+                capture.devices[host] = {
+                    "model": options.get(CONF_MODEL) or (info.model if info else None),
+                    CONF_SCAN_INTERVAL: options.get(
+                        CONF_SCAN_INTERVAL, DEFAULT_SCAN_INTERVAL
+                    ),
+                }
+            _LOGGER.info("Recording %s devices for %ss", len(entries), duration)
+            await asyncio.sleep(duration)
+        finally:
+            await hass.async_stop(force=True)
+    return capture
+
+
+def main() -> None:
+    """Record or replay a capture from the command line."""
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    commands = parser.add_subparsers(dest="command", required=True)
+    record = commands.add_parser("record", help="capture the traffic of the devices")
+    record.add_argument("config_dir", help="Home Assistant configuration directory")
+    record.add_argument("--duration", type=float, default=DEFAULT_DURATION)
+    record.add_argument("--output", required=True, help="file of the capture")
+    replay = commands.add_parser("replay", help="replay a capture")
+    replay.add_argument("capture", help="file of the capture")
+    replay.add_argument(
+        "--speed", type=float, default=DEFAULT_SPEED, help="0 replays without waiting"
+    )
+    mode = replay.add_mutually_exclusive_group()
+    mode.add_argument("--async", dest="asynchronous", action="store_true")
+    mode.add_argument("--hass", action="store_true")
+    parser.add_argument("--debug", action="store_true")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.DEBUG if args.debug else logging.INFO)
+    logging.getLogger("homeassistant").setLevel(logging.WARNING)
+    logging.getLogger("homeassistant.loader").setLevel(logging.ERROR)
+
+    if args.command == "record":
+        capture = asyncio.run(async_record(args.config_dir, args.duration))
+        capture.save(args.output)
+        return
+
+    capture = Capture.load(args.capture)
+    if args.hass:
+        if not args.speed:
+            parser.error("--hass replays in real time, the speed must not be 0")
+        result = asyncio.run(async_replay_hass(capture, args.speed))
+    elif args.asynchronous:
+        result = asyncio.run(async_replay(capture, args.speed))
+    else:
+        result = replay_blocking(capture, args.speed)
+    json.dump(result, sys.stdout, indent=2)
+    print()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,572 @@
+"""Simulated miIO/MIoT plugs and power strips for offline tests and benchmarks.
+
+Every virtual device listens on its own loopback address at the miIO port,
+so the integration and python-miio talk to it unchanged. Start a fleet with:
+
+    python -m tools.simulator --count 200 > devices.json
+
+and add the printed host/token/model of a device as a config entry.
+"""
+import argparse
+import asyncio
+import datetime
+import hashlib
+import ipaddress
+import json
+import logging
+import random
+import struct
+import time
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+import construct
+from miio.protocol import Message
+
+from custom_components.xiaomi_miio_plug.const import (
+    MODEL_CHUANGMI_PLUG_V3,
+    MODELS_ACPARTNER_MIIO,
+    MODELS_ALL_DEVICES,
+    MODELS_MIOT,
+    MODELS_POWERSTRIP_MIIO,
+)
+from custom_components.xiaomi_miio_plug.device import PLUG_PROPERTIES
+from custom_components.xiaomi_miio_plug.switch_miot import MIOT_MAPPING
+from custom_components.xiaomi_miio_plug.transport import HELLO_LENGTH, MIIO_PORT
+
+_LOGGER = logging.getLogger(__name__)
+
+DEFAULT_BASE_ADDRESS = "127.0.1.1"
+# MIoT result codes
+CODE_OK = 0
+CODE_UNKNOWN_PROPERTY = -4003
+METHOD_NOT_FOUND = {"code": -32601, "message": "Method not found."}
+INVALID_PARAMS = {"code": -32602, "message": "Invalid params."}
+
+MIOT_DEFAULTS = {
+    "status": True,
+    "on": True,
+    "temperature": 36,
+    "working_time": 120,
+    "power_consumption": 1250,
+    "voltage": 230,
+    "current": 0.2,
+    "energy": 1.25,
+    "enable_led": True,
+    "enable_buzzer": True,
+    "system_status": 0,
+}
+LEGACY_DEFAULTS = {
+    "power": "on",
+    "on": True,
+    "usb_on": True,
+    "temperature": 38,
+    "current": 0.2,
+    "mode": "normal",
+    "power_consume_rate": 40.0,
+    "voltage": 23000,
+    "power_factor": 0.9,
+    "elec_leakage": 0,
+    "wifi_led": "on",
+    "power_price": 49,
+}
+# extra delay of a reordered packet, later packets overtake it
+REORDER_DELAY = 0.05
+
+POWERSTRIP_PROPERTIES = [
+    "power",
+    "temperature",
+    "current",
+    "mode",
+    "power_consume_rate",
+    "voltage",
+    "power_factor",
+    "elec_leakage",
+    "wifi_led",
+    "power_price",
+]
+
+
+def device_token(index: int) -> str:
+    """Return the reproducible token of the device with the given index."""
+    return hashlib.md5(f"xiaomi_miio_plug-{index}".encode()).hexdigest()
+
+
+class VirtualDevice:
+    """State and command handling of one simulated device."""
+
+    def __init__(self, model: str, token: str, device_id: int, load_power: float = 40.0):
+        """Initialize the device, switched on and drawing load_power watts."""
+        self.model = model
+        self.token = bytes.fromhex(token)
+        self.device_id = device_id.to_bytes(4, "big")
+        self.mac = ":".join(f"{byte:02x}" for byte in (b"\x28\x6c" + self.device_id))
+        self.base_load_power = load_power
+        self.booted = time.time() - random.randint(3600, 86400)
+        self.requests = 0
+        if model in MODELS_MIOT:
+            self.mapping = MIOT_MAPPING[model]
+            self.index = {
+                (prop["siid"], prop["piid"]): did for did, prop in self.mapping.items()
+            }
+            self.properties = {did: MIOT_DEFAULTS.get(did, 0) for did in self.mapping}
+            self.relay = "status" if "status" in self.mapping else "on"
+        else:
+            self.mapping = None
+            self.index = {}
+            if model in MODELS_POWERSTRIP_MIIO:
+                names = POWERSTRIP_PROPERTIES
+            elif model in MODELS_ACPARTNER_MIIO:
+                names = ["power_socket"]
+            else:
+                names = PLUG_PROPERTIES[model]
+            self.properties = {name: LEGACY_DEFAULTS.get(name) for name in names}
+            if model in MODELS_ACPARTNER_MIIO:
+                self.properties["power_socket"] = "on"
+                self.relay = "power_socket"
+            else:
+                self.relay = "on" if "on" in self.properties else "power"
+
+    @property
+    def stamp(self) -> int:
+        """Return the device clock, the seconds since the last boot."""
+        return int(time.time() - self.booted)
+
+    def reboot(self) -> None:
+        """Restart the clock of the device, as a power cycle does."""
+        self.booted = time.time()
+
+    @property
+    def is_on(self) -> bool:
+        """Return true if the relay is closed."""
+        return self.properties[self.relay] in (True, "on")
+
+    def set_relay(self, on: bool) -> None:
+        """Open or close the relay."""
+        if self.mapping is not None or self.relay == "on":
+            self.properties[self.relay] = on
+        else:
+            self.properties[self.relay] = "on" if on else "off"
+
+    def load_power(self) -> float:
+        """Return the current load power in watts, noisy while switched on."""
+        if not self.is_on:
+            return 0.0
+        return round(max(0.0, random.gauss(self.base_load_power, 2.0)), 1)
+
+    def handle(self, method: str, params: Any) -> Tuple[str, Any]:
+        """Run a command and return the result or error key and its value."""
+        self.requests += 1
+        handler = getattr(self, "_" + method.replace(".", "_"), None)
+        if handler is None:
+            return "error", METHOD_NOT_FOUND
+        try:
+            result = handler(params or [])
+        except (AttributeError, IndexError, KeyError, TypeError):
+            return "error", INVALID_PARAMS
+        if result is METHOD_NOT_FOUND:
+            return "error", result
+        return "result", result
+
+    def _miIO_info(self, _params) -> dict:
+        return {
+            "model": self.model,
+            "fw_ver": "1.0.0_sim",
+            "hw_ver": "ESP32" if self.mapping is not None else "MW300",
+            "mac": self.mac,
+            "token": self.token.hex(),
+            "life": self.stamp,
+            "ap": {"ssid": "simulator", "bssid": "00:00:00:00:00:00", "rssi": -50},
+            "netif": {"localIp": None, "mask": "255.0.0.0", "gw": "127.0.0.1"},
+        }
+
+    def _get_properties(self, params: list) -> list:
+        results = []
+        for prop in params:
+            did = self.index.get((prop.get("siid"), prop.get("piid")))
+            result = {key: prop.get(key) for key in ("did", "siid", "piid")}
+            if did is None:
+                result["code"] = CODE_UNKNOWN_PROPERTY
+            else:
+                result["code"] = CODE_OK
+                if did == "load_power":
+                    result["value"] = self.load_power()
+                else:
+                    result["value"] = self.properties[did]
+            results.append(result)
+        return results
+
+    def _set_properties(self, params: list) -> list:
+        results = []
+        for prop in params:
+            did = self.index.get((prop.get("siid"), prop.get("piid")))
+            result = {key: prop.get(key) for key in ("did", "siid", "piid")}
+            if did is None:
+                result["code"] = CODE_UNKNOWN_PROPERTY
+            else:
+                result["code"] = CODE_OK
+                if did == self.relay:
+                    self.set_relay(bool(prop.get("value")))
+                else:
+                    self.properties[did] = prop.get("value")
+            results.append(result)
+        return results
+
+    def _get_prop(self, params: list) -> list:
+        return [
+            self.load_power() if name == "power_consume_rate" else self.properties.get(name)
+            for name in params
+        ]
+
+    def _set_power(self, params: list) -> list:
+        self.set_relay(params[0] == "on")
+        return ["ok"]
+
+    def _set_on(self, _params) -> list:
+        self.set_relay(True)
+        return ["ok"]
+
+    def _set_off(self, _params) -> list:
+        self.set_relay(False)
+        return ["ok"]
+
+    def _set_usb_on(self, _params) -> list:
+        self.properties["usb_on"] = True
+        return [0]
+
+    def _set_usb_off(self, _params) -> list:
+        self.properties["usb_on"] = False
+        return [0]
+
+    def _set_wifi_led(self, params: list) -> list:
+        self.properties["wifi_led"] = params[0]
+        return ["ok"]
+
+    def _set_power_mode(self, params: list) -> list:
+        self.properties["mode"] = params[0]
+        return ["ok"]
+
+    def _set_power_price(self, params: list) -> list:
+        self.properties["power_price"] = params[0]
+        return ["ok"]
+
+    def _get_power(self, _params) -> list:
+        if self.model != MODEL_CHUANGMI_PLUG_V3:
+            return METHOD_NOT_FOUND
+        return [int(self.load_power() * 100)]
+
+    def _get_model_and_state(self, _params) -> list:
+        return ["010500978022222102", "010201190280222221", str(int(self.load_power()))]
+
+    def _get_device_prop(self, _params) -> list:
+        return [self.properties["power_socket"]]
+
+    def _toggle_plug(self, params: list) -> list:
+        self.set_relay(params[0] == "on")
+        return ["ok"]
+
+
+class FaultProfile:
+    """Network faults of a virtual device.
+
+    Packets in both directions are lost with the loss probability, and the
+    responses are delayed by latency plus up to jitter seconds; reordered
+    responses are held back a little longer. Every reboot_interval seconds
+    the device reboots: it doesn't answer for reboot_downtime seconds and its
+    clock starts over. Between outage_start and outage_start + outage_duration
+    the device is offline. The times count from Simulator.start_faults.
+    """
+
+    def __init__(
+        self,
+        loss: float = 0.0,
+        latency: float = 0.0,
+        jitter: float = 0.0,
+        reorder: float = 0.0,
+        reboot_interval: Optional[float] = None,
+        reboot_downtime: float = 5.0,
+        outage_start: Optional[float] = None,
+        outage_duration: float = 0.0,
+    ) -> None:
+        """Initialize the profile, without arguments the network is clean."""
+        self.loss = loss
+        self.latency = latency
+        self.jitter = jitter
+        self.reorder = reorder
+        self.reboot_interval = reboot_interval
+        self.reboot_downtime = reboot_downtime
+        self.outage_start = outage_start
+        self.outage_duration = outage_duration
+
+    @property
+    def outage_end(self) -> Optional[float]:
+        """Return the time the outage ends."""
+        if self.outage_start is None:
+            return None
+        return self.outage_start + self.outage_duration
+
+    def in_outage(self, elapsed: float) -> bool:
+        """Return true if the device is offline at the elapsed time."""
+        return self.outage_start is not None and (
+            self.outage_start <= elapsed < self.outage_end
+        )
+
+
+class DeviceServer(asyncio.DatagramProtocol):
+    """Answer the miIO packets of one virtual device."""
+
+    def __init__(
+        self,
+        device: VirtualDevice,
+        push: bool = False,
+        faults: Optional[FaultProfile] = None,
+        seed: int = 0,
+    ) -> None:
+        """Initialize the server, push sends properties_changed after writes."""
+        self.device = device
+        self.push = push
+        self.faults = faults
+        self.transport = None
+        self.epoch = None
+        self.dropped = 0
+        self._push_id = 0
+        self._reboots = 0
+        self._random = random.Random(seed)
+
+    def connection_made(self, transport) -> None:
+        """Store the datagram transport."""
+        self.transport = transport
+
+    def _drop(self) -> bool:
+        """Return true if the device doesn't get to see a received packet."""
+        if self.faults is None or self.epoch is None:
+            return False
+
+        faults = self.faults
+        elapsed = asyncio.get_running_loop().time() - self.epoch
+        if faults.reboot_interval:
+            reboots = int(elapsed // faults.reboot_interval)
+            if reboots > self._reboots:
+                self._reboots = reboots
+                self.device.reboot()
+            if reboots and elapsed % faults.reboot_interval < faults.reboot_downtime:
+                return True
+
+        if faults.in_outage(elapsed):
+            return True
+        return self._random.random() < faults.loss
+
+    def datagram_received(self, data: bytes, addr) -> None:
+        """Answer a handshake or a command."""
+        if self._drop():
+            self.dropped += 1
+            return
+
+        if len(data) == HELLO_LENGTH:
+            self.send(self._hello(), addr)
+            return
+
+        try:
+            message = Message.parse(data, token=self.device.token)
+        except construct.ConstructError:
+            # a wrong token, real devices don't answer either
+            _LOGGER.debug("%s: dropping an undecodable packet", self.device.model)
+            return
+
+        payload = message.data.value
+        if not isinstance(payload, dict) or "method" not in payload:
+            return
+
+        key, value = self.device.handle(payload["method"], payload.get("params"))
+        self.send(self.build({"id": payload["id"], key: value}), addr)
+
+        if self.push and payload["method"] == "set_properties" and key == "result":
+            changed = [
+                {"siid": prop["siid"], "piid": prop["piid"], "value": prop.get("value")}
+                for prop, result in zip(payload["params"], value)
+                if result["code"] == CODE_OK
+            ]
+            self._push_id += 1
+            self.send(
+                self.build(
+                    {"id": self._push_id, "method": "properties_changed", "params": changed}
+                ),
+                addr,
+            )
+
+    def send(self, packet: bytes, addr) -> None:
+        """Send a packet to the client, lost or late as the faults say."""
+        faults = self.faults
+        if faults is None or self.epoch is None:
+            self.transport.sendto(packet, addr)
+            return
+
+        if self._random.random() < faults.loss:
+            self.dropped += 1
+            return
+        delay = faults.latency + self._random.uniform(0, faults.jitter)
+        if self._random.random() < faults.reorder:
+            delay += REORDER_DELAY
+        if delay > 0:
+            asyncio.get_running_loop().call_later(delay, self._send_late, packet, addr)
+        else:
+            self.transport.sendto(packet, addr)
+
+    def _send_late(self, packet: bytes, addr) -> None:
+        """Send a delayed packet, unless the device was stopped meanwhile."""
+        if not self.transport.is_closing():
+            self.transport.sendto(packet, addr)
+
+    def _hello(self) -> bytes:
+        """Return the handshake response with the device id and clock."""
+        header = struct.pack(
+            ">HHI4sI", 0x2131, HELLO_LENGTH, 0, self.device.device_id, self.device.stamp
+        )
+        return header + b"\xff" * 16
+
+    def build(self, payload: dict) -> bytes:
+        """Encrypt a payload into a packet stamped with the device clock."""
+        header = {
+            "length": 0,
+            "unknown": 0,
+            "device_id": self.device.device_id,
+            "ts": datetime.datetime.utcfromtimestamp(self.device.stamp),
+        }
+        return Message.build(
+            {"data": {"value": payload}, "header": {"value": header}, "checksum": 0},
+            token=self.device.token,
+        )
+
+
+class Simulator:
+    """Run a fleet of virtual devices on consecutive loopback addresses."""
+
+    def __init__(
+        self,
+        models: List[str],
+        base_address: str = DEFAULT_BASE_ADDRESS,
+        port: int = MIIO_PORT,
+        push: bool = False,
+        faults: Union[FaultProfile, Dict[str, FaultProfile], None] = None,
+        seed: int = 0,
+    ) -> None:
+        """Initialize one device per given model.
+
+        The faults apply to every device, or per host if given by host.
+        """
+        self.port = port
+        self.push = push
+        self.faults = faults
+        self.seed = seed
+        first = ipaddress.IPv4Address(base_address)
+        self.devices: Dict[str, VirtualDevice] = {
+            str(first + index): VirtualDevice(model, device_token(index), 0x10000 + index)
+            for index, model in enumerate(models)
+        }
+        self.servers: Dict[str, DeviceServer] = {}
+
+    @classmethod
+    def fleet(cls, count: int, models: Optional[List[str]] = None, **kwargs) -> "Simulator":
+        """Return a simulator of count devices, cycling through the models."""
+        models = models or MODELS_ALL_DEVICES
+        return cls([models[index % len(models)] for index in range(count)], **kwargs)
+
+    def config_entries(self) -> List[dict]:
+        """Return host, token and model of every device, as configured."""
+        return [
+            {"host": host, "token": device.token.hex(), "model": device.model}
+            for host, device in self.devices.items()
+        ]
+
+    def server_factory(self, host: str, device: VirtualDevice) -> DeviceServer:
+        """Return the protocol serving the device."""
+        faults = self.faults
+        if isinstance(faults, dict):
+            faults = faults.get(host)
+        seed = self.seed * 100003 + int(ipaddress.IPv4Address(host))
+        return DeviceServer(device, self.push, faults, seed)
+
+    async def async_start(self) -> None:
+        """Open the sockets of all devices."""
+        loop = asyncio.get_running_loop()
+        for host, device in self.devices.items():
+            _, server = await loop.create_datagram_endpoint(
+                lambda host=host, device=device: self.server_factory(host, device),
+                local_addr=(host, self.port),
+            )
+            self.servers[host] = server
+
+    def start_faults(self) -> None:
+        """Start the fault profiles of all devices now."""
+        epoch = asyncio.get_running_loop().time()
+        for server in self.servers.values():
+            server.epoch = epoch
+
+    @property
+    def dropped(self) -> int:
+        """Return the number of packets lost to the faults."""
+        return sum(server.dropped for server in self.servers.values())
+
+    async def async_stop(self) -> None:
+        """Close the sockets of all devices."""
+        for server in self.servers.values():
+            server.transport.close()
+        self.servers.clear()
+        # the transports release their sockets on the next iteration
+        await asyncio.sleep(0)
+
+    async def __aenter__(self) -> "Simulator":
+        await self.async_start()
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.async_stop()
+
+
+async def _async_main(args) -> None:
+    models = args.models.split(",") if args.models else None
+    faults = FaultProfile(
+        args.loss, args.latency, args.jitter, args.reorder, args.reboot_interval
+    )
+    simulator = Simulator.fleet(
+        args.count,
+        models,
+        base_address=args.base_address,
+        port=args.port,
+        push=args.push,
+        faults=faults,
+    )
+    async with simulator:
+        simulator.start_faults()
+        print(json.dumps(simulator.config_entries(), indent=2), flush=True)
+        _LOGGER.info("Simulating %s devices, stop with Ctrl+C", args.count)
+        await asyncio.Event().wait()
+
+
+def main() -> None:
+    """Run the simulator from the command line."""
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--count", type=int, default=10, help="number of devices")
+    parser.add_argument("--models", help="comma separated models, default all")
+    parser.add_argument("--base-address", default=DEFAULT_BASE_ADDRESS)
+    parser.add_argument("--port", type=int, default=MIIO_PORT)
+    parser.add_argument(
+        "--push", action="store_true", help="send properties_changed after writes"
+    )
+    parser.add_argument("--loss", type=float, default=0.0, help="packet loss probability")
+    parser.add_argument("--latency", type=float, default=0.0, help="response delay (s)")
+    parser.add_argument("--jitter", type=float, default=0.0, help="random extra delay (s)")
+    parser.add_argument("--reorder", type=float, default=0.0, help="reorder probability")
+    parser.add_argument(
+        "--reboot-interval", type=float, help="reboot the devices every so many seconds"
+    )
+    parser.add_argument("--debug", action="store_true")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.DEBUG if args.debug else logging.INFO)
+    try:
+        asyncio.run(_async_main(args))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()